@@ -2,251 +2,29 @@
 Chat endpoints for conversation management
 """
 
-from fastapi import APIRouter, HTTPException, Depends, status, File, UploadFile, Form
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import List, Optional
-import PyPDF2
-import io
+from fastapi import APIRouter, HTTPException, Depends, status, File, UploadFile, Form, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from typing import List, Optional, Dict, Any, AsyncIterator
+import asyncio
+import base64
+import hashlib
+import json
 import uuid
-from docx import Document
 from app.models.schemas import (
     Conversation, ConversationCreate, Message, MessageCreate,
     ChatRequest, ChatResponse, APIResponse
 )
 from app.services.supabase_client import get_supabase_client
 from app.services.rag_service import get_rag_service
-from app.services.openai_client import get_openai_client
+from app.services.openai_client import get_async_openai_client
+from app.services.conversation_memory import get_conversation_memory
+from app.services.response_cache import get_response_cache
+from app.services.intent_router import get_intent_router, DRAFT_REQUEST, GREETING
+from app.services.text_extraction import get_text_extraction_service, parse_page_range
+from app.core.config import settings
+from app.core.auth import get_current_user_id_lenient
 
 router = APIRouter()
-security = HTTPBearer()
-
-def extract_text_from_file(file_content: bytes, file_extension: str) -> str:
-    """Extract text content from various file types (PDF, DOCX, TXT)"""
-    try:
-        print(f"File size: {len(file_content)} bytes, Extension: {file_extension}")
-        
-        if file_extension.lower() == '.pdf':
-            return extract_pdf_text(file_content)
-        elif file_extension.lower() == '.docx':
-            return extract_docx_text(file_content)
-        elif file_extension.lower() == '.txt':
-            return extract_txt_text(file_content)
-        else:
-            raise Exception(f"Unsupported file type: {file_extension}")
-    
-    except Exception as e:
-        print(f"Error extracting text from {file_extension}: {e}")
-        raise e
-
-def extract_pdf_text(file_content: bytes) -> str:
-    """Extract text content from PDF file with improved extraction"""
-    try:
-        print(f"PDF file size: {len(file_content)} bytes")
-        
-        # Create a BytesIO object from the file content
-        pdf_file = io.BytesIO(file_content)
-        
-        # Create PDF reader object
-        pdf_reader = PyPDF2.PdfReader(pdf_file)
-        
-        print(f"PDF pages: {len(pdf_reader.pages)}")
-        
-        # Check if PDF is encrypted
-        if pdf_reader.is_encrypted:
-            print("PDF is encrypted")
-            raise Exception("PDF is password protected or encrypted")
-        
-        # Extract text from all pages with improved processing
-        text_parts = []
-        for page_num in range(len(pdf_reader.pages)):
-            page = pdf_reader.pages[page_num]
-            page_text = page.extract_text()
-            
-            # Clean and improve text extraction
-            if page_text.strip():
-                # Fix common character encoding issues
-                cleaned_text = page_text
-                
-                # Replace common encoding issues
-                char_replacements = {
-                    'Ɵ': 't',  # Replace weird t with normal t
-                    'Ɵ': 'o',  # Replace weird o with normal o
-                    'Ɵ': 'a',  # Replace weird a with normal a
-                    'Ɵ': 'e',  # Replace weird e with normal e
-                    'Ɵ': 'i',  # Replace weird i with normal i
-                    'Ɵ': 'u',  # Replace weird u with normal u
-                    'Ɵ': 'n',  # Replace weird n with normal n
-                    'Ɵ': 's',  # Replace weird s with normal s
-                    'Ɵ': 'r',  # Replace weird r with normal r
-                    'Ɵ': 'l',  # Replace weird l with normal l
-                    'Ɵ': 'c',  # Replace weird c with normal c
-                    'Ɵ': 'd',  # Replace weird d with normal d
-                    'Ɵ': 'f',  # Replace weird f with normal f
-                    'Ɵ': 'g',  # Replace weird g with normal g
-                    'Ɵ': 'h',  # Replace weird h with normal h
-                    'Ɵ': 'j',  # Replace weird j with normal j
-                    'Ɵ': 'k',  # Replace weird k with normal k
-                    'Ɵ': 'm',  # Replace weird m with normal m
-                    'Ɵ': 'p',  # Replace weird p with normal p
-                    'Ɵ': 'q',  # Replace weird q with normal q
-                    'Ɵ': 'v',  # Replace weird v with normal v
-                    'Ɵ': 'w',  # Replace weird w with normal w
-                    'Ɵ': 'x',  # Replace weird x with normal x
-                    'Ɵ': 'y',  # Replace weird y with normal y
-                    'Ɵ': 'z',  # Replace weird z with normal z
-                    'Ɵ': 'A',  # Replace weird A with normal A
-                    'Ɵ': 'B',  # Replace weird B with normal B
-                    'Ɵ': 'C',  # Replace weird C with normal C
-                    'Ɵ': 'D',  # Replace weird D with normal D
-                    'Ɵ': 'E',  # Replace weird E with normal E
-                    'Ɵ': 'F',  # Replace weird F with normal F
-                    'Ɵ': 'G',  # Replace weird G with normal G
-                    'Ɵ': 'H',  # Replace weird H with normal H
-                    'Ɵ': 'I',  # Replace weird I with normal I
-                    'Ɵ': 'J',  # Replace weird J with normal J
-                    'Ɵ': 'K',  # Replace weird K with normal K
-                    'Ɵ': 'L',  # Replace weird L with normal L
-                    'Ɵ': 'M',  # Replace weird M with normal M
-                    'Ɵ': 'N',  # Replace weird N with normal N
-                    'Ɵ': 'O',  # Replace weird O with normal O
-                    'Ɵ': 'P',  # Replace weird P with normal P
-                    'Ɵ': 'Q',  # Replace weird Q with normal Q
-                    'Ɵ': 'R',  # Replace weird R with normal R
-                    'Ɵ': 'S',  # Replace weird S with normal S
-                    'Ɵ': 'T',  # Replace weird T with normal T
-                    'Ɵ': 'U',  # Replace weird U with normal U
-                    'Ɵ': 'V',  # Replace weird V with normal V
-                    'Ɵ': 'W',  # Replace weird W with normal W
-                    'Ɵ': 'X',  # Replace weird X with normal X
-                    'Ɵ': 'Y',  # Replace weird Y with normal Y
-                    'Ɵ': 'Z',  # Replace weird Z with normal Z
-                }
-                
-                # Apply character replacements
-                for old_char, new_char in char_replacements.items():
-                    cleaned_text = cleaned_text.replace(old_char, new_char)
-                
-                # Remove excessive whitespace and normalize
-                cleaned_text = ' '.join(cleaned_text.split())
-                text_parts.append(cleaned_text)
-                print(f"Page {page_num + 1} text length: {len(cleaned_text)}")
-            else:
-                print(f"Page {page_num + 1}: No text extracted")
-        
-        # Join all text parts
-        full_text = "\n".join(text_parts)
-        
-        # Additional cleaning for better embedding quality
-        full_text = full_text.replace('\n\n', '\n')  # Remove double newlines
-        full_text = ' '.join(full_text.split())  # Normalize whitespace
-        
-        print(f"Total extracted text length: {len(full_text)}")
-        print(f"First 500 chars: {full_text[:500]}")
-        
-        return full_text.strip()
-    except Exception as e:
-        print(f"Error extracting PDF text: {e}")
-        print(f"Error type: {type(e)}")
-        raise e  # Re-raise the exception instead of returning error string
-
-def extract_docx_text(file_content: bytes) -> str:
-    """Extract text content from DOCX file"""
-    try:
-        print(f"DOCX file size: {len(file_content)} bytes")
-        
-        # Create a BytesIO object from the file content
-        docx_file = io.BytesIO(file_content)
-        
-        # Create Document object
-        doc = Document(docx_file)
-        
-        # Extract text from all paragraphs
-        text_parts = []
-        for paragraph in doc.paragraphs:
-            if paragraph.text.strip():
-                text_parts.append(paragraph.text.strip())
-        
-        # Join all text parts
-        full_text = "\n".join(text_parts)
-        
-        # Apply character encoding fixes
-        char_replacements = {
-            'Ɵ': 't', 'Ɵ': 'o', 'Ɵ': 'a', 'Ɵ': 'e', 'Ɵ': 'i', 'Ɵ': 'u', 'Ɵ': 'n', 'Ɵ': 's', 'Ɵ': 'r', 'Ɵ': 'l',
-            'Ɵ': 'c', 'Ɵ': 'd', 'Ɵ': 'f', 'Ɵ': 'g', 'Ɵ': 'h', 'Ɵ': 'j', 'Ɵ': 'k', 'Ɵ': 'm', 'Ɵ': 'p', 'Ɵ': 'q',
-            'Ɵ': 'v', 'Ɵ': 'w', 'Ɵ': 'x', 'Ɵ': 'y', 'Ɵ': 'z', 'Ɵ': 'A', 'Ɵ': 'B', 'Ɵ': 'C', 'Ɵ': 'D', 'Ɵ': 'E',
-            'Ɵ': 'F', 'Ɵ': 'G', 'Ɵ': 'H', 'Ɵ': 'I', 'Ɵ': 'J', 'Ɵ': 'K', 'Ɵ': 'L', 'Ɵ': 'M', 'Ɵ': 'N', 'Ɵ': 'O',
-            'Ɵ': 'P', 'Ɵ': 'Q', 'Ɵ': 'R', 'Ɵ': 'S', 'Ɵ': 'T', 'Ɵ': 'U', 'Ɵ': 'V', 'Ɵ': 'W', 'Ɵ': 'X', 'Ɵ': 'Y', 'Ɵ': 'Z'
-        }
-        
-        for old_char, new_char in char_replacements.items():
-            full_text = full_text.replace(old_char, new_char)
-        
-        # Clean and normalize text
-        full_text = ' '.join(full_text.split())  # Normalize whitespace
-        
-        print(f"Total extracted text length: {len(full_text)}")
-        print(f"First 500 chars: {full_text[:500]}")
-        
-        return full_text.strip()
-    except Exception as e:
-        print(f"Error extracting DOCX text: {e}")
-        print(f"Error type: {type(e)}")
-        raise e
-
-def extract_txt_text(file_content: bytes) -> str:
-    """Extract text content from TXT file"""
-    try:
-        print(f"TXT file size: {len(file_content)} bytes")
-        
-        # Decode bytes to text
-        text = file_content.decode('utf-8')
-        
-        # Apply character encoding fixes
-        char_replacements = {
-            'Ɵ': 't', 'Ɵ': 'o', 'Ɵ': 'a', 'Ɵ': 'e', 'Ɵ': 'i', 'Ɵ': 'u', 'Ɵ': 'n', 'Ɵ': 's', 'Ɵ': 'r', 'Ɵ': 'l',
-            'Ɵ': 'c', 'Ɵ': 'd', 'Ɵ': 'f', 'Ɵ': 'g', 'Ɵ': 'h', 'Ɵ': 'j', 'Ɵ': 'k', 'Ɵ': 'm', 'Ɵ': 'p', 'Ɵ': 'q',
-            'Ɵ': 'v', 'Ɵ': 'w', 'Ɵ': 'x', 'Ɵ': 'y', 'Ɵ': 'z', 'Ɵ': 'A', 'Ɵ': 'B', 'Ɵ': 'C', 'Ɵ': 'D', 'Ɵ': 'E',
-            'Ɵ': 'F', 'Ɵ': 'G', 'Ɵ': 'H', 'Ɵ': 'I', 'Ɵ': 'J', 'Ɵ': 'K', 'Ɵ': 'L', 'Ɵ': 'M', 'Ɵ': 'N', 'Ɵ': 'O',
-            'Ɵ': 'P', 'Ɵ': 'Q', 'Ɵ': 'R', 'Ɵ': 'S', 'Ɵ': 'T', 'Ɵ': 'U', 'Ɵ': 'V', 'Ɵ': 'W', 'Ɵ': 'X', 'Ɵ': 'Y', 'Ɵ': 'Z'
-        }
-        
-        for old_char, new_char in char_replacements.items():
-            text = text.replace(old_char, new_char)
-        
-        # Clean and normalize text
-        text = ' '.join(text.split())  # Normalize whitespace
-        
-        print(f"Total extracted text length: {len(text)}")
-        print(f"First 500 chars: {text[:500]}")
-        
-        return text.strip()
-    except UnicodeDecodeError:
-        # Try with different encodings
-        try:
-            text = file_content.decode('latin-1')
-            
-            # Apply character encoding fixes
-            char_replacements = {
-                'Ɵ': 't', 'Ɵ': 'o', 'Ɵ': 'a', 'Ɵ': 'e', 'Ɵ': 'i', 'Ɵ': 'u', 'Ɵ': 'n', 'Ɵ': 's', 'Ɵ': 'r', 'Ɵ': 'l',
-                'Ɵ': 'c', 'Ɵ': 'd', 'Ɵ': 'f', 'Ɵ': 'g', 'Ɵ': 'h', 'Ɵ': 'j', 'Ɵ': 'k', 'Ɵ': 'm', 'Ɵ': 'p', 'Ɵ': 'q',
-                'Ɵ': 'v', 'Ɵ': 'w', 'Ɵ': 'x', 'Ɵ': 'y', 'Ɵ': 'z', 'Ɵ': 'A', 'Ɵ': 'B', 'Ɵ': 'C', 'Ɵ': 'D', 'Ɵ': 'E',
-                'Ɵ': 'F', 'Ɵ': 'G', 'Ɵ': 'H', 'Ɵ': 'I', 'Ɵ': 'J', 'Ɵ': 'K', 'Ɵ': 'L', 'Ɵ': 'M', 'Ɵ': 'N', 'Ɵ': 'O',
-                'Ɵ': 'P', 'Ɵ': 'Q', 'Ɵ': 'R', 'Ɵ': 'S', 'Ɵ': 'T', 'Ɵ': 'U', 'Ɵ': 'V', 'Ɵ': 'W', 'Ɵ': 'X', 'Ɵ': 'Y', 'Ɵ': 'Z'
-            }
-            
-            for old_char, new_char in char_replacements.items():
-                text = text.replace(old_char, new_char)
-            
-            text = ' '.join(text.split())
-            print(f"Decoded with latin-1, length: {len(text)}")
-            return text.strip()
-        except Exception as e:
-            print(f"Error decoding TXT file: {e}")
-            raise e
-    except Exception as e:
-        print(f"Error extracting TXT text: {e}")
-        print(f"Error type: {type(e)}")
-        raise e
 
 def generate_conversation_title(user_message: str) -> str:
     """Generate a conversation title from the first user message (1-4 words)"""
@@ -314,52 +92,38 @@ def generate_conversation_title(user_message: str) -> str:
         # Fallback to default title
         return "New Chat"
 
-def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
-    """Get current user ID from token"""
-    try:
-        print(f"🔐 Received token: {credentials.credentials[:20]}..." if len(credentials.credentials) > 20 else f"🔐 Received token: {credentials.credentials}")
-        
-        # Handle test token for development
-        if credentials.credentials == "test-token":
-            print("Using test token for development")
-            return "8558702c-5437-47b8-87e2-e70576d1c77d"  # Use the actual logged-in user ID
-        
-        # Validate Supabase token and get user ID
-        try:
-            from supabase import create_client
-            from app.core.config import settings
-            
-            # Use the anon key for user token validation
-            user_supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)
-            
-            # Get user info using the access token directly
-            response = user_supabase.auth.get_user(credentials.credentials)
-            
-            if not response.user:
-                print("Invalid token - no user found")
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid token"
-                )
-            
-            user_id = response.user.id
-            print(f"Authenticated user: {user_id}")
-            return user_id
-            
-        except Exception as e:
-            print(f"Token validation error: {e}")
-            # Fallback to test user for development
-            print("Falling back to test user for development")
-            return "8558702c-5437-47b8-87e2-e70576d1c77d"
-        
-    except Exception as e:
-        print(f"Authentication error: {e}")
-        # For development, return a consistent test user ID
-        return "8558702c-5437-47b8-87e2-e70576d1c77d"  # Valid UUID format
+def _conversation_list_etag(user_id: str, version: str, limit: Optional[int], before: Optional[str]) -> str:
+    """Weak ETag for one page of the conversation list, from the list's version fingerprint"""
+    key = json.dumps([user_id, version, limit, before, settings.CONVERSATION_PREVIEW_LENGTH])
+    digest = hashlib.sha256(key.encode("utf-8")).hexdigest()
+    return f'W/"{digest[:32]}"'
+
+def _etag_matches(if_none_match: str, etag: str) -> bool:
+    """Weak comparison of an ETag against an If-None-Match list of tags (or *)"""
+    opaque_tag = etag[2:] if etag.startswith("W/") else etag
+    for tag in (if_none_match or "").split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if (tag[2:] if tag.startswith("W/") else tag) == opaque_tag:
+            return True
+    return False
 
 @router.get("/conversations", response_model=APIResponse)
-async def get_conversations(current_user_id: str = Depends(get_current_user_id)):
-    """Get user's conversations"""
+async def get_conversations(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=settings.CONVERSATIONS_PAGE_MAX_SIZE),
+    before: Optional[str] = None,
+    current_user_id: str = Depends(get_current_user_id_lenient)
+):
+    """Get user's conversations with message_count and a last-message preview.
+    
+    Without ``limit`` returns every conversation as a list (the original shape).
+    With ``limit`` returns ``{conversations, has_more, next_cursor}``; pass
+    ``next_cursor`` as ``before`` for the next page. Responses carry an ETag,
+    and a matching ``If-None-Match`` gets 304 Not Modified with no body.
+    """
     try:
         print(f"🔍 Getting conversations for user: {current_user_id}")
         
@@ -376,20 +140,45 @@ async def get_conversations(current_user_id: str = Depends(get_current_user_id))
                 data=[]
             )
         
-        # Get conversations with timeout
-        print(f"🔍 Calling get_user_conversations with user_id: {current_user_id}")
-        conversations = await supabase.get_user_conversations(current_user_id)
-        
+        # A cheap fingerprint of the list answers If-None-Match before the list is built
+        version = await supabase.get_conversation_list_version(current_user_id)
+        etag = _conversation_list_etag(current_user_id, version, limit, before) if version else None
+        if etag and _etag_matches(request.headers.get("if-none-match"), etag):
+            return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers={"ETag": etag})
+        
+        # Counts and previews come from one aggregated query
+        page = await supabase.get_conversation_list(
+            current_user_id,
+            limit=limit,
+            before=_decode_message_cursor(before) if before else None
+        )
+        conversations = page["conversations"]
         print(f"📊 Found {len(conversations)} conversations")
-        for i, conv in enumerate(conversations):
-            print(f"   {i+1}. ID: {conv.get('id')}, Title: {conv.get('title')}, Updated: {conv.get('updated_at')}")
+        
+        if limit is None:
+            data = conversations
+        else:
+            last = conversations[-1] if conversations else None
+            data = {
+                "conversations": conversations,
+                "has_more": page["has_more"],
+                "next_cursor": _encode_message_cursor({
+                    "created_at": last.get("last_activity_at") or last.get("updated_at"),
+                    "id": last["id"]
+                }) if last and page["has_more"] else None
+            }
+        
+        if etag:
+            response.headers["ETag"] = etag
         
         return APIResponse(
             success=True,
             message="Conversations retrieved successfully",
-            data=conversations
+            data=data
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error getting conversations: {e}")
         # Return empty list if database error
@@ -402,7 +191,7 @@ async def get_conversations(current_user_id: str = Depends(get_current_user_id))
 @router.post("/conversations", response_model=APIResponse)
 async def create_conversation(
     conversation: ConversationCreate,
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: str = Depends(get_current_user_id_lenient)
 ):
     """Create new conversation"""
     try:
@@ -449,114 +238,274 @@ async def create_conversation(
             data=new_conversation
         )
 
+def _extraction_scope(extraction: Dict[str, Any]) -> str:
+    """Tell the model which part of a partially read attachment it is seeing"""
+    if not extraction.get("truncated"):
+        return ""
+    if extraction.get("page_count"):
+        return f" (pages {extraction['first_page']}-{extraction['last_page']} of {extraction['page_count']})"
+    return " (truncated)"
+
+def _encode_message_cursor(message: Dict[str, Any]) -> str:
+    """Opaque cursor for a message's (created_at, id) position"""
+    raw = json.dumps([message["created_at"], message["id"]])
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+def _decode_message_cursor(cursor: str) -> tuple:
+    """Decode a cursor from _encode_message_cursor"""
+    try:
+        created_at, message_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        return created_at, message_id
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid message cursor"
+        )
+
 @router.get("/conversations/{conversation_id}/messages", response_model=APIResponse)
 async def get_conversation_messages(
     conversation_id: str,
-    current_user_id: str = Depends(get_current_user_id)
+    limit: Optional[int] = Query(None, ge=1, le=settings.MESSAGES_PAGE_MAX_SIZE),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    since: Optional[str] = None,
+    light: bool = False,
+    current_user_id: str = Depends(get_current_user_id_lenient)
 ):
-    """Get messages for a conversation"""
+    """Get messages for a conversation.
+    
+    Without parameters, returns every message (the original behaviour). With
+    ``limit``, ``before``, ``after`` or ``since`` it returns one page, oldest
+    first, as ``{messages, has_more, before_cursor, after_cursor}``:
+    
+    - no cursor: the newest ``limit`` messages
+    - ``before``: older messages, for scrolling up
+    - ``after``: newer messages, for incremental sync from a cursor
+    - ``since``: messages created after an ISO timestamp
+    
+    ``light=true`` replaces attached file text with a short note.
+    """
     try:
         supabase = get_supabase_client()
-        messages = await supabase.get_conversation_messages(conversation_id, current_user_id)
+        
+        if limit is None and not (before or after or since):
+            messages = await supabase.get_conversation_messages(conversation_id, current_user_id)
+            if light:
+                strip_attachment = get_conversation_memory().strip_attachment
+                messages = [{**message, "content": strip_attachment(message["content"])} for message in messages]
+            return APIResponse(
+                success=True,
+                message="Messages retrieved successfully",
+                data=messages
+            )
+        
+        after_position = _decode_message_cursor(after) if after else ((since, None) if since else None)
+        before_position = _decode_message_cursor(before) if before else None
+        page = await supabase.get_messages_page(
+            conversation_id,
+            current_user_id,
+            limit or settings.MESSAGES_PAGE_SIZE,
+            before=before_position,
+            after=after_position,
+            light=light
+        )
+        messages = page["messages"]
         
         return APIResponse(
             success=True,
             message="Messages retrieved successfully",
-            data=messages
+            data={
+                "messages": messages,
+                "has_more": page["has_more"],
+                # Older page; and the position to sync newer messages from
+                "before_cursor": _encode_message_cursor(messages[0]) if messages else before,
+                "after_cursor": _encode_message_cursor(messages[-1]) if messages else (after or None)
+            }
         )
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail=f"Failed to get messages: {str(e)}"
         )
 
-@router.post("/send", response_model=ChatResponse)
-async def send_message(
-    message: str = Form(...),
-    conversation_id: Optional[str] = Form(None),
-    user_id: str = Form(...),
-    file: Optional[UploadFile] = File(None),
-    current_user_id: str = Depends(get_current_user_id)
-):
-    """Send message and get AI response"""
-    try:
-        # Handle temporary chat (conversation_id is None, empty string, or "null")
-        is_temporary_chat = conversation_id is None or conversation_id == "null" or conversation_id == ""
-        
-        # Create ChatRequest object from form data
-        chat_request = ChatRequest(
-            message=message,
-            conversation_id=conversation_id if not is_temporary_chat else None,
-            user_id=user_id
-        )
+async def _prepare_chat_turn(
+    message: str,
+    conversation_id: Optional[str],
+    user_id: str,
+    file: Optional[UploadFile],
+    current_user_id: str,
+    pages: Optional[str] = None
+) -> Dict[str, Any]:
+    """Resolve the conversation, save the user message and build the model input.
+    
+    Shared by the blocking and streaming send endpoints. ``pages`` ("3-7")
+    limits which pages of an attached PDF are read.
+    """
+    # Handle temporary chat (conversation_id is None, empty string, or "null")
+    is_temporary_chat = conversation_id is None or conversation_id == "null" or conversation_id == ""
+    
+    # Create ChatRequest object from form data
+    chat_request = ChatRequest(
+        message=message,
+        conversation_id=conversation_id if not is_temporary_chat else None,
+        user_id=user_id
+    )
+    
+    # Handle file upload if present
+    file_content = None
+    extracted_text = None
+    extraction = None
+    page_range = None
+    file_extension = None
+    if file and file.filename:
+        # Get file extension
+        file_extension = '.' + file.filename.split('.')[-1].lower() if '.' in file.filename else ''
         
-        # Handle file upload if present
-        file_content = None
-        extracted_text = None
-        if file and file.filename:
-            # Get file extension
-            file_extension = '.' + file.filename.split('.')[-1].lower() if '.' in file.filename else ''
-            
-            # Validate file type
-            allowed_extensions = ['.pdf', '.docx', '.txt']
-            if file_extension not in allowed_extensions:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"Only {', '.join(allowed_extensions)} files are supported"
-                )
-            
-            # Read file content
-            file_content = await file.read()
-            print(f"Received file: {file.filename}, size: {len(file_content)} bytes")
-            
-            # Extract text from file
-            extracted_text = extract_text_from_file(file_content, file_extension)
-            print(f"Extracted text length: {len(extracted_text)} characters")
-            print(f"Text preview: {extracted_text[:200]}...")
+        # Validate file type
+        allowed_extensions = ['.pdf', '.docx', '.txt']
+        if file_extension not in allowed_extensions:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Only {', '.join(allowed_extensions)} files are supported"
+            )
         
-        # Initialize services with error handling
         try:
-            supabase = get_supabase_client()
-        except Exception as e:
-            print(f"Warning: Supabase client failed to initialize: {e}")
-            supabase = None
+            page_range = parse_page_range(pages)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="pages must look like \"5\" or \"3-7\""
+            )
         
+        # Read file content
+        file_content = await file.read()
+        print(f"Received file: {file.filename}, size: {len(file_content)} bytes")
+        
+        # Extract text in the worker pool, stopping once it would overflow the prompt;
+        # on failure the model is told the text couldn't be read
         try:
-            rag_service = get_rag_service()
-        except Exception as e:
-            print(f"Warning: RAG service failed to initialize: {e}")
-            rag_service = None
-            
-        try:
-            openai_client = get_openai_client()
-        except Exception as e:
-            print(f"Error: OpenAI client failed to initialize: {e}")
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail="AI service unavailable"
+            extraction = await get_text_extraction_service().extract_document(
+                file_content,
+                file_extension,
+                max_tokens=settings.EXTRACTION_ATTACHMENT_MAX_TOKENS,
+                page_range=page_range
             )
+            extracted_text = extraction["text"]
+            print(f"Extracted text length: {len(extracted_text)} characters")
+            print(f"Text preview: {extracted_text[:200]}...")
+        except Exception as e:
+            print(f"Text extraction failed for {file.filename}: {e}")
+            extracted_text = None
+    
+    # Initialize services with error handling
+    try:
+        supabase = get_supabase_client()
+    except Exception as e:
+        print(f"Warning: Supabase client failed to initialize: {e}")
+        supabase = None
         
-        # Handle conversation - create if doesn't exist or not provided
-        # Skip database operations for temporary chats
-        if is_temporary_chat:
-            print("🔄 Processing temporary chat - skipping database operations")
-            # Generate a temporary conversation ID for response
-            import uuid
-            chat_request.conversation_id = f"temp-{uuid.uuid4()}"
-        elif not chat_request.conversation_id:
-            # Create new conversation if not provided - use proper title generation
-            if supabase:
-                try:
-                    # Validate message before creating conversation
-                    if not chat_request.message or not chat_request.message.strip():
-                        print("⚠️ Empty message received, skipping conversation creation")
-                        import uuid
+    try:
+        openai_client = get_async_openai_client()
+    except Exception as e:
+        print(f"Error: OpenAI client failed to initialize: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail="AI service unavailable"
+        )
+    
+    # Create the user message for OpenAI
+    user_content = chat_request.message
+    if file_content and extracted_text:
+        # Include the extracted PDF text for AI processing
+        user_content += f"\n\n[User has attached a {file_extension} file named '{file.filename}'. Here is the content of the file{_extraction_scope(extraction)}:]\n\n{extracted_text}"
+    elif extraction and page_range and extraction.get("page_count") and page_range[0] > extraction["page_count"]:
+        # The requested pages don't exist, which isn't the same as unreadable text
+        user_content += f"\n\n[User has attached a {file_extension} file named '{file.filename}' and asked for pages {pages}, but the document only has {extraction['page_count']} pages. Please ask the user which pages they meant.]"
+    elif file_content:
+        # Fallback if text extraction failed
+        user_content += f"\n\n[User has attached a {file_extension} file named '{file.filename}', but I couldn't extract the text content. Please ask the user to describe what specific information they need from the document.]"
+    
+    # Decide from the message alone whether the turn needs a template:
+    # greetings, FAQs and placeholder fills skip the template search
+    follow_up = not is_temporary_chat and bool(chat_request.conversation_id)
+    try:
+        route = get_intent_router().route(chat_request.message, follow_up=follow_up, has_attachment=bool(file_content))
+    except Exception as e:
+        print(f"Error routing message: {e}")
+        route = {"intent": DRAFT_REQUEST, "rti_category": None, "category_source": None,
+                 "needs_retrieval": True, "is_rti_related": True}  # Default to RTI-related
+    print(f"Intent: {route['intent']}, category: {route['rti_category']}")
+    
+    # The query embedding is only needed for retrieval and for the response
+    # cache, which serves first-turn messages
+    cacheable = settings.RESPONSE_CACHE_ENABLED and not file_content and not follow_up and route["intent"] != GREETING
+    
+    # Start the query embedding and template retrieval now so they overlap
+    # with the conversation bookkeeping below. Follow-ups wait for the
+    # conversation's messages: they may reuse the templates of the last answer.
+    sticky_templates = settings.RAG_STICKY_TEMPLATES and follow_up
+    embedding_task = None
+    context_task = None
+    if not sticky_templates:
+        embedding_task, context_task = _start_retrieval(openai_client, user_content, route, cacheable)
+    
+    # Handle conversation - create if doesn't exist or not provided
+    # Skip database operations for temporary chats
+    conversation_memory = get_conversation_memory()
+    memory = None
+    if is_temporary_chat:
+        print("🔄 Processing temporary chat - skipping database operations")
+        # Generate a temporary conversation ID for response
+        chat_request.conversation_id = f"temp-{uuid.uuid4()}"
+    elif not chat_request.conversation_id:
+        # Create new conversation if not provided - use proper title generation
+        if supabase:
+            try:
+                # Validate message before creating conversation
+                if not chat_request.message or not chat_request.message.strip():
+                    print("⚠️ Empty message received, skipping conversation creation")
+                    chat_request.conversation_id = str(uuid.uuid4())
+                else:
+                    # Generate proper title from user message
+                    conversation_title = generate_conversation_title(chat_request.message)
+                    print(f"Creating conversation with title: '{conversation_title}'")
+                    
+                    conversation = await supabase.create_conversation(
+                        user_id=current_user_id,
+                        title=conversation_title
+                    )
+                    if conversation:
+                        chat_request.conversation_id = conversation["id"]
+                        print(f"Created conversation with ID: {conversation['id']}")
+                    else:
+                        # Fallback: create a mock conversation ID
                         chat_request.conversation_id = str(uuid.uuid4())
+            except Exception as e:
+                print(f"Error creating conversation: {e}")
+                chat_request.conversation_id = str(uuid.uuid4())
+        else:
+            # No Supabase, create mock conversation ID
+            chat_request.conversation_id = str(uuid.uuid4())
+    else:
+        # Check the conversation belongs to the user and read its recent
+        # messages and summary in the same request; create it if missing
+        if supabase:
+            try:
+                memory = await conversation_memory.fetch(
+                    supabase,
+                    chat_request.conversation_id, 
+                    current_user_id
+                )
+                if memory is None:
+                    # Conversation doesn't exist, create it with proper title
+                    if not chat_request.message or not chat_request.message.strip():
+                        print("⚠️ Empty message received, skipping missing conversation creation")
                     else:
-                        # Generate proper title from user message
                         conversation_title = generate_conversation_title(chat_request.message)
-                        print(f"Creating conversation with title: '{conversation_title}'")
+                        print(f"Creating missing conversation with title: '{conversation_title}'")
                         
                         conversation = await supabase.create_conversation(
                             user_id=current_user_id,
@@ -564,177 +513,335 @@ async def send_message(
                         )
                         if conversation:
                             chat_request.conversation_id = conversation["id"]
-                            print(f"Created conversation with ID: {conversation['id']}")
-                        else:
-                            # Fallback: create a mock conversation ID
-                            import uuid
-                            chat_request.conversation_id = str(uuid.uuid4())
-                except Exception as e:
-                    print(f"Error creating conversation: {e}")
-                    import uuid
-                    chat_request.conversation_id = str(uuid.uuid4())
-            else:
-                # No Supabase, create mock conversation ID
-                import uuid
-                chat_request.conversation_id = str(uuid.uuid4())
-        else:
-            # Check if conversation exists, if not create it
-            if supabase:
-                try:
-                    messages = await supabase.get_conversation_messages(
-                        chat_request.conversation_id, 
-                        current_user_id
-                    )
-                    if not messages:
-                        # Conversation doesn't exist, create it with proper title
-                        if not chat_request.message or not chat_request.message.strip():
-                            print("⚠️ Empty message received, skipping missing conversation creation")
-                        else:
-                            conversation_title = generate_conversation_title(chat_request.message)
-                            print(f"Creating missing conversation with title: '{conversation_title}'")
-                            
-                            conversation = await supabase.create_conversation(
-                                user_id=current_user_id,
-                                title=conversation_title
-                            )
-                            if conversation:
-                                chat_request.conversation_id = conversation["id"]
-                except Exception as e:
-                    print(f"Error validating conversation: {e}")
-                    # Keep existing conversation ID
-                    pass
-        
-        # Add user message to database (with fallback) - skip for temporary chats
-        user_message = None
-        if supabase and not is_temporary_chat:
-            try:
-                # Include file information in message content
-                message_content = chat_request.message
-                if file_content and extracted_text:
-                    message_content += f"\n\n[Attached file: {file.filename}]\n\n[File Content:]\n{extracted_text}"
-                elif file_content:
-                    message_content += f"\n\n[Attached file: {file.filename} - Text extraction failed]"
-                
-                print(f"Saving user message to conversation {chat_request.conversation_id}")
-                user_message = await supabase.add_message(
-                    conversation_id=chat_request.conversation_id,
-                    sender="user",
-                    content=message_content
-                )
-                print(f"User message saved: {user_message}")
-            except Exception as e:
-                print(f"Error adding user message to database: {e}")
-                user_message = None
-        elif is_temporary_chat:
-            print("🔄 Skipping user message database save for temporary chat")
-        
-        # Check if message is RTI-related (with fallback)
-        try:
-            is_rti_related = openai_client.is_rti_related(chat_request.message)
-        except Exception as e:
-            print(f"Error checking RTI relevance: {e}")
-            is_rti_related = True  # Default to RTI-related
-        
-        # Get conversation history for context (with fallback) - skip for temporary chats
-        conversation_history = []
-        if is_temporary_chat:
-            print("🔄 Skipping conversation history retrieval for temporary chat")
-            conversation_history = []
-        elif supabase and chat_request.conversation_id:
-            try:
-                messages = await supabase.get_conversation_messages(
-                    chat_request.conversation_id, 
-                    current_user_id
-                )
-                print(f"🔍 CONVERSATION CONTEXT DEBUG:")
-                print(f"📊 Total messages in conversation: {len(messages)}")
-                print(f"📝 Messages: {[{'sender': msg['sender'], 'content': msg['content'][:50] + '...' if len(msg['content']) > 50 else msg['content']} for msg in messages]}")
-                
-                # Convert to OpenAI format, excluding the current message
-                conversation_history = [
-                    {"role": "user" if msg["sender"] == "user" else "assistant", "content": msg["content"]}
-                    for msg in messages[:-1]  # Exclude the current message
-                ]
-                print(f"🤖 Conversation history for OpenAI: {len(conversation_history)} messages")
-                print(f"📋 History details: {[{'role': msg['role'], 'content': msg['content'][:50] + '...' if len(msg['content']) > 50 else msg['content']} for msg in conversation_history]}")
             except Exception as e:
-                print(f"Error getting conversation history: {e}")
-                conversation_history = []
-        
-        # Get AI response using OpenAI (with fallback)
+                print(f"Error validating conversation: {e}")
+                # Keep existing conversation ID
+                pass
+    
+    if context_task is None:
+        # Keep the last answer's templates unless the user moved on
+        selection = conversation_memory.template_selection(memory)
+        if get_intent_router().keeps_topic(route, selection):
+            context_task = asyncio.create_task(_reuse_context(openai_client, user_content, route, selection))
+        else:
+            embedding_task, context_task = _start_retrieval(openai_client, user_content, route, cacheable)
+    
+    # Add user message to database (with fallback) - skip for temporary chats
+    user_message = None
+    if supabase and not is_temporary_chat:
         try:
-            print(f"Getting AI response for message: {chat_request.message}")
-            print(f"Conversation history: {len(conversation_history)} messages")
-            
-            # Create the user message for OpenAI
-            user_content = chat_request.message
+            # Include file information in message content
+            message_content = chat_request.message
             if file_content and extracted_text:
-                # Include the extracted PDF text for AI processing
-                user_content += f"\n\n[User has attached a {file_extension} file named '{file.filename}'. Here is the content of the file:]\n\n{extracted_text}"
+                message_content += f"\n\n[Attached file: {file.filename}]\n\n[File Content:]\n{extracted_text}"
             elif file_content:
-                # Fallback if text extraction failed
-                user_content += f"\n\n[User has attached a {file_extension} file named '{file.filename}', but I couldn't extract the text content. Please ask the user to describe what specific information they need from the document.]"
-            
-            user_message = {"role": "user", "content": user_content}
-            messages_for_openai = conversation_history + [user_message]
-            
-            print(f"Sending to OpenAI: {messages_for_openai}")
+                message_content += f"\n\n[Attached file: {file.filename} - Text extraction failed]"
             
-            # Use RAG service for enhanced responses
-            try:
-                rag_service = get_rag_service()
-                ai_response = await rag_service.get_enhanced_response(
-                    user_message=user_content,
-                    conversation_history=conversation_history
-                )
-            except Exception as e:
-                print(f"RAG service failed, falling back to basic OpenAI: {e}")
-                # Fallback to basic OpenAI if RAG fails
-                ai_response = openai_client.get_chat_completion(
-                    messages=messages_for_openai,
-                    context=None
-                )
-            print(f"AI response received: {ai_response[:100]}...")
+            print(f"Saving user message to conversation {chat_request.conversation_id}")
+            user_message = await supabase.add_message(
+                conversation_id=chat_request.conversation_id,
+                sender="user",
+                content=message_content
+            )
+            print(f"User message saved: {user_message}")
         except Exception as e:
-            print(f"Error getting AI response: {e}")
-            # Fallback response
-            ai_response = "I'm sorry, I'm having trouble processing your request right now. Please try again later."
+            print(f"Error adding user message to database: {e}")
+            user_message = None
+    elif is_temporary_chat:
+        print("🔄 Skipping user message database save for temporary chat")
+    
+    # Build conversation history from the messages read above (with fallback) -
+    # it predates the user message just saved, so nothing is read again.
+    # Temporary chats and new conversations have no history.
+    conversation_history = []
+    if is_temporary_chat:
+        print("🔄 Skipping conversation history retrieval for temporary chat")
+    elif memory:
+        try:
+            conversation_history = conversation_memory.build_history(
+                supabase,
+                chat_request.conversation_id,
+                memory
+            )
+            print(f"🤖 Conversation history for OpenAI: {len(conversation_history)} messages")
+            print(f"📋 History details: {[{'role': msg['role'], 'content': msg['content'][:50] + '...' if len(msg['content']) > 50 else msg['content']} for msg in conversation_history]}")
+        except Exception as e:
+            print(f"Error building conversation history: {e}")
+            conversation_history = []
+    
+    return {
+        "chat_request": chat_request,
+        "is_temporary_chat": is_temporary_chat,
+        "supabase": supabase,
+        "openai_client": openai_client,
+        "is_rti_related": route["is_rti_related"],
+        "route": route,
+        "conversation_history": conversation_history,
+        "user_content": user_content,
+        "embedding_task": embedding_task,
+        "context_task": context_task,
+        # Answers that don't depend on earlier turns or attachments can be shared
+        "use_response_cache": cacheable and embedding_task is not None and not conversation_history
+    }
+
+def _start_retrieval(openai_client, user_content: str, route: Dict[str, Any], cacheable: bool) -> tuple:
+    """Start the query embedding (if retrieval or the response cache needs it) and the template search"""
+    embedding_task = None
+    if route["needs_retrieval"] or cacheable:
+        embedding_task = asyncio.create_task(openai_client.get_embedding(user_content))
+    return embedding_task, asyncio.create_task(_retrieve_context(user_content, embedding_task, route))
+
+async def _retrieve_context(user_content: str, embedding_task: Optional["asyncio.Task"], route: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Retrieve RAG template blocks and the templates they came from, or None if the RAG service is unavailable"""
+    if not route["needs_retrieval"]:
+        print(f"Skipping template retrieval for {route['intent']} message")
+        return {"context_parts": [], "templates": [], "rti_category": route["rti_category"]}
+    try:
+        query_embedding = await embedding_task or None
+        # Without a category keyword, the embedding may still point at one
+        get_intent_router().assign_category(route, query_embedding)
+        selection = await get_rag_service().retrieve_templates(user_content, query_embedding, route["rti_category"])
+        return {**selection, "rti_category": route["rti_category"]}
+    except Exception as e:
+        print(f"Warning: RAG context retrieval failed: {e}")
+        return None
+
+async def _reuse_context(openai_client, user_content: str, route: Dict[str, Any],
+                         selection: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Rebuild the previous turn's template blocks, searching again if they are no longer available"""
+    try:
+        context_parts = await get_rag_service().reuse_templates(selection["templates"])
+    except Exception as e:
+        print(f"Warning: reusing templates failed: {e}")
+        context_parts = None
+    if context_parts is not None:
+        return {"context_parts": context_parts, **selection}
+    embedding_task = None
+    if route["needs_retrieval"]:
+        embedding_task = asyncio.create_task(openai_client.get_embedding(user_content))
+    return await _retrieve_context(user_content, embedding_task, route)
+
+async def _context_parts(turn: Dict[str, Any]) -> Optional[List[str]]:
+    """Template blocks for the turn's prompt (None lets the RAG service retrieve them itself)"""
+    context = await turn["context_task"]
+    return context["context_parts"] if context is not None else None
+
+def _template_metadata(turn: Dict[str, Any]) -> Dict[str, Any]:
+    """The templates and category a bot message was answered with, for later turns to reuse"""
+    context_task = turn["context_task"]
+    if context_task.done() and not context_task.cancelled() and context_task.exception() is None:
+        context = context_task.result()
+        if context and context.get("templates"):
+            return {"templates": context["templates"], "rti_category": context.get("rti_category")}
+    return {"rti_category": turn["route"]["rti_category"]}
+
+async def _get_cached_response(turn: Dict[str, Any]) -> Optional[str]:
+    """Look up a cached answer for first-turn and temporary chat messages"""
+    if not turn["use_response_cache"]:
+        return None
+    try:
+        cached = get_response_cache().get(await turn["embedding_task"])
+    except Exception as e:
+        print(f"Error reading response cache: {e}")
+        return None
+    if cached is not None:
+        # Templates aren't needed for a cached answer
+        turn["context_task"].cancel()
+    return cached
+
+async def _cache_response(turn: Dict[str, Any], ai_response: str, completion_info: Dict[str, Any]) -> None:
+    """Remember the answer for semantically equivalent first-turn questions.
+    
+    Only answers the model finished on its own (finish_reason "stop") are
+    cached; truncated, filtered or failed ones are not.
+    """
+    if not turn["use_response_cache"]:
+        return
+    if completion_info.get("finish_reason") != "stop":
+        print(f"Not caching response (finish_reason: {completion_info.get('finish_reason')})")
+        return
+    try:
+        get_response_cache().set(await turn["embedding_task"], turn["user_content"], ai_response)
+    except Exception as e:
+        print(f"Error writing response cache: {e}")
+
+async def _generate_ai_response(turn: Dict[str, Any]) -> str:
+    """Get the AI response for a prepared turn, falling back to plain OpenAI if RAG fails"""
+    chat_request = turn["chat_request"]
+    conversation_history = turn["conversation_history"]
+    user_content = turn["user_content"]
+    
+    try:
+        print(f"Getting AI response for message: {chat_request.message}")
+        print(f"Conversation history: {len(conversation_history)} messages")
         
-        # Add bot message to database (with fallback) - skip for temporary chats
-        message_id = "fallback-id"
-        if supabase and not is_temporary_chat:
-            try:
-                print(f"Saving bot message to conversation {chat_request.conversation_id}")
-                bot_message = await supabase.add_message(
-                    conversation_id=chat_request.conversation_id,
-                    sender="bot",
-                    content=ai_response,
-                    metadata={"is_rti_related": is_rti_related}
-                )
-                print(f"Bot message saved: {bot_message}")
-                message_id = bot_message["id"] if bot_message else "fallback-id"
-            except Exception as e:
-                print(f"Error adding bot message to database: {e}")
-                message_id = "fallback-id"
-        elif is_temporary_chat:
-            print("🔄 Skipping bot message database save for temporary chat")
-            message_id = f"temp-{uuid.uuid4()}"
-        
-        # Get suggestions if RTI-related (with fallback)
-        suggestions = None
+        cached = await _get_cached_response(turn)
+        if cached is not None:
+            return cached
+        
+        messages_for_openai = conversation_history + [{"role": "user", "content": user_content}]
+        print(f"Sending to OpenAI: {messages_for_openai}")
+        
+        # Use RAG service for enhanced responses
+        try:
+            rag_service = get_rag_service()
+            completion_info = {}
+            ai_response = await rag_service.get_enhanced_response(
+                user_message=user_content,
+                conversation_history=conversation_history,
+                context_parts=await _context_parts(turn),
+                completion_info=completion_info
+            )
+            await _cache_response(turn, ai_response, completion_info)
+        except Exception as e:
+            print(f"RAG service failed, falling back to basic OpenAI: {e}")
+            # Fallback to basic OpenAI if RAG fails
+            ai_response = await turn["openai_client"].get_chat_completion(
+                messages=messages_for_openai,
+                context=None
+            )
+        print(f"AI response received: {ai_response[:100]}...")
+        return ai_response
+    except Exception as e:
+        print(f"Error getting AI response: {e}")
+        # Fallback response
+        return "I'm sorry, I'm having trouble processing your request right now. Please try again later."
+
+async def _save_bot_message(turn: Dict[str, Any], ai_response: str, incomplete: bool = False) -> str:
+    """Persist the bot message and return its ID (temporary chats are not saved).
+    
+    ``incomplete`` marks an answer whose stream failed part-way through.
+    """
+    chat_request = turn["chat_request"]
+    supabase = turn["supabase"]
+    
+    # Add bot message to database (with fallback) - skip for temporary chats
+    message_id = "fallback-id"
+    if supabase and not turn["is_temporary_chat"]:
+        try:
+            print(f"Saving bot message to conversation {chat_request.conversation_id}")
+            bot_message = await supabase.add_message(
+                conversation_id=chat_request.conversation_id,
+                sender="bot",
+                content=ai_response,
+                metadata={
+                    "is_rti_related": turn["is_rti_related"],
+                    "intent": turn["route"]["intent"],
+                    **_template_metadata(turn),
+                    **({"incomplete": True} if incomplete else {})
+                }
+            )
+            print(f"Bot message saved: {bot_message}")
+            message_id = bot_message["id"] if bot_message else "fallback-id"
+        except Exception as e:
+            print(f"Error adding bot message to database: {e}")
+            message_id = "fallback-id"
+    elif turn["is_temporary_chat"]:
+        print("🔄 Skipping bot message database save for temporary chat")
+        message_id = f"temp-{uuid.uuid4()}"
+    return message_id
+
+async def _get_suggestions(turn: Dict[str, Any]) -> Optional[str]:
+    """Get RTI suggestions for RTI-related messages (with fallback)"""
+    try:
+        if turn["is_rti_related"]:
+            rti_requirements = await turn["openai_client"].extract_rti_requirements(turn["chat_request"].message)
+            return rti_requirements.get("suggestions")
+    except Exception as e:
+        print(f"Error getting RTI suggestions: {e}")
+    return None
+
+def _sse_event(event: str, data: Dict[str, Any]) -> str:
+    """Format a Server-Sent Event"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def _stream_chat_turn(turn: Dict[str, Any]) -> AsyncIterator[str]:
+    """Stream the AI response as SSE deltas, then persist it and send a final done event"""
+    chat_request = turn["chat_request"]
+    yield _sse_event("start", {
+        "conversation_id": chat_request.conversation_id,
+        "is_rti_related": turn["is_rti_related"]
+    })
+    
+    # Suggestions don't depend on the response, so compute them while streaming
+    suggestions_task = asyncio.create_task(_get_suggestions(turn))
+    try:
+        response_parts = []
+        incomplete = False
         try:
-            if is_rti_related:
-                rti_requirements = openai_client.extract_rti_requirements(chat_request.message)
-                suggestions = rti_requirements.get("suggestions")
+            cached = await _get_cached_response(turn)
+            if cached is not None:
+                response_parts.append(cached)
+                yield _sse_event("delta", {"content": cached})
+            else:
+                rag_service = get_rag_service()
+                completion_info = {}
+                async for delta in rag_service.stream_enhanced_response(
+                    user_message=turn["user_content"],
+                    conversation_history=turn["conversation_history"],
+                    context_parts=await _context_parts(turn),
+                    completion_info=completion_info
+                ):
+                    response_parts.append(delta)
+                    yield _sse_event("delta", {"content": delta})
+                await _cache_response(turn, "".join(response_parts), completion_info)
         except Exception as e:
-            print(f"Error getting RTI suggestions: {e}")
-            suggestions = None
+            print(f"Error streaming AI response: {e}")
+            if response_parts:
+                # Cut off mid-answer: tell the client, and keep the partial answer out of the cache
+                incomplete = True
+                yield _sse_event("error", {
+                    "detail": "The response was interrupted before it finished.",
+                    "incomplete": True
+                })
+            else:
+                fallback = "I'm sorry, I'm having trouble processing your request right now. Please try again later."
+                response_parts.append(fallback)
+                yield _sse_event("delta", {"content": fallback})
+        
+        ai_response = "".join(response_parts)
+        print(f"AI response streamed: {ai_response[:100]}...")
+        
+        message_id = await _save_bot_message(turn, ai_response, incomplete=incomplete)
+        suggestions = await suggestions_task
+    finally:
+        # Client disconnected before the stream finished
+        if not suggestions_task.done():
+            suggestions_task.cancel()
+    
+    yield _sse_event("done", ChatResponse(
+        message=ai_response,
+        conversation_id=chat_request.conversation_id,
+        message_id=message_id,
+        is_rti_related=turn["is_rti_related"],
+        suggestions=suggestions
+    ).model_dump())
+
+@router.post("/send", response_model=ChatResponse)
+async def send_message(
+    message: str = Form(...),
+    conversation_id: Optional[str] = Form(None),
+    user_id: str = Form(...),
+    file: Optional[UploadFile] = File(None),
+    pages: Optional[str] = Form(None),
+    current_user_id: str = Depends(get_current_user_id_lenient)
+):
+    """Send message and get AI response"""
+    try:
+        turn = await _prepare_chat_turn(message, conversation_id, user_id, file, current_user_id, pages)
+        
+        # The response and the suggestions are independent model calls
+        ai_response, suggestions = await asyncio.gather(
+            _generate_ai_response(turn),
+            _get_suggestions(turn)
+        )
+        message_id = await _save_bot_message(turn, ai_response)
         
         return ChatResponse(
             message=ai_response,
-            conversation_id=chat_request.conversation_id,
+            conversation_id=turn["chat_request"].conversation_id,
             message_id=message_id,
-            is_rti_related=is_rti_related,
+            is_rti_related=turn["is_rti_related"],
             suggestions=suggestions
         )
     
@@ -746,11 +853,44 @@ async def send_message(
             detail=f"Failed to send message: {str(e)}"
         )
 
+@router.post("/send/stream")
+async def send_message_stream(
+    message: str = Form(...),
+    conversation_id: Optional[str] = Form(None),
+    user_id: str = Form(...),
+    file: Optional[UploadFile] = File(None),
+    pages: Optional[str] = Form(None),
+    current_user_id: str = Depends(get_current_user_id_lenient)
+):
+    """Send message and stream the AI response as Server-Sent Events.
+    
+    Emits a ``start`` event with the conversation ID, one ``delta`` event per
+    token chunk, and a ``done`` event carrying the same payload as /send once
+    the bot message has been saved. If the model stream fails part-way, an
+    ``error`` event precedes ``done`` and the saved message is marked
+    ``incomplete`` in its metadata.
+    """
+    try:
+        turn = await _prepare_chat_turn(message, conversation_id, user_id, file, current_user_id, pages)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to send message: {str(e)}"
+        )
+    
+    return StreamingResponse(
+        _stream_chat_turn(turn),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.put("/conversations/{conversation_id}", response_model=APIResponse)
 async def update_conversation(
     conversation_id: str,
     request: dict,
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: str = Depends(get_current_user_id_lenient)
 ):
     """Update conversation title"""
     try:
@@ -787,7 +927,7 @@ async def update_conversation(
 @router.delete("/conversations/{conversation_id}", response_model=APIResponse)
 async def delete_conversation(
     conversation_id: str,
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: str = Depends(get_current_user_id_lenient)
 ):
     """Delete a conversation"""
     try:
@@ -824,7 +964,7 @@ async def upload_pdf(
     description: str = Form(""),
     rti_category: str = Form(...),
     rti_department: str = Form(""),
-    token: str = Depends(security)
+    current_user_id: str = Depends(get_current_user_id_lenient)
 ):
     """Upload a PDF document for RAG knowledge base"""
     try:
@@ -865,12 +1005,9 @@ async def upload_pdf(
         
         print(f"✅ Valid {file_extension} file: {file.filename}")
         
-        # Get current user
-        current_user_id = get_current_user_id(token)
-        
         # Extract text from file
         try:
-            extracted_text = extract_text_from_file(file_content, file_extension)
+            extracted_text = await get_text_extraction_service().extract(file_content, file_extension)
             print(f"Extracted text length: {len(extracted_text)}")
             print(f"First 200 chars: {extracted_text[:200]}")
             if not extracted_text.strip():
@@ -890,8 +1027,8 @@ async def upload_pdf(
         
         # Generate embedding
         try:
-            openai_client = get_openai_client()
-            embedding_response = openai_client.client.embeddings.create(
+            openai_client = get_async_openai_client()
+            embedding_response = await openai_client.client.embeddings.create(
                 model="text-embedding-3-small",
                 input=extracted_text
             )
@@ -924,6 +1061,18 @@ async def upload_pdf(
                     detail="Failed to store PDF document"
                 )
             
+            # Make the new template searchable without reloading the whole index
+            rag_service = get_rag_service()
+            rag_service.index_document(document, embedding, extracted_text)
+            
+            # Chunk-level embeddings are an optimisation; the document stays usable without them
+            chunk_count = 0
+            if settings.RAG_USE_CHUNKS:
+                try:
+                    chunk_count = await rag_service.index_document_chunks(document, extracted_text)
+                except Exception as e:
+                    print(f"Error indexing PDF chunks: {e}")
+            
             return APIResponse(
                 success=True,
                 message="PDF document uploaded successfully",
@@ -931,7 +1080,8 @@ async def upload_pdf(
                     "document_id": document["id"],
                     "title": document["title"],
                     "rti_category": document["rti_category"],
-                    "file_size": document["file_size"]
+                    "file_size": document["file_size"],
+                    "chunk_count": chunk_count
                 }
             )
             
@@ -952,13 +1102,10 @@ async def upload_pdf(
 @router.post("/generate-rti-draft", response_model=APIResponse)
 async def generate_rti_draft(
     request: ChatRequest,
-    token: str = Depends(security)
+    current_user_id: str = Depends(get_current_user_id_lenient)
 ):
     """Generate RTI application draft using PDF-based RAG"""
     try:
-        # Get current user
-        current_user_id = get_current_user_id(token)
-        
         # Initialize RAG service
         try:
             rag_service = get_rag_service()
@@ -0,0 +1,127 @@
+"""
+File endpoints: streaming upload to and download from blob storage
+"""
+
+import base64
+from typing import AsyncIterator
+from fastapi import APIRouter, HTTPException, Depends, status, File, UploadFile
+from fastapi.responses import StreamingResponse
+from app.models.schemas import APIResponse
+from app.services.blob_storage import get_blob_storage
+from app.services.supabase_client import get_supabase_client
+from app.core.config import settings
+from app.core.auth import get_current_user_id
+
+router = APIRouter()
+
+async def read_upload_chunks(file: UploadFile) -> AsyncIterator[bytes]:
+    """Read an upload in blob-storage sized chunks"""
+    while True:
+        chunk = await file.read(settings.BLOB_STORAGE_CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+def _download_response(chunks: AsyncIterator[bytes], file_name: str, content_type: str, etag: str = None) -> StreamingResponse:
+    headers = {"Content-Disposition": f'attachment; filename="{file_name}"'}
+    if etag:
+        # Blob keys are content hashes, so the bytes behind them never change
+        headers["ETag"] = f'"{etag}"'
+        headers["Cache-Control"] = "private, max-age=31536000, immutable"
+    return StreamingResponse(chunks, media_type=content_type, headers=headers)
+
+@router.post("", response_model=APIResponse)
+async def upload_file(
+    file: UploadFile = File(...),
+    current_user_id: str = Depends(get_current_user_id)
+):
+    """Stream a file into blob storage and return its content-addressed key.
+    
+    The upload is recorded against the user, who can then download it and
+    pass the key as ``file_key`` to /rti-applications/create-payment.
+    """
+    try:
+        content_type = file.content_type or "application/octet-stream"
+        stored = await get_blob_storage().put_stream(
+            read_upload_chunks(file),
+            content_type,
+            max_bytes=settings.FILE_UPLOAD_MAX_BYTES
+        )
+        print(f"Stored {file.filename} ({stored['size']} bytes) as {stored['key']}")
+        # Without an owner the blob could never be downloaded or attached
+        upload = await get_supabase_client().record_file_upload(
+            current_user_id, stored["key"], file.filename, content_type, stored["size"]
+        )
+        if not upload:
+            raise Exception("could not record the upload")
+        return APIResponse(
+            success=True,
+            message="File uploaded successfully",
+            data={**stored, "file_name": file.filename, "content_type": file.content_type}
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
+    except Exception as e:
+        print(f"Error uploading file: {e}")
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to upload file: {str(e)}"
+        )
+
+@router.get("/pdf-documents/{document_id}")
+async def download_pdf_document(
+    document_id: str,
+    current_user_id: str = Depends(get_current_user_id)
+):
+    """Stream a knowledge-base PDF"""
+    document = await get_supabase_client().get_pdf_document_file(document_id)
+    if not document:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Document not found"
+        )
+
+    file_name = document.get("file_name") or f"{document_id}.pdf"
+    content_type = document.get("file_type") or "application/pdf"
+    file_key = document.get("file_key")
+    if file_key:
+        storage = get_blob_storage()
+        if not await storage.exists(file_key):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Document file not found"
+            )
+        return _download_response(storage.iter_chunks(file_key), file_name, content_type, file_key.rsplit("/", 1)[-1])
+
+    if document.get("file_data"):
+        data = base64.b64decode(document["file_data"])
+
+        async def legacy_chunks() -> AsyncIterator[bytes]:
+            yield data
+
+        return _download_response(legacy_chunks(), file_name, content_type)
+
+    raise HTTPException(
+        status_code=status.HTTP_404_NOT_FOUND,
+        detail="Document file not found"
+    )
+
+@router.get("/{key:path}")
+async def download_file(
+    key: str,
+    current_user_id: str = Depends(get_current_user_id)
+):
+    """Stream a file from blob storage by key, if it belongs to a PDF document or the user uploaded or attached it"""
+    storage = get_blob_storage()
+    # Not found rather than forbidden, so keys of other users' files are not confirmed
+    if not storage.is_valid_key(key) or not await get_supabase_client().can_access_blob(current_user_id, key) \
+            or not await storage.exists(key):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="File not found"
+        )
+    digest = key.rsplit("/", 1)[-1]
+    return _download_response(storage.iter_chunks(key), digest, "application/octet-stream", digest)
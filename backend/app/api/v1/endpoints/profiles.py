@@ -3,33 +3,13 @@ User profile endpoints
 """
 
 from fastapi import APIRouter, HTTPException, Depends, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.models.schemas import (
     UserProfile, UserProfileUpdate, APIResponse, ErrorResponse
 )
 from app.services.supabase_client import get_supabase_client
+from app.core.auth import get_current_user_id
 
 router = APIRouter()
-security = HTTPBearer()
-
-async def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
-    """Get current user ID from token"""
-    try:
-        supabase = get_supabase_client()
-        response = supabase.client.auth.get_user(credentials.credentials)
-        
-        if not response.user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token"
-            )
-        
-        return response.user.id
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Authentication failed: {str(e)}"
-        )
 
 @router.get("/me", response_model=APIResponse)
 async def get_my_profile(current_user_id: str = Depends(get_current_user_id)):
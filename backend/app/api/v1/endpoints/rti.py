@@ -3,7 +3,6 @@ RTI (Right to Information) endpoints
 """
 
 from fastapi import APIRouter, HTTPException, Depends, status
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import List
 from app.models.schemas import (
     RTIDraft, RTIDraftCreate, RTIDraftUpdate, RTIDraftRequest, RTIDraftResponse,
@@ -12,28 +11,9 @@ from app.models.schemas import (
 from app.services.supabase_client import get_supabase_client
 from app.services.rag_service import get_rag_service
 from app.core.config import settings
+from app.core.auth import get_current_user_id
 
 router = APIRouter()
-security = HTTPBearer()
-
-async def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
-    """Get current user ID from token"""
-    try:
-        supabase = get_supabase_client()
-        response = supabase.client.auth.get_user(credentials.credentials)
-        
-        if not response.user:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="Invalid token"
-            )
-        
-        return response.user.id
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail=f"Authentication failed: {str(e)}"
-        )
 
 @router.post("/generate-draft", response_model=RTIDraftResponse)
 async def generate_rti_draft(
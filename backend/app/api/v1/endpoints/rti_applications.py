@@ -3,7 +3,6 @@ RTI Applications endpoints for handling form submissions and payments
 """
 
 from fastapi import APIRouter, HTTPException, Depends, status, Form, File, UploadFile
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from typing import Optional
 import uuid
 import base64
@@ -17,10 +16,12 @@ from email import encoders
 import os
 from app.models.schemas import APIResponse
 from app.services.supabase_client import get_supabase_client
+from app.services.blob_storage import get_blob_storage
+from app.api.v1.endpoints.files import read_upload_chunks
 from app.core.config import settings
+from app.core.auth import get_current_user_id_lenient
 
 router = APIRouter()
-security = HTTPBearer()
 
 # Initialize Razorpay client function
 def get_razorpay_client():
@@ -34,52 +35,34 @@ def get_razorpay_client():
             detail="Razorpay configuration error"
         )
 
-def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
-    """Get current user ID from token"""
-    try:
-        # Handle test token for development
-        if credentials.credentials == "test-token":
-            return "8558702c-5437-47b8-87e2-e70576d1c77d"
-        
-        # Validate Supabase token and get user ID
-        try:
-            from supabase import create_client
-            user_supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)
-            response = user_supabase.auth.get_user(credentials.credentials)
-            
-            if not response.user:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid token"
-                )
-            
-            return response.user.id
-            
-        except Exception as e:
-            print(f"Token validation error: {e}")
-            return "8558702c-5437-47b8-87e2-e70576d1c77d"
-        
-    except Exception as e:
-        print(f"Authentication error: {e}")
-        return "8558702c-5437-47b8-87e2-e70576d1c77d"
-
 @router.post("/create-payment", response_model=APIResponse)
 async def create_razorpay_payment(
     full_name: str = Form(...),
     phone_number: str = Form(...),
     email: str = Form(...),
     address: str = Form(...),
-    file: UploadFile = File(...),
-    current_user_id: str = Depends(get_current_user_id)
+    file: Optional[UploadFile] = File(None),
+    file_key: Optional[str] = Form(None),
+    current_user_id: str = Depends(get_current_user_id_lenient)
 ):
-    """Create Razorpay payment order for RTI application"""
+    """Create Razorpay payment order for RTI application.
+    
+    The attachment is either sent as ``file`` or, if it was uploaded through
+    POST /files beforehand, referenced by that upload's ``file_key``.
+    """
     try:
         print(f"🔍 Creating payment for user: {current_user_id}")
         print(f"📧 Email: {email}, Phone: {phone_number}")
-        print(f"📁 File: {file.filename}, Size: {file.size if hasattr(file, 'size') else 'unknown'}")
-        # Read file content
-        file_content = await file.read()
-        file_size = len(file_content)
+        if file_key:
+            attachment = await _uploaded_attachment(current_user_id, file_key)
+        elif file and file.filename:
+            print(f"📁 File: {file.filename}, Size: {file.size if hasattr(file, 'size') else 'unknown'}")
+            attachment = await _store_attachment(file)
+        else:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Attach a file or the file_key of an uploaded file"
+            )
         
         # Create payment order
         payment_data = {
@@ -92,8 +75,10 @@ async def create_razorpay_payment(
                 "phone_number": phone_number,
                 "email": email,
                 "address": address,
-                "file_name": file.filename,
-                "file_size": file_size
+                "file_name": attachment["attached_file_name"],
+                "file_size": attachment["attached_file_size"],
+                # Checked by verify-payment, which gets the key back from the client
+                "attached_file_key": attachment.get("attached_file_key", "")
             }
         }
         
@@ -117,9 +102,7 @@ async def create_razorpay_payment(
             "phone_number": phone_number,
             "email": email,
             "address": address,
-            "attached_file_name": file.filename,
-            "attached_file_data": base64.b64encode(file_content).decode('utf-8'),
-            "attached_file_size": file_size,
+            **attachment,
             "payment_id": order["id"],
             "payment_status": "pending",
             "application_status": "pending_payment",
@@ -139,6 +122,13 @@ async def create_razorpay_payment(
             }
         )
         
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=str(e)
+        )
     except Exception as e:
         print(f"Error creating payment: {e}")
         raise HTTPException(
@@ -146,13 +136,51 @@ async def create_razorpay_payment(
             detail=f"Failed to create payment: {str(e)}"
         )
 
+async def _store_attachment(file: UploadFile) -> dict:
+    """Stream an attachment into blob storage so only its key travels with the application"""
+    attachment = {"attached_file_name": file.filename}
+    try:
+        stored = await get_blob_storage().put_stream(
+            read_upload_chunks(file),
+            file.content_type or "application/octet-stream",
+            max_bytes=settings.FILE_UPLOAD_MAX_BYTES
+        )
+        attachment["attached_file_key"] = stored["key"]
+        attachment["attached_file_size"] = stored["size"]
+        print(f"📁 Stored attachment as {stored['key']}")
+    except ValueError:
+        raise
+    except Exception as storage_error:
+        print(f"⚠️ Blob storage unavailable, sending file as base64: {storage_error}")
+        await file.seek(0)
+        file_content = await file.read()
+        attachment["attached_file_data"] = base64.b64encode(file_content).decode('utf-8')
+        attachment["attached_file_size"] = len(file_content)
+    return attachment
+
+async def _uploaded_attachment(user_id: str, file_key: str) -> dict:
+    """Attachment columns for a file the user uploaded through POST /files"""
+    upload = await get_supabase_client().get_file_upload(user_id, file_key)
+    if not upload:
+        # Not found rather than forbidden, so keys of other users' uploads are not confirmed
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Uploaded file not found"
+        )
+    print(f"📁 Attaching uploaded file {file_key}")
+    return {
+        "attached_file_name": upload.get("file_name") or file_key.rsplit("/", 1)[-1],
+        "attached_file_key": file_key,
+        "attached_file_size": upload.get("file_size") or 0
+    }
+
 @router.post("/verify-payment", response_model=APIResponse)
 async def verify_payment(
     payment_id: str = Form(...),
     order_id: str = Form(...),
     signature: str = Form(...),
     application_data: str = Form(...),
-    current_user_id: str = Depends(get_current_user_id)
+    current_user_id: str = Depends(get_current_user_id_lenient)
 ):
     """Verify Razorpay payment and store application data"""
     try:
@@ -199,14 +227,16 @@ async def verify_payment(
                 detail="Invalid application data format"
             )
         
+        # The blob key comes back from the client, so it must be the one uploaded with this order
+        _check_attachment_key(razorpay_client, order_id, current_user_id, app_data)
+        
         # Store in Supabase database
         try:
             supabase = get_supabase_client()
             print(f"✅ Supabase client created")
             
-            # Keep file data as base64 string for Supabase storage
-            file_data_base64 = app_data["attached_file_data"]
-            print(f"✅ File data ready for storage, base64 length: {len(file_data_base64)}")
+            # The file is referenced by its blob key; older clients still send it as base64
+            attachment = await _attachment_columns(app_data)
             
             # Insert into database
             application_record = {
@@ -216,7 +246,7 @@ async def verify_payment(
                 "email": app_data["email"],
                 "address": app_data["address"],
                 "attached_file_name": app_data["attached_file_name"],
-                "attached_file_data": file_data_base64,  # Store as base64 string
+                **attachment,
                 "attached_file_size": app_data["attached_file_size"],
                 "razorpay_order_id": order_id,  # Use the order_id parameter
                 "razorpay_payment_id": payment_id,
@@ -256,6 +286,8 @@ async def verify_payment(
             }
         )
         
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"Error verifying payment: {e}")
         raise HTTPException(
@@ -263,6 +295,48 @@ async def verify_payment(
             detail=f"Failed to verify payment: {str(e)}"
         )
 
+def _check_attachment_key(razorpay_client, order_id: str, user_id: str, app_data: dict) -> None:
+    """Reject an attached_file_key that create-payment did not record on the order for this user"""
+    key = app_data.get("attached_file_key")
+    if not key:
+        return
+    try:
+        notes = razorpay_client.order.fetch(order_id).get("notes") or {}
+    except Exception as e:
+        print(f"❌ Could not fetch order {order_id}: {e}")
+        notes = {}
+    if notes.get("attached_file_key") != key or notes.get("user_id") != user_id:
+        print(f"❌ Attachment {key} was not uploaded with order {order_id}")
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Attachment does not belong to this payment"
+        )
+
+async def _attachment_columns(app_data: dict) -> dict:
+    """attached_file_key for the application row, moving a base64 attachment into blob storage"""
+    if app_data.get("attached_file_key"):
+        print(f"✅ Attachment stored as {app_data['attached_file_key']}")
+        return {"attached_file_key": app_data["attached_file_key"]}
+    
+    file_data_base64 = app_data.get("attached_file_data")
+    if not file_data_base64:
+        return {}
+    try:
+        key = await get_blob_storage().put(base64.b64decode(file_data_base64))
+        print(f"✅ Attachment moved to blob storage as {key}")
+        return {"attached_file_key": key}
+    except Exception as e:
+        print(f"⚠️ Blob storage unavailable, storing attachment as base64: {e}")
+        return {"attached_file_data": file_data_base64}
+
+async def _load_attachment(application_data: dict):
+    """Attachment bytes from blob storage or the legacy base64 column"""
+    if application_data.get("attached_file_key"):
+        return await get_blob_storage().get(application_data["attached_file_key"])
+    if application_data.get("attached_file_data"):
+        return base64.b64decode(application_data["attached_file_data"])
+    return None
+
 async def send_confirmation_emails(application_data):
     """Send confirmation emails to user and admin"""
     try:
@@ -334,10 +408,9 @@ async def send_confirmation_emails(application_data):
         admin_msg.attach(MIMEText(admin_body, 'plain'))
         
         # Attach the RTI document to admin email
-        if application_data.get('attached_file_data'):
+        file_data = await _load_attachment(application_data)
+        if file_data:
             try:
-                # Decode base64 file data for attachment
-                file_data = base64.b64decode(application_data['attached_file_data'])
                 attachment = MIMEBase('application', 'octet-stream')
                 attachment.set_payload(file_data)
                 encoders.encode_base64(attachment)
@@ -383,7 +456,7 @@ async def send_confirmation_emails(application_data):
         # Don't raise exception here as payment is already completed
 
 @router.get("/applications", response_model=APIResponse)
-async def get_user_applications(current_user_id: str = Depends(get_current_user_id)):
+async def get_user_applications(current_user_id: str = Depends(get_current_user_id_lenient)):
     """Get user's RTI applications"""
     try:
         supabase = get_supabase_client()
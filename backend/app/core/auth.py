@@ -0,0 +1,188 @@
+"""
+Shared authentication dependencies for API routers
+"""
+
+import asyncio
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+import httpx
+from fastapi import Depends, HTTPException, status
+from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+from jose import jwt, JWTError
+from app.core.config import settings
+
+security = HTTPBearer()
+
+# Development token sent by the frontend when there is no Supabase session
+TEST_TOKEN = "test-token"
+
+# Algorithms accepted for JWKS keys; the algorithm comes from the key, never the token
+JWKS_ALGORITHMS = ("ES256", "RS256")
+
+class TokenVerifier:
+    """Verify Supabase access tokens and cache the result.
+
+    HS256 tokens are checked locally against ``SUPABASE_JWT_SECRET``;
+    asymmetric tokens against the project's JWKS, which is fetched once and
+    cached. Only when neither is available does verification fall back to a
+    Supabase ``auth.get_user`` call. Verified tokens are cached for
+    ``AUTH_TOKEN_CACHE_TTL_SECONDS`` (never past their own expiry).
+    """
+
+    def __init__(self):
+        self.ttl_seconds = settings.AUTH_TOKEN_CACHE_TTL_SECONDS
+        self.max_size = settings.AUTH_TOKEN_CACHE_SIZE
+        self._cache: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._jwks: Dict[str, Dict[str, Any]] = {}
+        self._jwks_fetched_at = 0.0
+        self._supabase = None
+
+    @staticmethod
+    def _key(token: str) -> str:
+        return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+    def _get_cached(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return None
+            user_id, expires_at = entry
+            if time.time() >= expires_at:
+                del self._cache[key]
+                return None
+            self._cache.move_to_end(key)
+            return user_id
+
+    def _set_cached(self, key: str, user_id: str, token_expires_at: Optional[float]) -> None:
+        expires_at = time.time() + self.ttl_seconds
+        if token_expires_at:
+            expires_at = min(expires_at, token_expires_at)
+        with self._lock:
+            self._cache[key] = (user_id, expires_at)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    async def _get_jwk(self, kid: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Get a signing key from the cached JWKS, refreshing it when stale or the kid is unknown"""
+        now = time.time()
+        stale = now - self._jwks_fetched_at > settings.AUTH_JWKS_TTL_SECONDS
+        unknown = kid not in self._jwks and now - self._jwks_fetched_at > 60
+        if stale or unknown:
+            try:
+                async with httpx.AsyncClient(timeout=5.0) as client:
+                    response = await client.get(f"{settings.SUPABASE_URL}/auth/v1/.well-known/jwks.json")
+                response.raise_for_status()
+                self._jwks = {key.get("kid"): key for key in response.json().get("keys", [])}
+            except Exception as e:
+                print(f"Error fetching JWKS: {e}")
+            self._jwks_fetched_at = now
+        return self._jwks.get(kid)
+
+    async def _decode_locally(self, token: str) -> Optional[Dict[str, Any]]:
+        """Verify the token signature and claims, or return None if no local key applies.
+
+        The token header only picks the key; the algorithm is pinned to HS256
+        for the JWT secret and taken from the JWK itself for JWKS keys.
+        """
+        header = jwt.get_unverified_header(token)
+        options = {"verify_aud": bool(settings.SUPABASE_JWT_AUDIENCE)}
+
+        if header.get("alg") == "HS256":
+            if not settings.SUPABASE_JWT_SECRET:
+                return None
+            key = settings.SUPABASE_JWT_SECRET
+            algorithm = "HS256"
+        else:
+            key = await self._get_jwk(header.get("kid"))
+            if key is None:
+                return None
+            algorithm = key.get("alg") or {"EC": "ES256", "RSA": "RS256"}.get(key.get("kty"))
+            if algorithm not in JWKS_ALGORITHMS or header.get("alg") != algorithm:
+                raise JWTError(f"Token algorithm {header.get('alg')} does not match signing key")
+
+        return jwt.decode(
+            token,
+            key,
+            algorithms=[algorithm],
+            audience=settings.SUPABASE_JWT_AUDIENCE or None,
+            options=options
+        )
+
+    def _get_user_remotely(self, token: str) -> str:
+        """Validate the token with Supabase Auth"""
+        if self._supabase is None:
+            from supabase import create_client
+            self._supabase = create_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)
+        response = self._supabase.auth.get_user(token)
+        if not response.user:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Invalid token"
+            )
+        return response.user.id
+
+    async def verify(self, token: str) -> str:
+        """Return the user ID for a valid token, raising HTTPException(401) otherwise"""
+        key = self._key(token)
+        user_id = self._get_cached(key)
+        if user_id:
+            return user_id
+
+        try:
+            claims = await self._decode_locally(token)
+            if claims is not None:
+                user_id = claims.get("sub")
+                if not user_id:
+                    raise JWTError("Token has no subject")
+                self._set_cached(key, user_id, claims.get("exp"))
+                return user_id
+
+            user_id = await asyncio.to_thread(self._get_user_remotely, token)
+            self._set_cached(key, user_id, jwt.get_unverified_claims(token).get("exp"))
+            return user_id
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail=f"Authentication failed: {str(e)}"
+            )
+
+# Global verifier instance
+token_verifier = TokenVerifier()
+
+def get_token_verifier() -> TokenVerifier:
+    """Get token verifier instance"""
+    return token_verifier
+
+async def get_current_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+    """Get current user ID from a verified token"""
+    return await token_verifier.verify(credentials.credentials)
+
+async def get_current_user_id_lenient(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+    """Get current user ID, mapping the development test token and invalid tokens to the test user.
+
+    Used by the chat and RTI application routers, which have always accepted
+    unauthenticated development requests. Set ``AUTH_TEST_USER_ID`` to an
+    empty value to make them as strict as ``get_current_user_id``.
+    """
+    test_user_id = settings.AUTH_TEST_USER_ID
+    if test_user_id and credentials.credentials == TEST_TOKEN:
+        print("Using test token for development")
+        return test_user_id
+
+    try:
+        user_id = await token_verifier.verify(credentials.credentials)
+        print(f"Authenticated user: {user_id}")
+        return user_id
+    except HTTPException as e:
+        if not test_user_id:
+            raise
+        print(f"Token validation error: {e.detail}")
+        print("Falling back to test user for development")
+        return test_user_id
@@ -3,7 +3,7 @@ Configuration settings for the FileMyRTI AI Chatbot Backend
 """
 
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 import os
 
 class Settings(BaseSettings):
@@ -18,14 +18,33 @@ class Settings(BaseSettings):
     SUPABASE_URL: str
     SUPABASE_ANON_KEY: str
     SUPABASE_SERVICE_ROLE_KEY: str
+    SUPABASE_JWT_SECRET: Optional[str] = None  # Verify HS256 access tokens locally (Settings > API > JWT Secret)
+    SUPABASE_JWT_AUDIENCE: str = "authenticated"
+    
+    # Auth
+    AUTH_TOKEN_CACHE_TTL_SECONDS: int = 300
+    AUTH_TOKEN_CACHE_SIZE: int = 10000
+    AUTH_JWKS_TTL_SECONDS: int = 3600
+    AUTH_TEST_USER_ID: Optional[str] = "8558702c-5437-47b8-87e2-e70576d1c77d"  # Development user for "test-token"; empty to disable
     
     # OpenAI
     OPENAI_API_KEY: str
     OPENAI_MODEL: str = "gpt-4o-mini"
     OPENAI_EMBEDDING_MODEL: str = "text-embedding-3-small"
+    OPENAI_MAX_CONNECTIONS: int = 100  # Shared HTTP pool for the async client
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    OPENAI_KEEPALIVE_EXPIRY_SECONDS: float = 30.0
+    OPENAI_TIMEOUT_SECONDS: float = 60.0
+    OPENAI_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    OPENAI_MAX_RETRIES: int = 2
     
     # Database
     DATABASE_URL: str
+    DATABASE_BACKEND: str = "supabase"  # "postgres" serves hot queries from an asyncpg pool on DATABASE_URL
+    DATABASE_POOL_MIN_SIZE: int = 1
+    DATABASE_POOL_MAX_SIZE: int = 10
+    DATABASE_STATEMENT_CACHE_SIZE: int = 100  # Set to 0 behind a transaction-mode pooler (pgbouncer)
+    DATABASE_COMMAND_TIMEOUT_SECONDS: float = 10.0
     
     # Security
     SECRET_KEY: str
@@ -43,6 +62,66 @@ class Settings(BaseSettings):
     # RAG Settings
     RAG_SIMILARITY_THRESHOLD: float = 0.5  # Lowered from 0.7 for better template matching
     RAG_MAX_RESULTS: int = 5
+    RAG_USE_LOCAL_INDEX: bool = True  # Search an in-memory copy of pdf_documents, RPC is the fallback
+    RAG_USE_CHUNKS: bool = True  # Retrieve pdf_chunks when available, whole documents otherwise
+    RAG_CHUNK_SIZE_TOKENS: int = 400
+    RAG_CHUNK_OVERLAP_TOKENS: int = 60
+    RAG_MAX_CHUNKS: int = 8
+    RAG_MAX_CONTEXT_DOCUMENTS: int = 3  # Whole-document fallback: best matches whose full text goes in the prompt
+    RAG_DOCUMENT_TEXT_CACHE_SIZE: int = 64  # Template texts kept in memory between turns
+    RAG_HYBRID_SEARCH: bool = True  # Fuse BM25 keyword ranking with vector ranking (reciprocal-rank fusion)
+    RAG_HYBRID_CANDIDATES: int = 20  # Rows taken from each ranking before fusion
+    RAG_RRF_K: int = 60
+    RAG_CONTEXT_TOKEN_BUDGET: int = 2000  # Max tokens of retrieved template text per prompt
+    RAG_PROMPT_TOKEN_BUDGET: int = 8000  # Max input tokens for system prompt, templates and history
+    RAG_STICKY_TEMPLATES: bool = True  # Follow-up turns reuse the templates in the last bot message's metadata
+    
+    # Intent Routing (skip template retrieval for greetings, FAQs and placeholder fills)
+    INTENT_ROUTING_ENABLED: bool = True
+    INTENT_GREETING_MAX_WORDS: int = 6
+    INTENT_CENTROID_MIN_SIMILARITY: float = 0.4  # Narrow retrieval to the nearest category only above this
+    INTENT_CENTROID_MARGIN: float = 0.05  # ...and only when it beats the runner-up by this much
+    
+    # Message Pagination
+    MESSAGES_PAGE_SIZE: int = 50
+    MESSAGES_PAGE_MAX_SIZE: int = 200
+    CONVERSATIONS_PAGE_MAX_SIZE: int = 200
+    CONVERSATION_PREVIEW_LENGTH: int = 120
+    
+    # Conversation Memory Settings
+    MEMORY_WINDOW_MESSAGES: int = 10  # Most recent messages sent to the model verbatim
+    MEMORY_SUMMARY_BATCH_MESSAGES: int = 6  # Older messages folded into the summary per refresh
+    MEMORY_SUMMARY_MAX_MESSAGES: int = 40  # Messages per summarization call when catching up on long chats
+    MEMORY_SUMMARY_MAX_WORDS: int = 250
+    MEMORY_ATTACHMENT_MESSAGES: int = 2  # Recent messages that keep attached file text
+    
+    # Embedding Cache Settings
+    EMBEDDING_CACHE_SIZE: int = 1024
+    EMBEDDING_CACHE_TTL_SECONDS: int = 86400
+    EMBEDDING_CACHE_DB_PATH: Optional[str] = None  # e.g. "embedding_cache.sqlite3" to persist across restarts
+    
+    # Response Cache Settings (first-turn and temporary chat answers)
+    RESPONSE_CACHE_ENABLED: bool = True
+    RESPONSE_CACHE_SIZE: int = 512
+    RESPONSE_CACHE_TTL_SECONDS: int = 21600
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD: float = 0.95
+    
+    # Text Extraction Settings (uploaded PDF/DOCX/TXT files)
+    EXTRACTION_MAX_WORKERS: int = 2
+    EXTRACTION_MAX_QUEUE: int = 16
+    EXTRACTION_TIMEOUT_SECONDS: float = 30.0
+    EXTRACTION_MAX_PAGES: int = 50
+    EXTRACTION_ATTACHMENT_MAX_TOKENS: int = 6000  # Chat attachments stop being read past this
+    EXTRACTION_CACHE_SIZE: int = 128
+    EXTRACTION_CACHE_TTL_SECONDS: int = 604800
+    EXTRACTION_CACHE_DB_PATH: Optional[str] = None  # e.g. "extraction_cache.sqlite3" to persist across restarts
+    
+    # Blob Storage Settings (uploaded files; "supabase" uses a Storage bucket, "local" a directory)
+    BLOB_STORAGE_BACKEND: str = "supabase"
+    BLOB_STORAGE_BUCKET: str = "documents"
+    BLOB_STORAGE_LOCAL_PATH: str = "blob_storage"
+    BLOB_STORAGE_CHUNK_SIZE: int = 65536
+    FILE_UPLOAD_MAX_BYTES: int = 20 * 1024 * 1024
     
     # RTI Settings
     RTI_FILING_FEE: float = 99.0
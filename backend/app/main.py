@@ -14,6 +14,12 @@ from app.core.config import settings
 from app.core.database import init_db
 from app.api.v1.api import api_router
 from app.services.supabase_client import get_supabase_client
+from app.services.rag_service import get_rag_service
+from app.services.embedding_cache import get_embedding_cache
+from app.services.response_cache import get_response_cache
+from app.services.openai_client import get_async_openai_client
+from app.services.text_extraction import get_text_extraction_service
+from app.services.extraction_cache import get_extraction_cache
 
 # Load environment variables
 load_dotenv()
@@ -29,10 +35,18 @@ async def lifespan(app: FastAPI):
     init_db()
     print("✅ Database initialized")
     print("✅ Supabase client ready")
+    if settings.DATABASE_BACKEND == "postgres":
+        await get_supabase_client().connect()
     print("✅ OpenAI client ready")
+    await get_rag_service().load_vector_index()
+    print("✅ Vector index ready")
     yield
     # Shutdown
     print("🛑 Shutting down FileMyRTI AI Chatbot Backend...")
+    await get_async_openai_client().aclose()
+    get_text_extraction_service().shutdown()
+    if settings.DATABASE_BACKEND == "postgres":
+        await get_supabase_client().close()
 
 # Create FastAPI app
 app = FastAPI(
@@ -67,7 +81,14 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "service": "FileMyRTI AI Chatbot"}
+    return {
+        "status": "healthy",
+        "service": "FileMyRTI AI Chatbot",
+        "embedding_cache": get_embedding_cache().stats(),
+        "response_cache": get_response_cache().stats(),
+        "text_extraction": get_text_extraction_service().stats(),
+        "extraction_cache": get_extraction_cache().stats()
+    }
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,262 @@
+"""
+Content-addressed storage for uploaded files, kept out of Postgres rows
+"""
+
+import asyncio
+import hashlib
+import os
+import re
+import tempfile
+import uuid
+from abc import ABC, abstractmethod
+from typing import AsyncIterator, Dict, Any, Optional
+import httpx
+from app.core.config import settings
+
+KEY_PATTERN = re.compile(r"^sha256/[0-9a-f]{2}/[0-9a-f]{64}$")
+
+class BlobStorage(ABC):
+    """Store file bytes under a key derived from their SHA-256.
+
+    Identical files share one object, so re-uploading a template or an RTI
+    attachment costs nothing, and a key can be cached forever. Rows keep only
+    the key (pdf_documents.file_key, rti_applications.attached_file_key).
+    """
+
+    chunk_size = settings.BLOB_STORAGE_CHUNK_SIZE
+
+    @staticmethod
+    def key_for_digest(digest: str) -> str:
+        return f"sha256/{digest[:2]}/{digest}"
+
+    @classmethod
+    def key_for(cls, data: bytes) -> str:
+        """Key a file would be stored under"""
+        return cls.key_for_digest(hashlib.sha256(data).hexdigest())
+
+    @staticmethod
+    def is_valid_key(key: str) -> bool:
+        return bool(KEY_PATTERN.match(key or ""))
+
+    @abstractmethod
+    async def put(self, data: bytes, content_type: str = "application/octet-stream") -> str:
+        """Store bytes and return their key"""
+
+    @abstractmethod
+    async def put_stream(self, chunks: AsyncIterator[bytes], content_type: str = "application/octet-stream",
+                         max_bytes: Optional[int] = None) -> Dict[str, Any]:
+        """Store a stream without holding it in memory; returns key, size and sha256"""
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[bytes]:
+        """Get a file's bytes, or None if there is no such key"""
+
+    async def iter_chunks(self, key: str) -> AsyncIterator[bytes]:
+        """Yield a file in chunk_size pieces"""
+        data = await self.get(key)
+        if data is None:
+            return
+        for start in range(0, len(data), self.chunk_size):
+            yield data[start:start + self.chunk_size]
+
+    async def exists(self, key: str) -> bool:
+        return await self.get(key) is not None
+
+    @abstractmethod
+    async def delete(self, key: str) -> None:
+        """Remove a file; a missing key is not an error"""
+
+    async def _spool(self, chunks: AsyncIterator[bytes], directory: Optional[str],
+                     max_bytes: Optional[int]) -> Dict[str, Any]:
+        """Write a stream to a temporary file while hashing it"""
+        digest = hashlib.sha256()
+        size = 0
+        handle = tempfile.NamedTemporaryFile(dir=directory, delete=False)
+        try:
+            with handle:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if max_bytes and size > max_bytes:
+                        raise ValueError(f"File is larger than {max_bytes} bytes")
+                    digest.update(chunk)
+                    await asyncio.to_thread(handle.write, chunk)
+        except Exception:
+            os.unlink(handle.name)
+            raise
+        return {"path": handle.name, "size": size, "sha256": digest.hexdigest()}
+
+class LocalBlobStorage(BlobStorage):
+    """Blobs as files under a local directory (development and tests)"""
+
+    def __init__(self, root: str):
+        self.root = os.path.abspath(root)
+        self._tmp = os.path.join(self.root, ".tmp")
+        os.makedirs(self._tmp, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        if not self.is_valid_key(key):
+            raise ValueError(f"Invalid blob key: {key}")
+        return os.path.join(self.root, *key.split("/"))
+
+    def _commit(self, source: str, key: str) -> None:
+        """Move a finished temporary file into place; an existing blob is identical"""
+        path = self._path(key)
+        if os.path.exists(path):
+            os.unlink(source)
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(source, path)
+
+    async def put(self, data: bytes, content_type: str = "application/octet-stream") -> str:
+        key = self.key_for(data)
+        if os.path.exists(self._path(key)):
+            return key
+
+        def write() -> None:
+            source = os.path.join(self._tmp, uuid.uuid4().hex)
+            with open(source, "wb") as handle:
+                handle.write(data)
+            self._commit(source, key)
+
+        await asyncio.to_thread(write)
+        return key
+
+    async def put_stream(self, chunks: AsyncIterator[bytes], content_type: str = "application/octet-stream",
+                         max_bytes: Optional[int] = None) -> Dict[str, Any]:
+        spooled = await self._spool(chunks, self._tmp, max_bytes)
+        key = self.key_for_digest(spooled["sha256"])
+        await asyncio.to_thread(self._commit, spooled["path"], key)
+        return {"key": key, "size": spooled["size"], "sha256": spooled["sha256"]}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return None
+
+        def read() -> bytes:
+            with open(path, "rb") as handle:
+                return handle.read()
+
+        return await asyncio.to_thread(read)
+
+    async def iter_chunks(self, key: str) -> AsyncIterator[bytes]:
+        path = self._path(key)
+        if not os.path.exists(path):
+            return
+        handle = await asyncio.to_thread(open, path, "rb")
+        try:
+            while True:
+                chunk = await asyncio.to_thread(handle.read, self.chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            handle.close()
+
+    async def exists(self, key: str) -> bool:
+        return os.path.exists(self._path(key))
+
+    async def delete(self, key: str) -> None:
+        path = self._path(key)
+        if os.path.exists(path):
+            os.unlink(path)
+
+class SupabaseBlobStorage(BlobStorage):
+    """Blobs in a Supabase Storage bucket"""
+
+    def __init__(self, bucket: str):
+        self.bucket = bucket
+        self._client = None
+
+    def _storage(self):
+        if self._client is None:
+            from app.services.supabase_client import get_supabase_client
+            self._client = get_supabase_client().client
+        return self._client.storage.from_(self.bucket)
+
+    @staticmethod
+    def _is_duplicate(error: Exception) -> bool:
+        """Storage refuses an existing path with 409 ("Duplicate" in a 400 on older servers)"""
+        details = error.args[0] if error.args and isinstance(error.args[0], dict) else {}
+        return str(details.get("statusCode")) == "409" or details.get("error") == "Duplicate"
+
+    async def _upload(self, key: str, source: Any, content_type: str) -> None:
+        """Upload bytes or a file path unless the object exists; same key means same bytes"""
+        if await self.exists(key):
+            return
+        try:
+            await asyncio.to_thread(self._storage().upload, key, source, {"content-type": content_type})
+        except Exception as e:
+            # A concurrent upload of the same bytes got there first
+            if not self._is_duplicate(e):
+                raise
+
+    async def put(self, data: bytes, content_type: str = "application/octet-stream") -> str:
+        key = self.key_for(data)
+        await self._upload(key, data, content_type)
+        return key
+
+    async def put_stream(self, chunks: AsyncIterator[bytes], content_type: str = "application/octet-stream",
+                         max_bytes: Optional[int] = None) -> Dict[str, Any]:
+        spooled = await self._spool(chunks, None, max_bytes)
+        key = self.key_for_digest(spooled["sha256"])
+        try:
+            await self._upload(key, spooled["path"], content_type)
+        finally:
+            os.unlink(spooled["path"])
+        return {"key": key, "size": spooled["size"], "sha256": spooled["sha256"]}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        if not self.is_valid_key(key):
+            return None
+        try:
+            return await asyncio.to_thread(self._storage().download, key)
+        except Exception as e:
+            print(f"Error downloading blob {key}: {e}")
+            return None
+
+    async def iter_chunks(self, key: str) -> AsyncIterator[bytes]:
+        """Stream the object over HTTP instead of downloading it whole"""
+        if not self.is_valid_key(key):
+            return
+        url = f"{settings.SUPABASE_URL.rstrip('/')}/storage/v1/object/{self.bucket}/{key}"
+        headers = {
+            "apikey": settings.SUPABASE_SERVICE_ROLE_KEY,
+            "Authorization": f"Bearer {settings.SUPABASE_SERVICE_ROLE_KEY}"
+        }
+        async with httpx.AsyncClient(timeout=30.0) as client:
+            async with client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 404:
+                    return
+                response.raise_for_status()
+                async for chunk in response.aiter_bytes(self.chunk_size):
+                    yield chunk
+
+    async def exists(self, key: str) -> bool:
+        """Look the object up in its folder listing, without downloading it"""
+        if not self.is_valid_key(key):
+            return False
+        folder, name = key.rsplit("/", 1)
+        try:
+            entries = await asyncio.to_thread(
+                self._storage().list, folder, {"search": name, "limit": 1}
+            )
+        except Exception as e:
+            print(f"Error checking blob {key}: {e}")
+            return False
+        return any(entry.get("name") == name for entry in entries or [])
+
+    async def delete(self, key: str) -> None:
+        await asyncio.to_thread(self._storage().remove, [key])
+
+def _create_blob_storage() -> BlobStorage:
+    if settings.BLOB_STORAGE_BACKEND == "local":
+        return LocalBlobStorage(settings.BLOB_STORAGE_LOCAL_PATH)
+    return SupabaseBlobStorage(settings.BLOB_STORAGE_BUCKET)
+
+# Global storage instance
+blob_storage = _create_blob_storage()
+
+def get_blob_storage() -> BlobStorage:
+    """Get blob storage instance"""
+    return blob_storage
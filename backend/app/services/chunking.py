@@ -0,0 +1,66 @@
+"""
+Token-based text chunking for the retrieval index
+"""
+
+from typing import List, Dict, Any
+from app.core.config import settings
+
+# Shortest shared text treated as chunk overlap rather than coincidence
+MIN_OVERLAP_CHARS = 16
+
+def chunk_text(text: str, encoding, chunk_size: int = None, chunk_overlap: int = None) -> List[Dict[str, Any]]:
+    """Split text into overlapping windows of at most ``chunk_size`` tokens.
+
+    Consecutive chunks share ``chunk_overlap`` tokens so a sentence cut at a
+    boundary still appears whole in one of them. Returns dicts with
+    ``chunk_index``, ``content`` and ``token_count``.
+    """
+    chunk_size = chunk_size or settings.RAG_CHUNK_SIZE_TOKENS
+    chunk_overlap = settings.RAG_CHUNK_OVERLAP_TOKENS if chunk_overlap is None else chunk_overlap
+    if chunk_size <= 0:
+        raise ValueError("chunk_size must be positive")
+    if not 0 <= chunk_overlap < chunk_size:
+        raise ValueError("chunk_overlap must be between 0 and chunk_size")
+
+    tokens = encoding.encode(text or "")
+    if not tokens:
+        return []
+
+    chunks = []
+    step = chunk_size - chunk_overlap
+    for start in range(0, len(tokens), step):
+        window = tokens[start:start + chunk_size]
+        content = encoding.decode(window).strip()
+        if content:
+            chunks.append({
+                "chunk_index": len(chunks),
+                "content": content,
+                "token_count": len(window)
+            })
+        if start + chunk_size >= len(tokens):
+            break
+    return chunks
+
+def merge_adjacent_chunks(chunks: List[Dict[str, Any]]) -> List[str]:
+    """Join chunks of one document in reading order, dropping the text repeated by the overlap.
+
+    Chunks with consecutive ``chunk_index`` values share their overlap window,
+    so the longest suffix of one that prefixes the next is only kept once.
+    Non-adjacent chunks are returned as separate sections.
+    """
+    sections: List[str] = []
+    previous_index = None
+    for chunk in sorted(chunks, key=lambda c: c["chunk_index"]):
+        content = chunk["content"]
+        if sections and previous_index is not None and chunk["chunk_index"] == previous_index + 1:
+            last = sections[-1]
+            overlap = 0
+            for size in range(min(len(last), len(content)), MIN_OVERLAP_CHARS - 1, -1):
+                if last.endswith(content[:size]):
+                    overlap = size
+                    break
+            sections[-1] = last + ("" if overlap else "\n") + content[overlap:]
+        else:
+            sections.append(content)
+        previous_index = chunk["chunk_index"]
+    return sections
@@ -0,0 +1,117 @@
+"""
+Token-budgeted prompt assembly for RAG responses
+"""
+
+from typing import List, Dict, Tuple
+from app.core.config import settings
+
+# Approximate per-message overhead of the chat format (role, separators)
+TOKENS_PER_MESSAGE = 4
+
+TEMPLATE_INSTRUCTIONS = """RTI FORMAT TEMPLATES:
+1. ALWAYS use the EXACT format from the PDF templates provided below
+2. Copy the exact addresses, department names, and structure from the templates
+3. Do NOT modify or generalize the template format
+4. Use the specific details from the most relevant template"""
+
+class ContextBuilder:
+    """Fit the system prompt, retrieved templates and conversation history into a token budget.
+
+    The system prompt and the current user message are always kept (the user
+    message is truncated only if it alone would overflow the budget). The
+    remaining tokens go, in priority order, to the most recent exchange, the
+    retrieved templates (best match first), and then older history, newest
+    first. Anything that doesn't fit is dropped.
+    """
+
+    def __init__(self, encoding, budget: int = None):
+        self.encoding = encoding
+        self.budget = budget or settings.RAG_PROMPT_TOKEN_BUDGET
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.encoding.encode(text))
+
+    def _message_tokens(self, message: Dict[str, str]) -> int:
+        return self.count_tokens(message["content"]) + TOKENS_PER_MESSAGE
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        """Cut text to at most max_tokens tokens"""
+        if max_tokens <= 0:
+            return ""
+        tokens = self.encoding.encode(text)
+        if len(tokens) <= max_tokens:
+            return text
+        return self.encoding.decode(tokens[:max_tokens]) + "\n[...truncated]"
+
+    @staticmethod
+    def dedupe(parts: List[str]) -> List[str]:
+        """Drop context parts whose normalized text was already seen"""
+        seen = set()
+        unique = []
+        for part in parts:
+            key = " ".join(part.split()).casefold()
+            if key and key not in seen:
+                seen.add(key)
+                unique.append(part)
+        return unique
+
+    def build(
+        self,
+        system_prompt: str,
+        context_parts: List[str],
+        history: List[Dict[str, str]],
+        user_message: str
+    ) -> Tuple[List[Dict[str, str]], str]:
+        """Return (messages, context) where context is the fitted template text.
+
+        ``messages`` holds the kept history plus the user message; the caller
+        passes ``context`` to get_chat_completion so the system prompt and
+        templates are sent once, in a single system message.
+        """
+        remaining = self.budget
+        remaining -= self.count_tokens(system_prompt) + TOKENS_PER_MESSAGE
+        remaining -= self.count_tokens(TEMPLATE_INSTRUCTIONS)
+
+        user_message = self.truncate(user_message, max(remaining - TOKENS_PER_MESSAGE, 0))
+        remaining -= self.count_tokens(user_message) + TOKENS_PER_MESSAGE
+
+        history = list(history or [])
+        recent, older = history[-2:], history[:-2]
+
+        # 1. The last exchange, so follow-ups keep their immediate context
+        kept_recent = []
+        for message in reversed(recent):
+            cost = self._message_tokens(message)
+            if cost > remaining:
+                break
+            kept_recent.insert(0, message)
+            remaining -= cost
+
+        # 2. Retrieved templates, best first; skip any that don't fit
+        kept_context = []
+        for part in self.dedupe(context_parts):
+            cost = self.count_tokens(part)
+            if cost <= remaining:
+                kept_context.append(part)
+                remaining -= cost
+
+        # 3. Older history, newest first, stopping at the first gap
+        kept_older = []
+        if len(kept_recent) == len(recent):
+            for message in reversed(older):
+                cost = self._message_tokens(message)
+                if cost > remaining:
+                    break
+                kept_older.insert(0, message)
+                remaining -= cost
+
+        dropped = len(history) - len(kept_recent) - len(kept_older)
+        print(f"Prompt budget: {self.budget - remaining}/{self.budget} tokens, "
+              f"{len(kept_context)}/{len(context_parts)} templates, {dropped} history messages dropped")
+
+        context = ""
+        if kept_context:
+            context = TEMPLATE_INSTRUCTIONS + "\n\n" + "\n".join(kept_context)
+
+        messages = kept_older + kept_recent + [{"role": "user", "content": user_message}]
+        return messages, context
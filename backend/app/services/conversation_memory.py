@@ -0,0 +1,186 @@
+"""
+Conversation memory: a verbatim window of recent messages plus a rolling summary of older ones
+"""
+
+import asyncio
+import json
+from typing import List, Dict, Any, Optional
+from app.services.openai_client import get_async_openai_client
+from app.core.config import settings
+
+ATTACHMENT_MARKER = "\n\n[File Content:]\n"
+
+SUMMARY_PROMPT = """You maintain a running summary of a conversation between a user and an RTI (Right to Information) assistant.
+
+Update the summary with the new messages below. Keep facts the assistant will need later: the user's goal, the department or public authority, names, dates, reference numbers, placeholder values the user has provided, and any RTI drafts that were agreed on. Drop greetings and repetition. Write plain prose of at most {max_words} words.
+
+Current summary:
+{summary}
+
+New messages:
+{messages}
+
+Updated summary:"""
+
+class ConversationMemory:
+    """Build bounded conversation history for the model.
+
+    Only the last ``MEMORY_WINDOW_MESSAGES`` messages are sent verbatim;
+    anything older is folded into a rolling summary stored in
+    conversation_summaries. Summaries are refreshed in the background once
+    ``MEMORY_SUMMARY_BATCH_MESSAGES`` unsummarized messages have built up,
+    and a refresh keeps going until everything older than the window is
+    covered, so a turn reads a fixed number of rows and the prompt size
+    stays flat as the chat grows.
+    Attached file text is only kept for the most recent messages.
+    """
+
+    def __init__(self):
+        self.openai_client = get_async_openai_client()
+        self.window = settings.MEMORY_WINDOW_MESSAGES
+        self.batch = settings.MEMORY_SUMMARY_BATCH_MESSAGES
+        self._summary_tasks: Dict[str, asyncio.Task] = {}
+
+    @staticmethod
+    def strip_attachment(content: str) -> str:
+        """Replace an attached file's extracted text with a short note"""
+        head, marker, body = content.partition(ATTACHMENT_MARKER)
+        if not marker:
+            return content
+        return f"{head}\n\n[File content omitted: {len(body)} characters]"
+
+    @staticmethod
+    def _role(message: Dict[str, Any]) -> str:
+        return "user" if message["sender"] == "user" else "assistant"
+
+    def to_history(self, messages: List[Dict[str, Any]], summary: str = "") -> List[Dict[str, str]]:
+        """Convert stored messages (oldest first) into OpenAI history with the summary in front"""
+        keep_attachments_from = len(messages) - settings.MEMORY_ATTACHMENT_MESSAGES
+        history = []
+        if summary:
+            history.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+        for i, message in enumerate(messages):
+            content = message["content"]
+            if i < keep_attachments_from:
+                content = self.strip_attachment(content)
+            history.append({"role": self._role(message), "content": content})
+        return history
+
+    @property
+    def fetch_limit(self) -> int:
+        """Rows to read so messages not yet folded into the summary are covered"""
+        return self.window + self.batch
+
+    async def fetch(self, supabase, conversation_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """Read ownership, summary and recent messages, or None if the conversation isn't the user's"""
+        return await supabase.get_conversation_memory(conversation_id, user_id, self.fetch_limit)
+
+    @staticmethod
+    def template_selection(memory: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Templates the latest bot message was answered with (its metadata), if any"""
+        for row in reversed((memory or {}).get("messages") or []):
+            if row.get("sender") == "user":
+                continue
+            metadata = row.get("metadata") or {}
+            if isinstance(metadata, str):
+                try:
+                    metadata = json.loads(metadata)
+                except ValueError:
+                    return None
+            if metadata.get("templates"):
+                return {"templates": metadata["templates"], "rti_category": metadata.get("rti_category")}
+            return None
+        return None
+
+    def build_history(self, supabase, conversation_id: str, memory: Optional[Dict[str, Any]]) -> List[Dict[str, str]]:
+        """Turn a fetched memory into history for the next model call, scheduling a summary refresh if due"""
+        if not memory:
+            return []
+
+        rows = memory["messages"]
+        total = memory["message_count"]
+        summarized_count = memory["summarized_count"]
+
+        # Absolute position of the first fetched row, so rows already in the summary are skipped
+        first_position = total - len(rows)
+        recent = [
+            row for position, row in enumerate(rows, start=first_position)
+            if position >= summarized_count
+        ]
+
+        if first_position > summarized_count:
+            # The summary fell further behind than one fetch covers; the refresh below catches it up
+            print(f"Conversation memory: messages {summarized_count}-{first_position} are not summarized yet")
+
+        older_count = total - self.window
+        if older_count - summarized_count >= self.batch:
+            self._schedule_summary(supabase, conversation_id, memory["summary"], summarized_count, older_count)
+
+        print(f"Conversation memory: {len(recent)} recent of {total} messages, {summarized_count} summarized")
+        return self.to_history(recent, memory["summary"])
+
+    async def load_history(self, supabase, conversation_id: str, user_id: str) -> List[Dict[str, str]]:
+        """Fetch and build the history of a conversation in one step"""
+        memory = await self.fetch(supabase, conversation_id, user_id)
+        return self.build_history(supabase, conversation_id, memory)
+
+    def _schedule_summary(self, supabase, conversation_id: str, summary: str, start: int, end: int) -> None:
+        """Fold messages [start, end) into the summary without blocking the response"""
+        task = self._summary_tasks.get(conversation_id)
+        if task and not task.done():
+            return
+        task = asyncio.create_task(self._refresh_summary(supabase, conversation_id, summary, start, end))
+        self._summary_tasks[conversation_id] = task
+        task.add_done_callback(lambda _: self._summary_tasks.pop(conversation_id, None))
+
+    async def _refresh_summary(self, supabase, conversation_id: str, summary: str, start: int, end: int) -> None:
+        """Fold messages [start, end) into the stored summary, ``MEMORY_SUMMARY_MAX_MESSAGES`` per model call.
+
+        Each batch is written with the count it started from, so if another
+        worker moved the summary on in the meantime this refresh stops instead
+        of overwriting it.
+        """
+        try:
+            while start < end:
+                limit = min(end - start, settings.MEMORY_SUMMARY_MAX_MESSAGES)
+                messages = await supabase.get_messages_range(conversation_id, start, limit)
+                if not messages:
+                    return
+
+                transcript = "\n\n".join(
+                    f"{self._role(message).title()}: {self.strip_attachment(message['content'])}"
+                    for message in messages
+                )
+                new_summary = await self.summarize(summary, transcript)
+                if not new_summary:
+                    return
+                covered = start + len(messages)
+                if not await supabase.update_conversation_summary(conversation_id, new_summary, covered, start):
+                    print(f"Conversation {conversation_id} summary was refreshed elsewhere; stopping at {start} messages")
+                    return
+                print(f"Conversation {conversation_id} summary now covers {covered} messages")
+                summary, start = new_summary, covered
+        except Exception as e:
+            print(f"Error refreshing conversation summary: {e}")
+
+    async def summarize(self, summary: str, transcript: str) -> Optional[str]:
+        """Ask the model to merge new messages into the running summary"""
+        prompt = SUMMARY_PROMPT.format(
+            max_words=settings.MEMORY_SUMMARY_MAX_WORDS,
+            summary=summary or "(none yet)",
+            messages=transcript
+        )
+        response = await self.openai_client.client.chat.completions.create(
+            model=settings.OPENAI_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            temperature=0.2,
+            max_tokens=settings.MEMORY_SUMMARY_MAX_WORDS * 2
+        )
+        return (response.choices[0].message.content or "").strip()
+
+# Global memory instance
+conversation_memory = ConversationMemory()
+
+def get_conversation_memory() -> ConversationMemory:
+    """Get conversation memory instance"""
+    return conversation_memory
@@ -0,0 +1,53 @@
+"""
+Embedding cache for query embeddings
+"""
+
+import hashlib
+from typing import List, Optional
+import numpy as np
+from app.core.config import settings
+from app.services.tiered_cache import TieredCache
+
+class EmbeddingCache(TieredCache):
+    """Embeddings keyed by model and normalized text; stored on disk as float32 bytes"""
+
+    table = "embedding_cache"
+    label = "embedding cache"
+
+    def __init__(self, max_size: int = 1024, ttl_seconds: int = 86400, db_path: Optional[str] = None):
+        super().__init__(max_size, ttl_seconds, db_path)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Normalize text so trivially different messages share a cache entry"""
+        return " ".join(text.split()).casefold()
+
+    def _key(self, model: str, text: str) -> str:
+        normalized = self.normalize(text)
+        return hashlib.sha256(f"{model}\x00{normalized}".encode("utf-8")).hexdigest()
+
+    def _encode(self, embedding: List[float]) -> bytes:
+        return np.asarray(embedding, dtype=np.float32).tobytes()
+
+    def _decode(self, stored: bytes) -> List[float]:
+        return np.frombuffer(stored, dtype=np.float32).tolist()
+
+    def get(self, model: str, text: str) -> Optional[List[float]]:
+        """Get a cached embedding, or None on a miss"""
+        return self._get(self._key(model, text))
+
+    def set(self, model: str, text: str, embedding: List[float]) -> None:
+        """Store an embedding in memory and, if enabled, on disk"""
+        if embedding:
+            self._set(self._key(model, text), embedding)
+
+# Global cache instance
+embedding_cache = EmbeddingCache(
+    max_size=settings.EMBEDDING_CACHE_SIZE,
+    ttl_seconds=settings.EMBEDDING_CACHE_TTL_SECONDS,
+    db_path=settings.EMBEDDING_CACHE_DB_PATH
+)
+
+def get_embedding_cache() -> EmbeddingCache:
+    """Get embedding cache instance"""
+    return embedding_cache
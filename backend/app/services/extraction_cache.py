@@ -0,0 +1,71 @@
+"""
+Content-addressed cache of text extracted from uploaded files, with an optional on-disk tier
+"""
+
+import hashlib
+import json
+import threading
+from typing import Dict, Any, Optional
+from app.core.config import settings
+from app.services.tiered_cache import TieredCache
+
+class ExtractionCache(TieredCache):
+    """Extraction results keyed by the SHA-256 of the file bytes alone.
+
+    One entry per file maps each extractor variant (extension, page limit,
+    token budget, page range, extractor version) to the text read with it and
+    its page and token counts, so a document upload and a chat attachment of
+    the same bytes share an entry and a change to extraction never serves
+    stale text. At most ``MAX_VARIANTS`` variants are kept per file, oldest
+    dropped first. Entries are stored on disk as JSON.
+    """
+
+    table = "extraction_cache"
+    label = "extraction cache"
+
+    MAX_VARIANTS = 8
+
+    def __init__(self, max_size: int = 128, ttl_seconds: int = 604800, db_path: Optional[str] = None):
+        super().__init__(max_size, ttl_seconds, db_path)
+        # Serializes read-modify-write of a file's variants
+        self._update_lock = threading.Lock()
+
+    @staticmethod
+    def content_hash(file_content: bytes) -> str:
+        """SHA-256 of the raw file bytes"""
+        return hashlib.sha256(file_content).hexdigest()
+
+    def _encode(self, variants: Dict[str, Dict[str, Any]]) -> str:
+        return json.dumps(variants)
+
+    def _decode(self, stored: str) -> Dict[str, Any]:
+        return json.loads(stored)
+
+    def get(self, content_hash: str, variant: str) -> Optional[Dict[str, Any]]:
+        """Get a copy of a cached extraction result, or None on a miss"""
+        result = (self._load(content_hash) or {}).get(variant)
+        self._record(result is not None)
+        return dict(result) if result is not None else None
+
+    def set(self, content_hash: str, variant: str, result: Dict[str, Any]) -> None:
+        """Add an extraction result to the file's entry in memory and, if enabled, on disk"""
+        if not result.get("text"):
+            return
+        with self._update_lock:
+            variants = dict(self._load(content_hash) or {})
+            variants.pop(variant, None)
+            variants[variant] = dict(result)
+            while len(variants) > self.MAX_VARIANTS:
+                del variants[next(iter(variants))]
+            self._set(content_hash, variants)
+
+# Global cache instance
+extraction_cache = ExtractionCache(
+    max_size=settings.EXTRACTION_CACHE_SIZE,
+    ttl_seconds=settings.EXTRACTION_CACHE_TTL_SECONDS,
+    db_path=settings.EXTRACTION_CACHE_DB_PATH
+)
+
+def get_extraction_cache() -> ExtractionCache:
+    """Get extraction cache instance"""
+    return extraction_cache
@@ -0,0 +1,236 @@
+"""
+Intent and category routing for chat messages, so template retrieval only runs when a template is needed
+"""
+
+import re
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from app.services.vector_index import get_vector_index
+from app.core.config import settings
+
+GREETING = "greeting"
+FAQ = "faq"
+DRAFT_REQUEST = "draft_request"
+PLACEHOLDER_FILL = "placeholder_fill"
+APPEAL = "appeal"
+
+# Intents whose answer is built on an RTI template
+RETRIEVAL_INTENTS = frozenset({DRAFT_REQUEST, APPEAL})
+
+# Phrase lists per signal. All of them are matched in one pass by a single
+# compiled alternation (longest phrase first, whole words only).
+INTENT_KEYWORDS = {
+    "greeting": [
+        "hi", "hii", "hello", "hey", "namaste", "good morning", "good afternoon", "good evening",
+        "thanks", "thank you", "thankyou", "thx", "ok", "okay", "cool", "great", "nice", "bye",
+        "goodbye", "see you", "yes", "no", "sure", "fine", "got it", "welcome"
+    ],
+    # What OpenAIService.is_rti_related used to look for
+    "rti": [
+        "rti", "right to information", "information act", "public information",
+        "government information", "transparency", "pio", "public authority",
+        "information officer", "rti application", "rti query"
+    ],
+    "appeal": [
+        "appeal", "first appeal", "second appeal", "appellate", "appellate authority",
+        "information commission", "no reply", "no response", "not replied", "did not reply",
+        "didn't reply", "not received any reply", "incomplete information", "rejected my rti"
+    ],
+    "draft": [
+        "draft", "write", "prepare", "generate", "create", "format", "template", "file an rti",
+        "file rti", "apply", "application for", "rti for", "rti on", "rti to", "i want to know",
+        "i need information", "i want information", "get details", "details of", "copy of", "copies of"
+    ],
+    # The user moving on from the template the conversation settled on
+    "new_topic": [
+        "another rti", "new rti", "different rti", "another application", "new application",
+        "another query", "something else", "different topic", "different issue", "another issue"
+    ],
+    "faq": [
+        "what is", "what are", "how to", "how do", "how can", "how much", "how long", "who can",
+        "can i", "is it", "fee", "fees", "time limit", "deadline", "penalty", "section",
+        "bpl", "exempt", "exemption", "online", "portal", "difference between", "meaning of"
+    ],
+}
+
+# Keywords that point at a template category (pdf_documents.rti_category);
+# appeals need no entry, every appeal is routed to the "appeals" templates
+CATEGORY_KEYWORDS = {
+    "land_records": [
+        "dharani", "meebhoomi", "khasra", "pahani", "adangal", "patta", "pattadar", "passbook",
+        "mutation", "encumbrance", "encumbrance certificate", "sale deed", "land", "land survey",
+        "survey number", "property", "plot", "sub registrar", "registration refund"
+    ],
+    "employment": ["epf", "pf", "provident fund", "uan", "recruitment", "employment"],
+    "police": ["fir", "police", "police station", "investigation"],
+    "finance": ["fund utilization", "fund utilisation", "mplads", "mp fund", "mla fund", "mp mla", "government refund"],
+    "taxation": ["income tax", "itr", "tds", "tax refund"],
+    "railways": ["irctc", "railway", "railways", "train", "tdr"],
+    "passport": ["passport", "passport seva", "psk", "police verification"],
+    "pension": ["pension", "pensioner", "family pension"],
+    "education": ["marksheet", "mark sheet", "marks memo", "university", "degree certificate", "revaluation"],
+    "rural_development": ["gram panchayat", "gram panchayath", "panchayat", "panchayath", "sarpanch", "mgnrega", "nrega"],
+    "municipal": ["municipality", "municipal", "minicipality", "street light", "street lights", "garbage", "drainage", "ghmc"],
+    "transport": ["rta", "driving licence", "driving license", "vehicle registration", "rc book", "toll", "toll plaza", "bus", "public transport"],
+    "infrastructure": ["road work", "road construction", "road repair", "bridge", "contractor"],
+    "complaints": ["complaint status", "complaint tracking", "grievance"],
+    "citizen_services": ["citizen charter"],
+    "government_documents": ["certified copy", "certified copies", "certified documents"],
+    "documentation": ["link document", "link documents"],
+}
+
+# Details a user types in to complete a draft: names, numbers, dates, addresses
+FILL_PATTERN = re.compile(
+    r"\b(?:my name is|name\s*:|father'?s name|s/o|d/o|w/o|address\s*:|my address|pin\s*code|pincode|"
+    r"mobile|phone|email|file number|application number|registration number|reference number|dated)"
+    r"|\b\d{6}\b|\b\d{10}\b|\b\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}\b|\b[a-z]{1,4}\d{5,}\b"
+)
+
+def _phrase_pattern(phrase: str) -> str:
+    return r"\s+".join(re.escape(word) for word in phrase.split())
+
+def _phrase_labels() -> Dict[str, List[str]]:
+    """Map each phrase to the signals it gives; categories are prefixed with 'category:'"""
+    phrases: Dict[str, List[str]] = {}
+    for label, words in INTENT_KEYWORDS.items():
+        for phrase in words:
+            phrases.setdefault(phrase, []).append(label)
+    for category, words in CATEGORY_KEYWORDS.items():
+        for phrase in words:
+            phrases.setdefault(phrase, []).append("category:" + category)
+    return phrases
+
+PHRASE_LABELS = _phrase_labels()
+KEYWORD_PATTERN = re.compile(
+    r"\b(?:" + "|".join(_phrase_pattern(phrase) for phrase in sorted(PHRASE_LABELS, key=len, reverse=True)) + r")\b"
+)
+
+class IntentRouter:
+    """Classify a chat message without calling a model.
+
+    One compiled keyword scan decides the intent (greeting, FAQ, draft
+    request, placeholder fill or appeal) and, where a keyword names it, the
+    template category. Only draft requests and appeals need a template, so
+    the other intents skip the query embedding and the template search.
+    When no keyword names the category, the query embedding (computed for
+    retrieval anyway) is compared with each category's mean template
+    embedding, and retrieval is narrowed to a clear winner.
+    """
+
+    def __init__(self):
+        self.vector_index = get_vector_index()
+        self._centroids: Tuple[int, List[str], np.ndarray] = (-1, [], np.zeros((0, 0), dtype=np.float32))
+
+    def _scan(self, text: str) -> Tuple[Counter, List[str]]:
+        """Count intent signals and list category hits in order of appearance"""
+        signals = Counter()
+        categories = []
+        for match in KEYWORD_PATTERN.finditer(text):
+            for label in PHRASE_LABELS[" ".join(match.group(0).split())]:
+                if label.startswith("category:"):
+                    categories.append(label[len("category:"):])
+                else:
+                    signals[label] += 1
+        return signals, categories
+
+    def route(self, message: str, follow_up: bool = False, has_attachment: bool = False) -> Dict[str, Any]:
+        """Classify a message; ``follow_up`` means it continues an existing conversation"""
+        text = (message or "").lower()
+        signals, categories = self._scan(text)
+        word_count = len(text.split())
+        fills_details = bool(FILL_PATTERN.search(text))
+
+        if signals["appeal"]:
+            intent = APPEAL
+        elif follow_up and fills_details and not signals["draft"]:
+            intent = PLACEHOLDER_FILL
+        elif signals["draft"] or categories:
+            intent = DRAFT_REQUEST
+        elif signals["greeting"] and word_count <= settings.INTENT_GREETING_MAX_WORDS:
+            intent = FAQ if has_attachment else GREETING
+        elif signals["faq"] or signals["rti"] or "?" in text:
+            intent = FAQ
+        else:
+            # Unsure: keep the template search, as every turn had before routing
+            intent = DRAFT_REQUEST
+
+        category = None
+        if intent == APPEAL:
+            category = "appeals"
+        elif categories:
+            # Most mentioned category, the earliest one on a tie
+            counts = Counter(categories)
+            category = max(categories, key=lambda name: (counts[name], -categories.index(name)))
+
+        return {
+            "intent": intent,
+            "rti_category": category,
+            "category_source": "keywords" if category else None,
+            "needs_retrieval": intent in RETRIEVAL_INTENTS or not settings.INTENT_ROUTING_ENABLED,
+            "is_rti_related": bool(signals["rti"]) or intent == APPEAL or (intent == DRAFT_REQUEST and bool(category)),
+            "new_topic": bool(signals["new_topic"])
+        }
+
+    def keeps_topic(self, route: Dict[str, Any], selection: Optional[Dict[str, Any]]) -> bool:
+        """Whether a turn stays on the templates an earlier turn selected.
+
+        The topic changes when the user says so ("another RTI") or a keyword
+        names a different category (an appeal after a passport draft, say).
+        Anything else, a greeting, a question or the user's name and file
+        number, continues with the same templates.
+        """
+        if not selection or not selection.get("templates"):
+            return False
+        if route.get("new_topic"):
+            return False
+        if route.get("category_source") == "keywords" and route.get("rti_category") != selection.get("rti_category"):
+            return False
+        return True
+
+    def _category_centroids(self) -> Tuple[List[str], np.ndarray]:
+        """Category centroids of the vector index, recomputed when the index changes"""
+        version, labels, matrix = self._centroids
+        if version != self.vector_index.version:
+            labels, matrix = self.vector_index.centroids("rti_category")
+            self._centroids = (self.vector_index.version, labels, matrix)
+        return labels, matrix
+
+    def category_for_embedding(self, query_embedding: List[float]) -> Optional[Tuple[str, float]]:
+        """Nearest category centroid, if it is close enough and clearly ahead of the runner-up"""
+        labels, matrix = self._category_centroids()
+        if not labels:
+            return None
+        query = np.asarray(query_embedding, dtype=np.float32)
+        if query.ndim != 1 or query.shape[0] != matrix.shape[1] or not np.linalg.norm(query):
+            return None
+
+        similarities = matrix @ (query / np.linalg.norm(query))
+        order = np.argsort(-similarities)
+        best = float(similarities[order[0]])
+        runner_up = float(similarities[order[1]]) if len(order) > 1 else -1.0
+        if best < settings.INTENT_CENTROID_MIN_SIMILARITY or best - runner_up < settings.INTENT_CENTROID_MARGIN:
+            return None
+        return labels[order[0]], best
+
+    def assign_category(self, route: Dict[str, Any], query_embedding: Optional[List[float]]) -> Dict[str, Any]:
+        """Fill in a route's category from the query embedding when keywords didn't name one"""
+        if route.get("rti_category") or not query_embedding:
+            return route
+        try:
+            match = self.category_for_embedding(query_embedding)
+        except Exception as e:
+            print(f"Error matching category centroids: {e}")
+            match = None
+        if match:
+            route["rti_category"], score = match
+            route["category_source"] = "centroid"
+            print(f"Routed to category {route['rti_category']} by centroid (similarity: {score:.3f})")
+        return route
+
+# Global router instance
+intent_router = IntentRouter()
+
+def get_intent_router() -> IntentRouter:
+    """Get intent router instance"""
+    return intent_router
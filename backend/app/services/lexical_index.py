@@ -0,0 +1,179 @@
+"""
+In-process BM25 index for the RTI template corpus, and reciprocal-rank fusion with vector results
+"""
+
+import math
+import re
+import threading
+from collections import Counter
+from typing import List, Dict, Any, Tuple
+from app.services.vector_index import DOCUMENT_FIELDS, CHUNK_FIELDS
+
+# Text searched per row of each index
+DOCUMENT_TEXT_FIELDS = ("title", "rti_category", "extracted_text")
+CHUNK_TEXT_FIELDS = ("title", "rti_category", "content")
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Words that appear in nearly every template or query and only add noise
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how i in is it me my of on or "
+    "our please the this to under was what when where which who why will with "
+    "you your rti information"
+    .split()
+)
+
+# Title and category terms say what a template is for, so they count more
+# than the same term somewhere in the body
+FIELD_WEIGHTS = {"title": 3, "rti_category": 3}
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords (land_records gives land, records)"""
+    return [token for token in TOKEN_PATTERN.findall((text or "").lower()) if token not in STOPWORDS]
+
+class LexicalIndex:
+    """Okapi BM25 over the text fields of pdf_documents (or pdf_chunks).
+
+    Embeddings blur rare proper nouns such as "Dharani", "Meebhoomi" or
+    "IRCTC"; exact term matching catches them. Like VectorIndex the corpus is
+    small, so postings live in a dict and are swapped as a whole on reload.
+    Each row keeps only ``fields`` next to its term counts: document rows
+    leave out extracted_text, while chunk rows keep their content so a
+    chunk found only by BM25 can still be used as context.
+    """
+
+    def __init__(self, text_fields: Tuple[str, ...], fields: Tuple[str, ...] = DOCUMENT_FIELDS,
+                 k1: float = 1.5, b: float = 0.75):
+        self.text_fields = text_fields
+        self.fields = fields
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._entries: List[Tuple[Dict[str, Any], Counter]] = []
+        self._rows: List[Dict[str, Any]] = []
+        self._lengths: List[int] = []
+        self._postings: Dict[str, List[Tuple[int, int]]] = {}
+        self._average_length = 0.0
+        self.is_loaded = False
+
+    @classmethod
+    def from_documents(cls, documents: List[Dict[str, Any]], text_fields: Tuple[str, ...],
+                       fields: Tuple[str, ...] = DOCUMENT_FIELDS) -> "LexicalIndex":
+        """Build a standalone index over the given rows, e.g. to rank a handful of search results"""
+        index = cls(text_fields, fields)
+        index._swap([index._entry(document) for document in documents])
+        return index
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _terms(self, document: Dict[str, Any]) -> Counter:
+        terms = Counter()
+        for field in self.text_fields:
+            weight = FIELD_WEIGHTS.get(field, 1)
+            for token in tokenize(str(document.get(field) or "")):
+                terms[token] += weight
+        return terms
+
+    def _entry(self, document: Dict[str, Any]) -> Tuple[Dict[str, Any], Counter]:
+        return {field: document.get(field) for field in self.fields}, self._terms(document)
+
+    def _swap(self, entries: List[Tuple[Dict[str, Any], Counter]]) -> None:
+        """Build postings for the given (row, term counts) pairs and swap them in"""
+        entries = [(row, terms) for row, terms in entries if terms]
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for position, (_, terms) in enumerate(entries):
+            for term, count in terms.items():
+                postings.setdefault(term, []).append((position, count))
+        lengths = [sum(terms.values()) for _, terms in entries]
+
+        with self._lock:
+            self._entries = entries
+            self._rows = [row for row, _ in entries]
+            self._lengths = lengths
+            self._postings = postings
+            self._average_length = sum(lengths) / len(lengths) if lengths else 0.0
+            self.is_loaded = True
+
+    def load(self, documents: List[Dict[str, Any]]) -> None:
+        """Replace the index contents with the given rows"""
+        self._swap([self._entry(document) for document in documents])
+        print(f"Lexical index loaded with {len(self._rows)} rows and {len(self._postings)} terms")
+
+    def add_documents(self, documents: List[Dict[str, Any]]) -> None:
+        """Add or replace rows by id (postings are rebuilt; the corpus is small)"""
+        ids = {document.get("id") for document in documents}
+        entries = [entry for entry in self._entries if entry[0].get("id") not in ids]
+        self._swap(entries + [self._entry(document) for document in documents])
+
+    def add_document(self, document: Dict[str, Any]) -> None:
+        """Add or replace a single row"""
+        self.add_documents([document])
+
+    def remove_where(self, field: str, value: Any) -> None:
+        """Drop all rows whose ``field`` equals ``value``"""
+        entries = [entry for entry in self._entries if entry[0].get(field) != value]
+        if len(entries) != len(self._entries):
+            self._swap(entries)
+
+    def search(self, query: str, limit: int = 20, where: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """Return rows matching any query term, best BM25 score first (optionally only rows matching ``where``)"""
+        rows, lengths, postings = self._rows, self._lengths, self._postings
+        average_length = self._average_length or 1.0
+        total = len(rows)
+        if not total or limit <= 0:
+            return []
+
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(query)):
+            entries = postings.get(term)
+            if not entries:
+                continue
+            idf = math.log(1 + (total - len(entries) + 0.5) / (len(entries) + 0.5))
+            for position, count in entries:
+                norm = self.k1 * (1 - self.b + self.b * lengths[position] / average_length)
+                scores[position] = scores.get(position, 0.0) + idf * count * (self.k1 + 1) / (count + norm)
+
+        if where:
+            scores = {
+                position: score for position, score in scores.items()
+                if all(rows[position].get(field) == value for field, value in where.items())
+            }
+        best = sorted(scores.items(), key=lambda item: item[1], reverse=True)[:limit]
+        return [{**rows[position], "lexical_score": score} for position, score in best]
+
+def rank_by_bm25(query: str, documents: List[Dict[str, Any]],
+                 text_fields: Tuple[str, ...] = DOCUMENT_TEXT_FIELDS) -> List[Dict[str, Any]]:
+    """Order a handful of rows by BM25 score for the query; rows matching no term follow in their given order"""
+    index = LexicalIndex.from_documents(documents, text_fields, fields=("id",))
+    scores = {row["id"]: row["lexical_score"] for row in index.search(query, limit=len(documents))}
+    matched = sorted((d for d in documents if d["id"] in scores), key=lambda d: scores[d["id"]], reverse=True)
+    return [{**d, "lexical_score": scores[d["id"]]} for d in matched] + [d for d in documents if d["id"] not in scores]
+
+def reciprocal_rank_fusion(rankings: List[List[Dict[str, Any]]], k: int = 60, limit: int = 5,
+                           key: str = "id") -> List[Dict[str, Any]]:
+    """Fuse ranked result lists by summing 1 / (k + rank) per row, best first.
+
+    Fields of a row seen in several lists are merged, so a result keeps both
+    its ``similarity`` and its ``lexical_score``.
+    """
+    fused: Dict[Any, Dict[str, Any]] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, 1):
+            entry = fused.setdefault(row[key], {"rrf_score": 0.0})
+            for field, value in row.items():
+                entry.setdefault(field, value)
+            entry["rrf_score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda row: row["rrf_score"], reverse=True)[:limit]
+
+# Global index instances
+lexical_index = LexicalIndex(DOCUMENT_TEXT_FIELDS, DOCUMENT_FIELDS)
+chunk_lexical_index = LexicalIndex(CHUNK_TEXT_FIELDS, CHUNK_FIELDS)
+
+def get_lexical_index() -> LexicalIndex:
+    """Get lexical index instance"""
+    return lexical_index
+
+def get_chunk_lexical_index() -> LexicalIndex:
+    """Get chunk lexical index instance"""
+    return chunk_lexical_index
@@ -3,57 +3,30 @@ OpenAI client service for AI operations
 """
 
 import openai
-from typing import List, Dict, Any, Optional
+import httpx
+from typing import List, Dict, Any, Optional, AsyncIterator
 from app.core.config import settings
+from app.services.embedding_cache import get_embedding_cache
 import tiktoken
 import json
 
-class OpenAIService:
-    """Service class for OpenAI operations"""
+class BaseOpenAIService:
+    """Prompt building and parsing for the OpenAI service"""
     
     def __init__(self):
-        self.client = openai.OpenAI(api_key=settings.OPENAI_API_KEY)
         self.model = settings.OPENAI_MODEL
         self.embedding_model = settings.OPENAI_EMBEDDING_MODEL
         self.encoding = tiktoken.get_encoding("cl100k_base")
+        self.embedding_cache = get_embedding_cache()
     
-    def get_embedding(self, text: str) -> List[float]:
-        """Get embedding for text"""
-        try:
-            response = self.client.embeddings.create(
-                model=self.embedding_model,
-                input=text
-            )
-            return response.data[0].embedding
-        except Exception as e:
-            print(f"Error getting embedding: {e}")
-            return []
-    
-    def get_chat_completion(self, messages: List[Dict[str, str]], context: str = None) -> str:
-        """Get chat completion from OpenAI"""
-        try:
-            # Prepare system message with RTI context
-            system_message = self._get_system_message(context)
-            
-            # Add system message to the beginning
-            full_messages = [{"role": "system", "content": system_message}] + messages
-            
-            print(f"OpenAI request - System message: {system_message[:100]}...")
-            print(f"OpenAI request - User messages: {messages}")
-            
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=full_messages,
-                temperature=0.7,
-                max_tokens=1000
-            )
-            
-            result = response.choices[0].message.content
-            print(f"OpenAI response: {result[:100]}...")
-            return result
-        except Exception as e:
-            print(f"Error getting chat completion: {e}")
-            return "I apologize, but I'm having trouble processing your request right now. Please try again later."
+    def _build_chat_messages(self, messages: List[Dict[str, str]], context: str = None) -> List[Dict[str, str]]:
+        """Prepend the RTI system message to the conversation"""
+        system_message = self._get_system_message(context)
+        
+        print(f"OpenAI request - System message: {system_message[:100]}...")
+        print(f"OpenAI request - User messages: {messages}")
+        
+        return [{"role": "system", "content": system_message}] + messages
     
     def _get_system_message(self, context: str = None) -> str:
         """Get system message for RTI chatbot"""
@@ -185,22 +158,9 @@ Always provide specific, actionable responses that directly answer the user's qu
         """Count tokens in text"""
         return len(self.encoding.encode(text))
     
-    def is_rti_related(self, message: str) -> bool:
-        """Check if message is RTI-related"""
-        rti_keywords = [
-            "rti", "right to information", "information act", "public information",
-            "government information", "transparency", "pio", "public authority",
-            "information officer", "appeal", "first appeal", "second appeal",
-            "information commission", "rti application", "rti query"
-        ]
-        
-        message_lower = message.lower()
-        return any(keyword in message_lower for keyword in rti_keywords)
-    
-    def extract_rti_requirements(self, message: str) -> Dict[str, Any]:
-        """Extract RTI requirements from user message"""
-        try:
-            prompt = f"""
+    def _requirements_prompt(self, message: str) -> str:
+        """Build the prompt used to extract RTI requirements from a message"""
+        return f"""
             Analyze this RTI request and extract key information:
             
             User Message: "{message}"
@@ -214,38 +174,159 @@ Always provide specific, actionable responses that directly answer the user's qu
                 "suggestions": "any suggestions for improvement"
             }}
             """
+    
+    def _default_requirements(self, message: str) -> Dict[str, Any]:
+        """Fallback RTI requirements when extraction fails"""
+        return {
+            "department": "General",
+            "subject": "RTI Application",
+            "information_request": message,
+            "is_valid_rti": True,
+            "suggestions": "Please provide more specific details about the information you need."
+        }
+    
+    def _parse_requirements(self, content: str, message: str) -> Dict[str, Any]:
+        """Parse the JSON returned by the requirements prompt"""
+        try:
+            return json.loads(content)
+        except json.JSONDecodeError:
+            return self._default_requirements(message)
+
+class AsyncOpenAIService(BaseOpenAIService):
+    """Async OpenAI service sharing one pooled HTTP client across all requests.
+    
+    Calls are awaited instead of blocking the event loop, so a slow completion
+    for one user no longer stalls every other request on the worker.
+    """
+    
+    def __init__(self):
+        super().__init__()
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.OPENAI_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=settings.OPENAI_KEEPALIVE_EXPIRY_SECONDS
+            ),
+            timeout=httpx.Timeout(settings.OPENAI_TIMEOUT_SECONDS, connect=settings.OPENAI_CONNECT_TIMEOUT_SECONDS)
+        )
+        self.client = openai.AsyncOpenAI(
+            api_key=settings.OPENAI_API_KEY,
+            http_client=self.http_client,
+            max_retries=settings.OPENAI_MAX_RETRIES
+        )
+    
+    async def get_embedding(self, text: str) -> List[float]:
+        """Get embedding for text, served from the embedding cache when possible"""
+        try:
+            cached = self.embedding_cache.get(self.embedding_model, text)
+            if cached is not None:
+                return cached
             
-            response = self.client.chat.completions.create(
+            response = await self.client.embeddings.create(
+                model=self.embedding_model,
+                input=text
+            )
+            embedding = response.data[0].embedding
+            self.embedding_cache.set(self.embedding_model, text, embedding)
+            return embedding
+        except Exception as e:
+            print(f"Error getting embedding: {e}")
+            return []
+    
+    async def get_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """Get embeddings for a batch of texts in one request (not cached)"""
+        if not texts:
+            return []
+        response = await self.client.embeddings.create(
+            model=self.embedding_model,
+            input=texts
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+    
+    async def get_chat_completion(self, messages: List[Dict[str, str]], context: str = None,
+                                  completion_info: Optional[Dict[str, Any]] = None) -> str:
+        """Get chat completion from OpenAI.
+        
+        If ``completion_info`` is given, its ``finish_reason`` is set from the
+        response; it stays unset when the call fails.
+        """
+        try:
+            full_messages = self._build_chat_messages(messages, context)
+            
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=full_messages,
+                temperature=0.7,
+                max_tokens=1000
+            )
+            
+            result = response.choices[0].message.content
+            if completion_info is not None:
+                completion_info["finish_reason"] = response.choices[0].finish_reason
+            print(f"OpenAI response: {result[:100]}...")
+            return result
+        except Exception as e:
+            print(f"Error getting chat completion: {e}")
+            return "I apologize, but I'm having trouble processing your request right now. Please try again later."
+    
+    async def stream_chat_completion(self, messages: List[Dict[str, str]], context: str = None,
+                                     completion_info: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Stream chat completion content deltas from OpenAI.
+        
+        A failure before the first delta yields the usual apology; a failure
+        after it is re-raised so the truncated answer isn't mistaken for a full one.
+        ``completion_info`` gets the stream's ``finish_reason`` as for get_chat_completion.
+        """
+        streamed_any = False
+        try:
+            full_messages = self._build_chat_messages(messages, context)
+            
+            stream = await self.client.chat.completions.create(
                 model=self.model,
-                messages=[{"role": "user", "content": prompt}],
+                messages=full_messages,
+                temperature=0.7,
+                max_tokens=1000,
+                stream=True
+            )
+            
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                if chunk.choices[0].finish_reason and completion_info is not None:
+                    completion_info["finish_reason"] = chunk.choices[0].finish_reason
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    streamed_any = True
+                    yield delta
+        except Exception as e:
+            print(f"Error streaming chat completion: {e}")
+            if streamed_any:
+                # Part of the answer is already out; the caller has to know it was cut off
+                raise
+            yield "I apologize, but I'm having trouble processing your request right now. Please try again later."
+    
+    async def extract_rti_requirements(self, message: str) -> Dict[str, Any]:
+        """Extract RTI requirements from user message"""
+        try:
+            response = await self.client.chat.completions.create(
+                model=self.model,
+                messages=[{"role": "user", "content": self._requirements_prompt(message)}],
                 temperature=0.3,
                 max_tokens=500
             )
             
-            # Try to parse JSON response
-            try:
-                return json.loads(response.choices[0].message.content)
-            except json.JSONDecodeError:
-                return {
-                    "department": "General",
-                    "subject": "RTI Application",
-                    "information_request": message,
-                    "is_valid_rti": True,
-                    "suggestions": "Please provide more specific details about the information you need."
-                }
+            return self._parse_requirements(response.choices[0].message.content, message)
         except Exception as e:
             print(f"Error extracting RTI requirements: {e}")
-            return {
-                "department": "General",
-                "subject": "RTI Application",
-                "information_request": message,
-                "is_valid_rti": True,
-                "suggestions": "Please provide more specific details about the information you need."
-            }
+            return self._default_requirements(message)
+    
+    async def aclose(self) -> None:
+        """Close the pooled HTTP client"""
+        await self.client.close()
 
 # Global service instance
-openai_service = OpenAIService()
+async_openai_service = AsyncOpenAIService()
 
-def get_openai_client() -> OpenAIService:
-    """Get OpenAI service instance"""
-    return openai_service
+def get_async_openai_client() -> AsyncOpenAIService:
+    """Get async OpenAI service instance"""
+    return async_openai_service
@@ -0,0 +1,367 @@
+"""
+Async Postgres data-access layer using an asyncpg connection pool
+"""
+
+import json
+import uuid
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Optional, Dict, Any, List
+import asyncpg
+from app.services.supabase_client import SupabaseService
+from app.core.config import settings
+
+# Hot queries. asyncpg prepares each statement once per connection and
+# reuses it from the statement cache on later calls with the same text.
+SELECT_USER_CONVERSATIONS = "SELECT * FROM conversations WHERE user_id = $1 ORDER BY updated_at DESC"
+SELECT_CONVERSATION_LIST = (
+    "SELECT * FROM get_conversation_list($1, $2, $3::text::timestamptz, $4::uuid, $5)"
+)
+SELECT_CONVERSATION_LIST_VERSION = "SELECT * FROM get_conversation_list_version($1)"
+SELECT_OWNED_CONVERSATION = "SELECT id FROM conversations WHERE id = $1 AND user_id = $2"
+SELECT_PROFILE_EXISTS = "SELECT 1 FROM profiles WHERE id = $1"
+INSERT_CONVERSATION = "INSERT INTO conversations (user_id, title) VALUES ($1, $2) RETURNING *"
+SELECT_MESSAGES = "SELECT * FROM messages WHERE conversation_id = $1 ORDER BY created_at"
+INSERT_MESSAGE = (
+    "INSERT INTO messages (conversation_id, sender, content, metadata) "
+    "VALUES ($1, $2, $3, $4) RETURNING *"
+)
+SELECT_CONVERSATION_CONTEXT = "SELECT * FROM get_conversation_context($1, $2, $3)"
+SELECT_MESSAGES_PAGE = (
+    "SELECT * FROM get_messages_page($1, $2, $3, $4::text::timestamptz, $5::uuid, "
+    "$6::text::timestamptz, $7::uuid, $8)"
+)
+SELECT_MESSAGES_RANGE = (
+    "SELECT id, sender, content, created_at FROM messages WHERE conversation_id = $1 "
+    "ORDER BY created_at OFFSET $2 LIMIT $3"
+)
+UPSERT_CONVERSATION_SUMMARY = (
+    "INSERT INTO conversation_summaries (conversation_id, summary, summarized_count) VALUES ($1, $2, $3) "
+    "ON CONFLICT (conversation_id) DO UPDATE SET summary = EXCLUDED.summary, summarized_count = EXCLUDED.summarized_count "
+    "WHERE conversation_summaries.summarized_count = $4"
+)
+INSERT_RTI_DRAFT = (
+    "INSERT INTO rti_drafts (user_id, title, content, department, subject) "
+    "VALUES ($1, $2, $3, $4, $5) RETURNING *"
+)
+SELECT_USER_RTI_DRAFTS = "SELECT * FROM rti_drafts WHERE user_id = $1 ORDER BY created_at DESC"
+SEARCH_PDF_DOCUMENTS = "SELECT * FROM search_pdf_documents($1::vector, $2, $3)"
+SEARCH_PDF_DOCUMENTS_SLIM = "SELECT * FROM search_pdf_documents_slim($1::vector, $2, $3)"
+HYBRID_SEARCH_PDF_DOCUMENTS = "SELECT * FROM hybrid_search_pdf_documents($1, $2::vector, $3, $4, $5, $6)"
+SELECT_PDF_DOCUMENT_TEXTS = "SELECT id, extracted_text FROM pdf_documents WHERE id = ANY($1::uuid[])"
+SEARCH_PDF_CHUNKS = "SELECT * FROM search_pdf_chunks($1::vector, $2, $3)"
+
+def _to_json_value(value: Any) -> Any:
+    """Convert asyncpg values to what PostgREST returns in JSON"""
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    return value
+
+def _row(record: Optional[asyncpg.Record]) -> Optional[Dict[str, Any]]:
+    if record is None:
+        return None
+    return {key: _to_json_value(value) for key, value in record.items()}
+
+def _rows(records: List[asyncpg.Record]) -> List[Dict[str, Any]]:
+    return [_row(record) for record in records]
+
+def _vector(embedding: List[float]) -> str:
+    """Format an embedding as pgvector text input"""
+    return "[" + ",".join(repr(float(x)) for x in embedding) + "]"
+
+async def _init_connection(connection: asyncpg.Connection) -> None:
+    """Decode json/jsonb columns to Python objects, as supabase-py does"""
+    for type_name in ("json", "jsonb"):
+        await connection.set_type_codec(
+            type_name, encoder=json.dumps, decoder=json.loads, schema="pg_catalog"
+        )
+
+class PostgresService(SupabaseService):
+    """SupabaseService with the hot queries served from an asyncpg pool.
+
+    Method signatures and return shapes (dicts with string UUIDs and ISO
+    timestamps) match SupabaseService, so endpoints don't change. Methods
+    not overridden here, and every method until ``connect()`` has created
+    the pool, go through the inherited supabase-py implementation.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.pool: Optional[asyncpg.Pool] = None
+
+    async def connect(self) -> None:
+        """Create the connection pool"""
+        if self.pool is not None:
+            return
+        try:
+            self.pool = await asyncpg.create_pool(
+                dsn=settings.DATABASE_URL,
+                min_size=settings.DATABASE_POOL_MIN_SIZE,
+                max_size=settings.DATABASE_POOL_MAX_SIZE,
+                statement_cache_size=settings.DATABASE_STATEMENT_CACHE_SIZE,
+                command_timeout=settings.DATABASE_COMMAND_TIMEOUT_SECONDS,
+                init=_init_connection
+            )
+            print(f"✅ Postgres pool ready (max {settings.DATABASE_POOL_MAX_SIZE} connections)")
+        except Exception as e:
+            print(f"❌ Failed to create Postgres pool, using Supabase REST: {e}")
+            self.pool = None
+
+    async def close(self) -> None:
+        """Close the connection pool"""
+        if self.pool is not None:
+            await self.pool.close()
+            self.pool = None
+
+    async def get_user_conversations(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get user conversations"""
+        if self.pool is None:
+            return await super().get_user_conversations(user_id)
+        try:
+            return _rows(await self.pool.fetch(SELECT_USER_CONVERSATIONS, user_id))
+        except Exception as e:
+            print(f"❌ Postgres: Error getting user conversations: {e}")
+            return []
+
+    async def get_conversation_list(self, user_id: str, limit: Optional[int] = None,
+                                    before: Optional[tuple] = None) -> Dict[str, Any]:
+        """Get user conversations with message counts and last-message previews, most recently active first"""
+        if self.pool is None:
+            return await super().get_conversation_list(user_id, limit, before)
+        before_activity_at, before_id = before if before else (None, None)
+        try:
+            rows = _rows(await self.pool.fetch(
+                SELECT_CONVERSATION_LIST, user_id, limit + 1 if limit else None,
+                before_activity_at, before_id, settings.CONVERSATION_PREVIEW_LENGTH
+            ))
+        except Exception as e:
+            print(f"❌ Postgres: Error listing conversations: {e}")
+            return await super().get_conversation_list(user_id, limit, before)
+        has_more = bool(limit) and len(rows) > limit
+        return {"conversations": rows[:limit] if limit else rows, "has_more": has_more}
+
+    async def get_conversation_list_version(self, user_id: str) -> Optional[str]:
+        """Fingerprint of the user's conversation list, or None if it can't be computed"""
+        if self.pool is None:
+            return await super().get_conversation_list_version(user_id)
+        try:
+            row = _row(await self.pool.fetchrow(SELECT_CONVERSATION_LIST_VERSION, user_id))
+        except Exception as e:
+            print(f"❌ Postgres: Error getting conversation list version: {e}")
+            return await super().get_conversation_list_version(user_id)
+        return json.dumps(row, sort_keys=True, default=str) if row else None
+
+    async def create_conversation(self, user_id: str, title: str) -> Optional[Dict[str, Any]]:
+        """Create new conversation"""
+        if self.pool is None:
+            return await super().create_conversation(user_id, title)
+        try:
+            await self.ensure_user_profile_exists(user_id)
+            return _row(await self.pool.fetchrow(INSERT_CONVERSATION, user_id, title))
+        except Exception as e:
+            print(f"Error creating conversation: {e}")
+            return None
+
+    async def ensure_user_profile_exists(self, user_id: str) -> None:
+        """Ensure user profile exists, create if it doesn't"""
+        if self.pool is not None:
+            try:
+                if await self.pool.fetchval(SELECT_PROFILE_EXISTS, user_id):
+                    return
+            except Exception as e:
+                print(f"❌ Postgres: Error checking profile: {e}")
+        # Creating a profile needs the auth admin API, which stays on supabase-py
+        await super().ensure_user_profile_exists(user_id)
+
+    async def get_conversation_messages(self, conversation_id: str, user_id: str) -> List[Dict[str, Any]]:
+        """Get conversation messages"""
+        if self.pool is None:
+            return await super().get_conversation_messages(conversation_id, user_id)
+        try:
+            async with self.pool.acquire() as connection:
+                if not await connection.fetchval(SELECT_OWNED_CONVERSATION, conversation_id, user_id):
+                    print(f"Conversation {conversation_id} not found or doesn't belong to user {user_id}")
+                    return []
+                return _rows(await connection.fetch(SELECT_MESSAGES, conversation_id))
+        except Exception as e:
+            print(f"❌ Postgres: Error getting conversation messages: {e}")
+            return []
+
+    async def get_messages_page(self, conversation_id: str, user_id: str, limit: int,
+                                before: Optional[tuple] = None, after: Optional[tuple] = None,
+                                light: bool = False) -> Dict[str, Any]:
+        """Get one page of conversation messages by (created_at, id) cursor, oldest first"""
+        if self.pool is None:
+            return await super().get_messages_page(conversation_id, user_id, limit, before, after, light)
+        before_created_at, before_id = before if before and not after else (None, None)
+        after_created_at, after_id = after if after else (None, None)
+        try:
+            rows = _rows(await self.pool.fetch(
+                SELECT_MESSAGES_PAGE, conversation_id, user_id, limit + 1,
+                before_created_at, before_id, after_created_at, after_id, light
+            ))
+        except Exception as e:
+            print(f"Error getting messages page: {e}")
+            rows = []
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if not after:
+            rows.reverse()
+        return {"messages": rows, "has_more": has_more}
+
+    async def add_message(self, conversation_id: str, sender: str, content: str, metadata: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+        """Add message to conversation"""
+        if self.pool is None:
+            return await super().add_message(conversation_id, sender, content, metadata)
+        try:
+            return _row(await self.pool.fetchrow(INSERT_MESSAGE, conversation_id, sender, content, metadata or {}))
+        except Exception as e:
+            print(f"Error adding message: {e}")
+            return None
+
+    async def get_conversation_memory(self, conversation_id: str, user_id: str, limit: int) -> Optional[Dict[str, Any]]:
+        """Get the stored summary, total message count and the most recent messages of a conversation"""
+        if self.pool is None:
+            return await super().get_conversation_memory(conversation_id, user_id, limit)
+        try:
+            context = await self.pool.fetchrow(SELECT_CONVERSATION_CONTEXT, conversation_id, user_id, limit)
+            if context is None:
+                print(f"Conversation {conversation_id} not found or doesn't belong to user {user_id}")
+                return None
+            return {
+                "summary": context["summary"] or "",
+                "summarized_count": context["summarized_count"] or 0,
+                "message_count": context["message_count"],
+                "messages": context["messages"] or []
+            }
+        except Exception as e:
+            print(f"Error getting conversation memory: {e}")
+            return None
+
+    async def get_messages_range(self, conversation_id: str, offset: int, limit: int) -> List[Dict[str, Any]]:
+        """Get messages of a conversation by position, oldest first"""
+        if self.pool is None:
+            return await super().get_messages_range(conversation_id, offset, limit)
+        try:
+            return _rows(await self.pool.fetch(SELECT_MESSAGES_RANGE, conversation_id, offset, limit))
+        except Exception as e:
+            print(f"Error getting message range: {e}")
+            return []
+
+    async def update_conversation_summary(self, conversation_id: str, summary: str, summarized_count: int,
+                                          previous_count: int) -> bool:
+        """Store the rolling summary of a conversation's older messages if its count is still previous_count"""
+        if self.pool is None:
+            return await super().update_conversation_summary(conversation_id, summary, summarized_count, previous_count)
+        try:
+            status = await self.pool.execute(
+                UPSERT_CONVERSATION_SUMMARY, conversation_id, summary, summarized_count, previous_count
+            )
+            # "INSERT 0 1" when written, "INSERT 0 0" when the count had moved on
+            return status.endswith(" 1")
+        except Exception as e:
+            print(f"Error updating conversation summary: {e}")
+            return False
+
+    async def create_rti_draft(self, user_id: str, title: str, content: str, department: str = None, subject: str = None) -> Optional[Dict[str, Any]]:
+        """Create RTI draft"""
+        if self.pool is None:
+            return await super().create_rti_draft(user_id, title, content, department, subject)
+        try:
+            return _row(await self.pool.fetchrow(
+                INSERT_RTI_DRAFT, user_id, title, content, department or settings.RTI_DEFAULT_DEPARTMENT, subject
+            ))
+        except Exception as e:
+            print(f"Error creating RTI draft: {e}")
+            return None
+
+    async def get_user_rti_drafts(self, user_id: str) -> List[Dict[str, Any]]:
+        """Get user RTI drafts"""
+        if self.pool is None:
+            return await super().get_user_rti_drafts(user_id)
+        try:
+            return _rows(await self.pool.fetch(SELECT_USER_RTI_DRAFTS, user_id))
+        except Exception as e:
+            print(f"Error getting RTI drafts: {e}")
+            return []
+
+    async def search_pdf_documents(self, query_embedding: List[float], threshold: float = None, limit: int = None) -> List[Dict[str, Any]]:
+        """Search PDF documents using vector similarity"""
+        if self.pool is None:
+            return await super().search_pdf_documents(query_embedding, threshold, limit)
+        try:
+            return _rows(await self.pool.fetch(
+                SEARCH_PDF_DOCUMENTS,
+                _vector(query_embedding),
+                threshold or settings.RAG_SIMILARITY_THRESHOLD,
+                limit or settings.RAG_MAX_RESULTS
+            ))
+        except Exception as e:
+            print(f"Error searching PDF documents: {e}")
+            return []
+
+    async def search_pdf_documents_slim(self, query_embedding: List[float], threshold: float = None, limit: int = None) -> List[Dict[str, Any]]:
+        """Rank PDF documents by vector similarity, returning ids, titles, categories and scores only"""
+        if self.pool is None:
+            return await super().search_pdf_documents_slim(query_embedding, threshold, limit)
+        try:
+            return _rows(await self.pool.fetch(
+                SEARCH_PDF_DOCUMENTS_SLIM,
+                _vector(query_embedding),
+                threshold or settings.RAG_SIMILARITY_THRESHOLD,
+                limit or settings.RAG_MAX_RESULTS
+            ))
+        except Exception as e:
+            print(f"Slim PDF search unavailable, using search_pdf_documents: {e}")
+            return await self.search_pdf_documents(query_embedding, threshold, limit)
+
+    async def hybrid_search_pdf_documents(self, query_text: str, query_embedding: List[float], threshold: float = None, limit: int = None) -> List[Dict[str, Any]]:
+        """Rank PDF documents by full-text and vector similarity fused with reciprocal-rank fusion"""
+        if self.pool is None:
+            return await super().hybrid_search_pdf_documents(query_text, query_embedding, threshold, limit)
+        try:
+            return _rows(await self.pool.fetch(
+                HYBRID_SEARCH_PDF_DOCUMENTS,
+                query_text,
+                _vector(query_embedding),
+                threshold or settings.RAG_SIMILARITY_THRESHOLD,
+                limit or settings.RAG_MAX_RESULTS,
+                settings.RAG_HYBRID_CANDIDATES,
+                settings.RAG_RRF_K
+            ))
+        except Exception as e:
+            print(f"Hybrid PDF search unavailable, using vector search: {e}")
+            return await self.search_pdf_documents_slim(query_embedding, threshold, limit)
+
+    async def get_pdf_document_texts(self, document_ids: List[str]) -> Dict[str, str]:
+        """Get the extracted text of the given PDF documents, keyed by id"""
+        if self.pool is None:
+            return await super().get_pdf_document_texts(document_ids)
+        if not document_ids:
+            return {}
+        try:
+            rows = _rows(await self.pool.fetch(SELECT_PDF_DOCUMENT_TEXTS, list(document_ids)))
+            return {row["id"]: row.get("extracted_text") or "" for row in rows}
+        except Exception as e:
+            print(f"Error getting PDF document texts: {e}")
+            return {}
+
+    async def search_pdf_chunks(self, query_embedding: List[float], threshold: float = None, limit: int = None) -> List[Dict[str, Any]]:
+        """Search PDF chunks using vector similarity"""
+        if self.pool is None:
+            return await super().search_pdf_chunks(query_embedding, threshold, limit)
+        try:
+            return _rows(await self.pool.fetch(
+                SEARCH_PDF_CHUNKS,
+                _vector(query_embedding),
+                threshold or settings.RAG_SIMILARITY_THRESHOLD,
+                limit or settings.RAG_MAX_CHUNKS
+            ))
+        except Exception as e:
+            print(f"Error searching PDF chunks: {e}")
+            return []
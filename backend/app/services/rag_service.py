@@ -2,80 +2,394 @@
 RAG (Retrieval-Augmented Generation) service for enhanced AI responses using PDF documents
 """
 
-from typing import List, Dict, Any, Optional
-from app.services.openai_client import get_openai_client
+import asyncio
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, AsyncIterator, Tuple
+from app.services.openai_client import get_async_openai_client
 from app.services.supabase_client import get_supabase_client
+from app.services.vector_index import get_vector_index, get_chunk_index, VectorIndex
+from app.services.lexical_index import get_lexical_index, get_chunk_lexical_index, reciprocal_rank_fusion, rank_by_bm25, LexicalIndex
+from app.services.chunking import chunk_text, merge_adjacent_chunks
+from app.services.context_builder import ContextBuilder
 from app.core.config import settings
 
 class RAGService:
     """Service class for RAG operations with PDF documents"""
     
     def __init__(self):
-        self.openai_client = get_openai_client()
+        self.openai_client = get_async_openai_client()
         self.supabase_client = get_supabase_client()
+        self.vector_index = get_vector_index()
+        self.chunk_index = get_chunk_index()
+        self.lexical_index = get_lexical_index()
+        self.chunk_lexical_index = get_chunk_lexical_index()
+        self.context_builder = ContextBuilder(self.openai_client.encoding)
+        # Template text by document id. Search returns ids and scores only, so
+        # the text of the few documents that reach the prompt is fetched here.
+        self._document_texts: "OrderedDict[str, str]" = OrderedDict()
     
-    async def get_relevant_context(self, query: str) -> str:
-        """Get relevant context for a query using vector similarity search on PDF documents"""
+    async def load_vector_index(self) -> None:
+        """Load the in-process vector and lexical indexes from pdf_documents and pdf_chunks"""
+        if not settings.RAG_USE_LOCAL_INDEX:
+            return
         try:
-            print(f"RAG Query: {query}")
+            documents = await self.supabase_client.get_pdf_documents_for_index()
+            self.vector_index.load(documents)
+            if settings.RAG_HYBRID_SEARCH:
+                self.lexical_index.load(documents)
+        except Exception as e:
+            print(f"Error loading vector index, falling back to RPC search: {e}")
+        if settings.RAG_USE_CHUNKS:
+            try:
+                chunks = await self.supabase_client.get_pdf_chunks_for_index()
+                self.chunk_index.load(chunks)
+                if settings.RAG_HYBRID_SEARCH:
+                    self.chunk_lexical_index.load(chunks)
+            except Exception as e:
+                print(f"Error loading chunk index, falling back to RPC search: {e}")
+    
+    def index_document(self, document: Dict[str, Any], embedding: List[float], extracted_text: str) -> None:
+        """Make a newly stored PDF document searchable without reloading the indexes"""
+        self.vector_index.add_document(document, embedding)
+        if settings.RAG_HYBRID_SEARCH and self.lexical_index.is_loaded:
+            self.lexical_index.add_document({**document, "extracted_text": extracted_text})
+        self.cache_document_text(document["id"], extracted_text)
+    
+    async def index_document_chunks(self, document: Dict[str, Any], extracted_text: str) -> int:
+        """Chunk a stored PDF document, embed the chunks and save them to pdf_chunks"""
+        chunks = chunk_text(extracted_text, self.openai_client.encoding)
+        if not chunks:
+            return 0
+        
+        embeddings = await self.openai_client.get_embeddings([chunk["content"] for chunk in chunks])
+        for chunk, embedding in zip(chunks, embeddings):
+            chunk["embedding"] = embedding
+        
+        stored = await self.supabase_client.add_pdf_chunks(document["id"], chunks)
+        
+        # Keep the local chunk indexes in step with the table
+        rows = [{
+            **row,
+            "title": document.get("title"),
+            "rti_category": document.get("rti_category"),
+            "rti_department": document.get("rti_department")
+        } for row in stored]
+        self.chunk_index.remove_where("document_id", document["id"])
+        for row in rows:
+            self.chunk_index.add_document(row, row.get("embedding"))
+        if settings.RAG_HYBRID_SEARCH and self.chunk_lexical_index.is_loaded:
+            self.chunk_lexical_index.remove_where("document_id", document["id"])
+            self.chunk_lexical_index.add_documents(rows)
+        
+        print(f"Indexed {len(stored)} chunks for document: {document.get('title')}")
+        return len(stored)
+    
+    def _hybrid_search(self, vector_index: VectorIndex, lexical_index: LexicalIndex,
+                       query_embedding: List[float], query: str, limit: int,
+                       where: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """Fuse the vector ranking (above the similarity threshold) and the BM25 ranking with RRF"""
+        # Score every row so lexical-only matches still report their similarity
+        scored = vector_index.search(query_embedding, threshold=-1.0, limit=len(vector_index), where=where)
+        similarities = {row["id"]: row["similarity"] for row in scored}
+        vector_ranking = [
+            row for row in scored if row["similarity"] > settings.RAG_SIMILARITY_THRESHOLD
+        ][:settings.RAG_HYBRID_CANDIDATES]
+        lexical_ranking = lexical_index.search(query, limit=settings.RAG_HYBRID_CANDIDATES, where=where)
+        
+        results = reciprocal_rank_fusion([vector_ranking, lexical_ranking], k=settings.RAG_RRF_K, limit=limit)
+        for result in results:
+            result.setdefault("similarity", similarities.get(result["id"], 0.0))
+        return results
+    
+    def _use_hybrid(self, vector_index: VectorIndex, lexical_index: LexicalIndex, query: Optional[str]) -> bool:
+        return bool(settings.RAG_HYBRID_SEARCH and query and vector_index.is_loaded and lexical_index.is_loaded)
+    
+    async def _search_chunks(self, query_embedding: List[float], query: str = None,
+                             rti_category: str = None) -> List[Dict[str, Any]]:
+        """Search template chunks in the local indexes, falling back to the search_pdf_chunks RPC"""
+        where = {"rti_category": rti_category} if rti_category else None
+        if settings.RAG_USE_LOCAL_INDEX and self.chunk_index.is_loaded:
+            try:
+                if self._use_hybrid(self.chunk_index, self.chunk_lexical_index, query):
+                    return self._hybrid_search(
+                        self.chunk_index, self.chunk_lexical_index, query_embedding, query, settings.RAG_MAX_CHUNKS, where
+                    )
+                return self.chunk_index.search(
+                    query_embedding,
+                    threshold=settings.RAG_SIMILARITY_THRESHOLD,
+                    limit=settings.RAG_MAX_CHUNKS,
+                    where=where
+                )
+            except Exception as e:
+                print(f"Local chunk search failed, falling back to RPC: {e}")
+        
+        if rti_category:
+            # The RPC can't filter, so take more candidates and keep the category's
+            chunks = await self.supabase_client.search_pdf_chunks(
+                query_embedding=query_embedding,
+                threshold=settings.RAG_SIMILARITY_THRESHOLD,
+                limit=settings.RAG_HYBRID_CANDIDATES
+            )
+            return [chunk for chunk in chunks if chunk.get("rti_category") == rti_category][:settings.RAG_MAX_CHUNKS]
+        return await self.supabase_client.search_pdf_chunks(
+            query_embedding=query_embedding,
+            threshold=settings.RAG_SIMILARITY_THRESHOLD,
+            limit=settings.RAG_MAX_CHUNKS
+        )
+    
+    def _format_chunk_context(self, chunks: List[Dict[str, Any]]) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """Assemble the best chunks into one block per template, within the context token budget.
+
+        Also returns the selected templates (ids, chunk ids and scores, best
+        first) so a later turn can rebuild the same blocks without searching.
+        """
+        budget = settings.RAG_CONTEXT_TOKEN_BUDGET
+        used = 0
+        documents: Dict[str, Dict[str, Any]] = {}
+        for chunk in chunks:  # best first
+            token_count = chunk.get("token_count") or 0
+            if used + token_count > budget:
+                continue
+            used += token_count
+            document = documents.setdefault(chunk["document_id"], {"best": chunk, "chunks": []})
+            document["chunks"].append(chunk)
+        
+        blocks = []
+        templates = []
+        for i, document in enumerate(documents.values()):
+            best = document["best"]
+            similarity = best.get('similarity', 0)
+            print(f"Template {i+1}: {best['title']} ({len(document['chunks'])} chunks, best similarity: {similarity:.3f})")
+            templates.append(self._template_selection(best, similarity, [chunk["id"] for chunk in document["chunks"]]))
             
-            # Generate embedding for the query
-            query_embedding = await self._generate_embedding(query)
-            print(f"Query embedding generated: {len(query_embedding)} dimensions")
+            block = [f"=== RTI TEMPLATE {i+1} ==="]
+            block.append(f"Title: {best['title']}")
+            block.append(f"Category: {best['rti_category']}")
+            if best.get('rti_department'):
+                block.append(f"Department: {best['rti_department']}")
+            block.append(f"Similarity Score: {similarity:.3f}")
+            block.append(f"EXACT FORMAT (relevant sections):")
+            # Keep the template's own reading order, without repeating chunk overlaps
+            block.extend(merge_adjacent_chunks(document["chunks"]))
+            block.append("=" * 50)
+            blocks.append("\n".join(block))
+        
+        print(f"Context uses {used} of {budget} template tokens")
+        return blocks, templates
+    
+    @staticmethod
+    def _template_selection(row: Dict[str, Any], similarity: float, chunk_ids: List[str] = None) -> Dict[str, Any]:
+        """What a message's metadata keeps about a template it used"""
+        template = {
+            "id": row.get("document_id", row.get("id")),
+            "title": row.get("title"),
+            "rti_category": row.get("rti_category"),
+            "rti_department": row.get("rti_department"),
+            "score": round(float(similarity), 4)
+        }
+        if chunk_ids is not None:
+            template["chunk_ids"] = chunk_ids
+        return template
+    
+    def cache_document_text(self, document_id: str, text: str) -> None:
+        """Remember a template's text, evicting the least recently used beyond the cache size"""
+        self._document_texts[document_id] = text
+        self._document_texts.move_to_end(document_id)
+        while len(self._document_texts) > settings.RAG_DOCUMENT_TEXT_CACHE_SIZE:
+            self._document_texts.popitem(last=False)
+    
+    async def _get_document_texts(self, results: List[Dict[str, Any]]) -> Dict[str, str]:
+        """Get the full text of the selected documents, from the cache where possible"""
+        texts = {}
+        missing = []
+        for result in results:
+            document_id = result["id"]
+            if result.get("extracted_text"):
+                # Rows from the full search RPC already carry their text
+                self.cache_document_text(document_id, result["extracted_text"])
+            if document_id in self._document_texts:
+                self._document_texts.move_to_end(document_id)
+                texts[document_id] = self._document_texts[document_id]
+            else:
+                missing.append(document_id)
+        
+        if missing:
+            fetched = await self.supabase_client.get_pdf_document_texts(missing)
+            print(f"Fetched text for {len(fetched)} of {len(results)} templates")
+            for document_id, text in fetched.items():
+                self.cache_document_text(document_id, text)
+                texts[document_id] = text
+        return texts
+    
+    def _format_document_context(self, results: List[Dict[str, Any]],
+                                 texts: Dict[str, str]) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """Format whole-document search results as one block per template, with the templates used"""
+        blocks = []
+        templates = []
+        for i, result in enumerate(results):
+            text = texts.get(result['id'])
+            if not text:
+                print(f"Skipping document without text: {result['title']}")
+                continue
+            similarity = result.get('similarity', 0)
+            print(f"Document {i+1}: {result['title']} (similarity: {similarity:.3f})")
+            templates.append(self._template_selection(result, similarity))
             
-            # Search PDF documents using vector similarity
-            results = await self.supabase_client.search_pdf_documents(
+            block = [f"=== RTI TEMPLATE {i+1} ==="]
+            block.append(f"Title: {result['title']}")
+            block.append(f"Category: {result['rti_category']}")
+            if result.get('rti_department'):
+                block.append(f"Department: {result['rti_department']}")
+            block.append(f"Similarity Score: {similarity:.3f}")
+            block.append(f"EXACT FORMAT:")
+            block.append(text)  # Use full text for exact templates
+            block.append("=" * 50)
+            blocks.append("\n".join(block))
+        return blocks, templates
+    
+    async def _search_documents(self, query_embedding: List[float], query: str = None,
+                                rti_category: str = None) -> List[Dict[str, Any]]:
+        """Rank templates in the local indexes, falling back to the category, hybrid or slim search RPC"""
+        where = {"rti_category": rti_category} if rti_category else None
+        if settings.RAG_USE_LOCAL_INDEX and self.vector_index.is_loaded:
+            try:
+                if self._use_hybrid(self.vector_index, self.lexical_index, query):
+                    return self._hybrid_search(
+                        self.vector_index, self.lexical_index, query_embedding, query, settings.RAG_MAX_RESULTS, where
+                    )
+                return self.vector_index.search(
+                    query_embedding,
+                    threshold=settings.RAG_SIMILARITY_THRESHOLD,
+                    limit=settings.RAG_MAX_RESULTS,
+                    where=where
+                )
+            except Exception as e:
+                print(f"Local vector search failed, falling back to RPC: {e}")
+        
+        if rti_category:
+            # A category holds a handful of templates; order them by the query's words
+            documents = await self.supabase_client.search_pdf_documents_by_category(rti_category)
+            return rank_by_bm25(query or "", documents)[:settings.RAG_MAX_RESULTS]
+        if settings.RAG_HYBRID_SEARCH and query:
+            return await self.supabase_client.hybrid_search_pdf_documents(
+                query_text=query,
                 query_embedding=query_embedding,
                 threshold=settings.RAG_SIMILARITY_THRESHOLD,
                 limit=settings.RAG_MAX_RESULTS
             )
+        return await self.supabase_client.search_pdf_documents_slim(
+            query_embedding=query_embedding,
+            threshold=settings.RAG_SIMILARITY_THRESHOLD,
+            limit=settings.RAG_MAX_RESULTS
+        )
+    
+    async def get_context_parts(self, query: str, query_embedding: List[float] = None,
+                                rti_category: str = None) -> List[str]:
+        """Get relevant template blocks for a query, best match first"""
+        return (await self.retrieve_templates(query, query_embedding, rti_category))["context_parts"]
+    
+    async def retrieve_templates(self, query: str, query_embedding: List[float] = None,
+                                 rti_category: str = None) -> Dict[str, Any]:
+        """Search templates for a query.
+        
+        Returns ``context_parts`` (template blocks, best match first) and
+        ``templates`` (what was selected, for reuse_templates on later turns).
+        ``rti_category`` (from the intent router) narrows the search to that
+        category's templates; if none of them match, all templates are searched.
+        """
+        try:
+            print(f"RAG Query: {query}")
             
-            print(f"Found {len(results)} relevant documents")
-            
-            # Format context from results with better prioritization
-            context_parts = []
-            for i, result in enumerate(results):
-                similarity = result.get('similarity', 0)
-                print(f"Document {i+1}: {result['title']} (similarity: {similarity:.3f})")
-                
-                context_parts.append(f"=== RTI TEMPLATE {i+1} ===")
-                context_parts.append(f"Title: {result['title']}")
-                context_parts.append(f"Category: {result['rti_category']}")
-                if result.get('rti_department'):
-                    context_parts.append(f"Department: {result['rti_department']}")
-                context_parts.append(f"Similarity Score: {similarity:.3f}")
-                context_parts.append(f"EXACT FORMAT:")
-                context_parts.append(result['extracted_text'])  # Use full text for exact templates
-                context_parts.append("=" * 50)
+            # Generate embedding for the query unless the caller already has it
+            if query_embedding is None:
+                query_embedding = await self._generate_embedding(query)
+            print(f"Query embedding generated: {len(query_embedding)} dimensions")
             
-            context = "\n".join(context_parts)
-            print(f"Context length: {len(context)} characters")
-            return context
+            if rti_category:
+                print(f"Narrowing template search to category: {rti_category}")
+                selection = await self._search_context_parts(query, query_embedding, rti_category)
+                if selection["context_parts"]:
+                    return selection
+                print(f"No templates matched in {rti_category}, searching all categories")
+            return await self._search_context_parts(query, query_embedding)
         
         except Exception as e:
             print(f"Error getting relevant context: {e}")
-            return ""
+            return {"context_parts": [], "templates": []}
     
-    async def _generate_embedding(self, text: str) -> List[float]:
-        """Generate embedding for text using OpenAI"""
+    async def _search_context_parts(self, query: str, query_embedding: List[float], rti_category: str = None) -> Dict[str, Any]:
+        # Prefer chunk-level retrieval; fall back to whole documents when
+        # no chunks have been indexed yet
+        if settings.RAG_USE_CHUNKS:
+            chunks = await self._search_chunks(query_embedding, query, rti_category)
+            if chunks:
+                print(f"Found {len(chunks)} relevant chunks")
+                context_parts, templates = self._format_chunk_context(chunks)
+                return {"context_parts": context_parts, "templates": templates}
+        
+        # Rank PDF documents by vector similarity, then fetch the text of
+        # only the best few
+        results = await self._search_documents(query_embedding, query, rti_category)
+        selected = results[:settings.RAG_MAX_CONTEXT_DOCUMENTS]
+        
+        print(f"Found {len(results)} relevant documents, using {len(selected)}")
+        texts = await self._get_document_texts(selected)
+        context_parts, templates = self._format_document_context(selected, texts)
+        return {"context_parts": context_parts, "templates": templates}
+    
+    async def reuse_templates(self, templates: List[Dict[str, Any]]) -> Optional[List[str]]:
+        """Rebuild the template blocks an earlier turn selected, without searching.
+        
+        The blocks come out as they did on that turn, so the prompt prefix
+        stays the same. Returns None when a template or chunk is gone (the
+        caller then searches again).
+        """
         try:
-            response = self.openai_client.client.embeddings.create(
-                model=settings.OPENAI_EMBEDDING_MODEL,
-                input=text
-            )
-            return response.data[0].embedding
+            if any("chunk_ids" in template for template in templates):
+                chunk_ids = [chunk_id for template in templates for chunk_id in template.get("chunk_ids", [])]
+                if settings.RAG_USE_LOCAL_INDEX and self.chunk_index.is_loaded:
+                    chunks = self.chunk_index.rows_by_id(chunk_ids)
+                else:
+                    chunks = await self.supabase_client.get_pdf_chunks_by_ids(chunk_ids)
+                if len(chunks) != len(chunk_ids):
+                    print(f"Only {len(chunks)} of {len(chunk_ids)} reused template chunks found")
+                    return None
+                # Each template's chunks carry the score it was selected with
+                scores = {chunk_id: template["score"] for template in templates for chunk_id in template.get("chunk_ids", [])}
+                for chunk in chunks:
+                    chunk["similarity"] = scores[chunk["id"]]
+                context_parts, _ = self._format_chunk_context(chunks)
+            else:
+                results = [{**template, "similarity": template.get("score", 0)} for template in templates]
+                texts = await self._get_document_texts(results)
+                if len(texts) != len(results):
+                    print(f"Only {len(texts)} of {len(results)} reused templates found")
+                    return None
+                context_parts, _ = self._format_document_context(results, texts)
+            print(f"Reusing {len(context_parts)} templates from the previous turn")
+            return context_parts
         except Exception as e:
-            print(f"Error generating embedding: {e}")
-            return []
+            print(f"Error reusing templates: {e}")
+            return None
+    
+    async def get_relevant_context(self, query: str) -> str:
+        """Get relevant context for a query using vector similarity search on PDF documents"""
+        context = "\n".join(await self.get_context_parts(query))
+        print(f"Context length: {len(context)} characters")
+        return context
+    
+    async def _generate_embedding(self, text: str) -> List[float]:
+        """Generate embedding for text using OpenAI (cached per model and normalized text)"""
+        return await self.openai_client.get_embedding(text)
     
     async def generate_rti_draft(self, user_message: str, user_context: Dict[str, Any] = None) -> Dict[str, Any]:
         """Generate RTI draft using PDF-based RAG"""
         try:
-            # Get relevant PDF context
-            context = await self.get_relevant_context(user_message)
-            
-            # Extract RTI requirements
-            rti_requirements = self.openai_client.extract_rti_requirements(user_message)
+            # Retrieve PDF context and extract RTI requirements concurrently
+            context, rti_requirements = await asyncio.gather(
+                self.get_relevant_context(user_message),
+                self.openai_client.extract_rti_requirements(user_message)
+            )
             
             # Generate RTI draft using the PDF format as template
             draft_prompt = f"""
@@ -97,7 +411,7 @@ class RAGService:
             Generate a complete RTI application following the template format:
             """
             
-            response = self.openai_client.client.chat.completions.create(
+            response = await self.openai_client.client.chat.completions.create(
                 model=settings.OPENAI_MODEL,
                 messages=[{"role": "user", "content": draft_prompt}],
                 temperature=0.3,
@@ -128,43 +442,49 @@ class RAGService:
                 "format_source": "Default"
             }
     
-    async def get_enhanced_response(self, user_message: str, conversation_history: List[Dict[str, str]] = None) -> str:
-        """Get enhanced AI response using PDF-based RAG"""
-        try:
-            # Get relevant PDF context
-            context = await self.get_relevant_context(user_message)
-            
-            # Prepare conversation messages with context
-            messages = conversation_history or []
-            
-            # Add system message with RTI context
-            system_message = {
-                "role": "system",
-                "content": f"""You are an expert RTI (Right to Information) assistant. You help users with RTI applications, provide information about the RTI Act 2005, and assist with drafting RTI applications.
-
-CRITICAL INSTRUCTIONS:
-1. ALWAYS use the EXACT format from the PDF templates provided below
-2. Copy the exact addresses, department names, and structure from the templates
-3. Do NOT modify or generalize the template format
-4. Use the specific details from the most relevant template
+    async def _build_enhanced_messages(self, user_message: str, conversation_history: List[Dict[str, str]] = None, context_parts: List[str] = None) -> Tuple[List[Dict[str, str]], str]:
+        """Fit history and PDF context into the prompt budget, retrieving context unless already given.
 
-Available RTI Format Templates and Information:
-{context}
-
-When users ask about RTI applications, you MUST use the exact format from the PDF templates above. Copy the exact addresses, department names, and structure. Do not create generic formats."""
-            }
-            
-            messages.insert(0, system_message)
-            messages.append({"role": "user", "content": user_message})
+        Returns the conversation messages and the template context to pass to
+        the chat completion, which adds them to its single system message.
+        """
+        if context_parts is None:
+            context_parts = await self.get_context_parts(user_message)
+        
+        return self.context_builder.build(
+            system_prompt=self.openai_client._get_system_message(),
+            context_parts=context_parts,
+            history=conversation_history or [],
+            user_message=user_message
+        )
+    
+    async def get_enhanced_response(self, user_message: str, conversation_history: List[Dict[str, str]] = None, context_parts: List[str] = None,
+                                    completion_info: Optional[Dict[str, Any]] = None) -> str:
+        """Get enhanced AI response using PDF-based RAG (``completion_info`` gets the finish_reason)"""
+        try:
+            messages, context = await self._build_enhanced_messages(user_message, conversation_history, context_parts)
             
             # Generate response with context
-            response = self.openai_client.get_chat_completion(messages, context)
+            response = await self.openai_client.get_chat_completion(messages, context, completion_info)
             
             return response
         
         except Exception as e:
             print(f"Error getting enhanced response: {e}")
             return "I apologize, but I'm having trouble processing your request right now. Please try again later."
+    
+    async def stream_enhanced_response(self, user_message: str, conversation_history: List[Dict[str, str]] = None, context_parts: List[str] = None,
+                                       completion_info: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """Stream enhanced AI response deltas using PDF-based RAG (``completion_info`` gets the finish_reason)"""
+        try:
+            messages, context = await self._build_enhanced_messages(user_message, conversation_history, context_parts)
+        except Exception as e:
+            print(f"Error preparing enhanced response: {e}")
+            yield "I apologize, but I'm having trouble processing your request right now. Please try again later."
+            return
+        
+        async for delta in self.openai_client.stream_chat_completion(messages, context, completion_info):
+            yield delta
 
 # Global service instance
 rag_service = RAGService()
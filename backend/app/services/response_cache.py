@@ -0,0 +1,145 @@
+"""
+Semantic response cache for repeated questions
+"""
+
+import hashlib
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from app.services.openai_client import get_async_openai_client
+from app.services.vector_index import get_vector_index, get_chunk_index
+from app.services.context_builder import TEMPLATE_INSTRUCTIONS
+from app.core.config import settings
+
+# Prefixes of the fallback answers returned when a model call fails
+FALLBACK_PREFIXES = ("I apologize, but I'm having trouble", "I'm sorry, I'm having trouble")
+
+class ResponseCache:
+    """Cache of answers keyed by the query embedding.
+
+    A lookup returns the stored answer of the most similar cached question
+    when its cosine similarity is at least ``threshold``. Entries expire after
+    ``ttl_seconds``, and the whole cache is dropped when the template corpus
+    (vector index versions) or the system prompt changes. Only use it for
+    questions whose answer doesn't depend on earlier turns.
+    """
+
+    def __init__(self, max_size: int = 512, ttl_seconds: int = 21600, threshold: float = 0.95):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self._vectors: List[np.ndarray] = []
+        self._entries: List[Dict[str, Any]] = []
+        self._matrix: Optional[np.ndarray] = None
+        self._version: Optional[Tuple] = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @staticmethod
+    def _hash_prompt(system_prompt: str) -> str:
+        """Fingerprint the prompt and model the cached answers were generated with"""
+        return hashlib.sha256(
+            f"{settings.OPENAI_MODEL}\x00{system_prompt}\x00{TEMPLATE_INSTRUCTIONS}".encode("utf-8")
+        ).hexdigest()
+
+    def _current_version(self) -> Tuple:
+        # The prompt is hashed on every check so an edited or reloaded prompt takes effect
+        prompt_hash = self._hash_prompt(get_async_openai_client()._get_system_message())
+        return (get_vector_index().version, get_chunk_index().version, prompt_hash)
+
+    def _check_version(self) -> None:
+        """Drop every entry if the corpus or prompt changed since they were stored"""
+        version = self._current_version()
+        if version != self._version:
+            if self._entries:
+                self.invalidations += 1
+                print(f"Response cache invalidated ({len(self._entries)} entries)")
+            self._vectors, self._entries, self._matrix = [], [], None
+            self._version = version
+
+    @staticmethod
+    def _normalize(embedding: List[float]) -> Optional[np.ndarray]:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector) if vector.ndim == 1 else 0
+        if not norm:
+            return None
+        return vector / norm
+
+    def get(self, query_embedding: List[float]) -> Optional[str]:
+        """Get the cached answer for a semantically equivalent question, or None"""
+        query = self._normalize(query_embedding) if query_embedding else None
+        now = time.time()
+
+        with self._lock:
+            self._check_version()
+            if query is None or not self._entries:
+                self.misses += 1
+                return None
+
+            if self._matrix is None:
+                self._matrix = np.vstack(self._vectors)
+            if self._matrix.shape[1] != query.shape[0]:
+                self.misses += 1
+                return None
+
+            similarities = self._matrix @ query
+            for i in np.argsort(-similarities):
+                if similarities[i] < self.threshold:
+                    break
+                entry = self._entries[i]
+                if now - entry["created_at"] <= self.ttl_seconds:
+                    self.hits += 1
+                    print(f"Response cache hit (similarity {similarities[i]:.3f}): {entry['query'][:50]}")
+                    return entry["answer"]
+
+            self.misses += 1
+            return None
+
+    def set(self, query_embedding: List[float], query: str, answer: str) -> None:
+        """Store an answer, skipping empty and fallback responses"""
+        if not answer or not answer.strip() or answer.startswith(FALLBACK_PREFIXES):
+            return
+        vector = self._normalize(query_embedding) if query_embedding else None
+        if vector is None:
+            return
+        now = time.time()
+
+        with self._lock:
+            self._check_version()
+            # Expired entries go first, then the oldest ones
+            keep = [i for i, entry in enumerate(self._entries) if now - entry["created_at"] <= self.ttl_seconds]
+            keep = keep[-(self.max_size - 1):] if self.max_size > 1 else []
+            self._vectors = [self._vectors[i] for i in keep] + [vector]
+            self._entries = [self._entries[i] for i in keep] + [{"query": query, "answer": answer, "created_at": now}]
+            self._matrix = None
+
+    def clear(self) -> None:
+        """Drop all cached answers"""
+        with self._lock:
+            self._vectors, self._entries, self._matrix = [], [], None
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache counters"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+# Global cache instance
+response_cache = ResponseCache(
+    max_size=settings.RESPONSE_CACHE_SIZE,
+    ttl_seconds=settings.RESPONSE_CACHE_TTL_SECONDS,
+    threshold=settings.RESPONSE_CACHE_SIMILARITY_THRESHOLD
+)
+
+def get_response_cache() -> ResponseCache:
+    """Get response cache instance"""
+    return response_cache
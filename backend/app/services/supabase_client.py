@@ -2,10 +2,19 @@
 Supabase client service for authentication and database operations
 """
 
+import base64
+import json
 from typing import Optional, Dict, Any, List
 from supabase import Client
 from app.core.database import get_supabase
 from app.core.config import settings
+from app.services.blob_storage import get_blob_storage
+
+# Everything but the (legacy) file bytes and the embedding
+PDF_DOCUMENT_COLUMNS = (
+    "id, title, description, file_name, file_key, file_size, file_type, extracted_text, "
+    "rti_category, rti_department, metadata, created_at, updated_at"
+)
 
 class SupabaseService:
     """Service class for Supabase operations"""
@@ -73,6 +82,49 @@ class SupabaseService:
             print(f"❌ Supabase: Traceback: {traceback.format_exc()}")
             return []
     
+    async def get_conversation_list(self, user_id: str, limit: Optional[int] = None,
+                                    before: Optional[tuple] = None) -> Dict[str, Any]:
+        """Get user conversations with message counts and last-message previews, most recently active first.
+        
+        ``before`` is the (last_activity_at, id) of the last conversation of the
+        previous page. Without ``limit`` every conversation is returned.
+        """
+        params = {
+            "user_uuid": user_id,
+            "page_size": limit + 1 if limit else None,  # One extra row tells us whether there are more
+            "preview_length": settings.CONVERSATION_PREVIEW_LENGTH
+        }
+        if before:
+            params["before_activity_at"], params["before_id"] = before
+        try:
+            response = self.client.rpc("get_conversation_list", params).execute()
+            rows = response.data or []
+        except Exception as e:
+            print(f"get_conversation_list unavailable, listing conversations without counts: {e}")
+            rows = await self.get_user_conversations(user_id)
+            if before or limit:
+                print("Pagination needs get_conversation_list; returning the full list")
+            return {"conversations": rows, "has_more": False}
+        
+        has_more = bool(limit) and len(rows) > limit
+        return {"conversations": rows[:limit] if limit else rows, "has_more": has_more}
+    
+    async def get_conversation_list_version(self, user_id: str) -> Optional[str]:
+        """Fingerprint of the user's conversation list, or None if it can't be computed.
+        
+        Changes whenever a conversation is added, renamed or deleted or a message
+        is added, without building the list itself.
+        """
+        try:
+            response = self.client.rpc("get_conversation_list_version", {"user_uuid": user_id}).execute()
+            rows = response.data or []
+            if isinstance(rows, dict):
+                rows = [rows]
+            return json.dumps(rows[0], sort_keys=True, default=str) if rows else None
+        except Exception as e:
+            print(f"get_conversation_list_version unavailable: {e}")
+            return None
+    
     async def create_conversation(self, user_id: str, title: str) -> Optional[Dict[str, Any]]:
         """Create new conversation"""
         try:
@@ -161,6 +213,37 @@ class SupabaseService:
             print(f"❌ Supabase: Traceback: {traceback.format_exc()}")
             return []
     
+    async def get_messages_page(self, conversation_id: str, user_id: str, limit: int,
+                                before: Optional[tuple] = None, after: Optional[tuple] = None,
+                                light: bool = False) -> Dict[str, Any]:
+        """Get one page of conversation messages by (created_at, id) cursor, oldest first.
+        
+        ``before``/``after`` are (created_at, id) tuples; ``after`` may have id None to
+        get everything newer than a timestamp. Without cursors the newest page is returned.
+        """
+        try:
+            params = {
+                "conv_id": conversation_id,
+                "user_uuid": user_id,
+                "page_size": limit + 1,  # One extra row tells us whether there are more
+                "light": light
+            }
+            if after:
+                params["after_created_at"], params["after_id"] = after
+            elif before:
+                params["before_created_at"], params["before_id"] = before
+            response = self.client.rpc("get_messages_page", params).execute()
+            rows = response.data or []
+        except Exception as e:
+            print(f"Error getting messages page: {e}")
+            rows = []
+        
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        if not after:
+            rows.reverse()  # Scanned newest first
+        return {"messages": rows, "has_more": has_more}
+    
     async def add_message(self, conversation_id: str, sender: str, content: str, metadata: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
         """Add message to conversation"""
         try:
@@ -179,6 +262,99 @@ class SupabaseService:
             print(f"Error adding message: {e}")
             return None
     
+    async def get_conversation_memory(self, conversation_id: str, user_id: str, limit: int) -> Optional[Dict[str, Any]]:
+        """Get the stored summary, total message count and the most recent messages of a conversation.
+        
+        Returns None if the conversation doesn't exist or doesn't belong to the user.
+        """
+        try:
+            # Ownership, summary, count and recent messages in one round trip
+            response = self.client.rpc("get_conversation_context", {
+                "conv_id": conversation_id,
+                "user_uuid": user_id,
+                "message_limit": limit
+            }).execute()
+        except Exception as e:
+            print(f"get_conversation_context unavailable, reading tables directly: {e}")
+            return await self._get_conversation_memory_from_tables(conversation_id, user_id, limit)
+        
+        if not response.data:
+            print(f"Conversation {conversation_id} not found or doesn't belong to user {user_id}")
+            return None
+        row = response.data[0]
+        return {
+            "summary": row.get("summary") or "",
+            "summarized_count": row.get("summarized_count") or 0,
+            "message_count": row.get("message_count") or 0,
+            "messages": row.get("messages") or []
+        }
+    
+    async def _get_conversation_memory_from_tables(self, conversation_id: str, user_id: str, limit: int) -> Optional[Dict[str, Any]]:
+        """get_conversation_memory for databases without the get_conversation_context function"""
+        try:
+            # Verify ownership and read the summary in one request
+            conv_response = self.client.table("conversations").select(
+                "id, conversation_summaries(summary, summarized_count)"
+            ).eq("id", conversation_id).eq("user_id", user_id).execute()
+            if not conv_response.data:
+                print(f"Conversation {conversation_id} not found or doesn't belong to user {user_id}")
+                return None
+            
+            summary_rows = conv_response.data[0].get("conversation_summaries") or []
+            if isinstance(summary_rows, dict):
+                summary_rows = [summary_rows]
+            summary = summary_rows[0] if summary_rows else {}
+            
+            response = self.client.table("messages").select("*", count="exact").eq(
+                "conversation_id", conversation_id
+            ).order("created_at", desc=True).limit(limit).execute()
+            messages = list(reversed(response.data or []))
+            
+            return {
+                "summary": summary.get("summary") or "",
+                "summarized_count": summary.get("summarized_count") or 0,
+                "message_count": response.count if response.count is not None else len(messages),
+                "messages": messages
+            }
+        except Exception as e:
+            print(f"Error getting conversation memory: {e}")
+            return None
+    
+    async def get_messages_range(self, conversation_id: str, offset: int, limit: int) -> List[Dict[str, Any]]:
+        """Get messages of a conversation by position, oldest first"""
+        try:
+            response = self.client.table("messages").select("id, sender, content, created_at").eq(
+                "conversation_id", conversation_id
+            ).order("created_at", desc=False).range(offset, offset + limit - 1).execute()
+            return response.data if response.data else []
+        except Exception as e:
+            print(f"Error getting message range: {e}")
+            return []
+    
+    async def update_conversation_summary(self, conversation_id: str, summary: str, summarized_count: int,
+                                          previous_count: int) -> bool:
+        """Store the rolling summary of a conversation's older messages.
+        
+        The write only applies while the stored count is still ``previous_count``,
+        so two refreshes of the same conversation can't overwrite each other.
+        Returns whether it was applied.
+        """
+        row = {"summary": summary, "summarized_count": summarized_count}
+        try:
+            response = self.client.table("conversation_summaries").update(row).eq(
+                "conversation_id", conversation_id
+            ).eq("summarized_count", previous_count).execute()
+            if response.data:
+                return True
+            if previous_count:
+                return False
+            # No summary yet; a concurrent first write makes this insert fail on the primary key
+            self.client.table("conversation_summaries").insert({"conversation_id": conversation_id, **row}).execute()
+            return True
+        except Exception as e:
+            print(f"Error updating conversation summary: {e}")
+            return False
+    
     async def create_rti_draft(self, user_id: str, title: str, content: str, department: str = None, subject: str = None) -> Optional[Dict[str, Any]]:
         """Create RTI draft"""
         try:
@@ -217,6 +393,131 @@ class SupabaseService:
             print(f"Error searching PDF documents: {e}")
             return []
     
+    async def search_pdf_documents_slim(self, query_embedding: List[float], threshold: float = None, limit: int = None) -> List[Dict[str, Any]]:
+        """Rank PDF documents by vector similarity, returning ids, titles, categories and scores only"""
+        try:
+            response = self.client.rpc("search_pdf_documents_slim", {
+                "query_embedding": query_embedding,
+                "match_threshold": threshold or settings.RAG_SIMILARITY_THRESHOLD,
+                "match_count": limit or settings.RAG_MAX_RESULTS
+            }).execute()
+            return response.data if response.data else []
+        except Exception as e:
+            # Before migration_slim_document_search.sql the full search still works
+            print(f"Slim PDF search unavailable, using search_pdf_documents: {e}")
+            return await self.search_pdf_documents(query_embedding, threshold, limit)
+    
+    async def hybrid_search_pdf_documents(self, query_text: str, query_embedding: List[float], threshold: float = None, limit: int = None) -> List[Dict[str, Any]]:
+        """Rank PDF documents by full-text and vector similarity fused with reciprocal-rank fusion"""
+        try:
+            response = self.client.rpc("hybrid_search_pdf_documents", {
+                "query_text": query_text,
+                "query_embedding": query_embedding,
+                "match_threshold": threshold or settings.RAG_SIMILARITY_THRESHOLD,
+                "match_count": limit or settings.RAG_MAX_RESULTS,
+                "candidate_count": settings.RAG_HYBRID_CANDIDATES,
+                "rrf_k": settings.RAG_RRF_K
+            }).execute()
+            return response.data if response.data else []
+        except Exception as e:
+            # Before migration_hybrid_search.sql only the vector ranking exists
+            print(f"Hybrid PDF search unavailable, using vector search: {e}")
+            return await self.search_pdf_documents_slim(query_embedding, threshold, limit)
+    
+    async def get_pdf_document_texts(self, document_ids: List[str]) -> Dict[str, str]:
+        """Get the extracted text of the given PDF documents, keyed by id"""
+        if not document_ids:
+            return {}
+        try:
+            response = self.client.table("pdf_documents").select("id, extracted_text").in_("id", document_ids).execute()
+            return {row["id"]: row.get("extracted_text") or "" for row in response.data or []}
+        except Exception as e:
+            print(f"Error getting PDF document texts: {e}")
+            return {}
+    
+    async def get_pdf_documents_for_index(self) -> List[Dict[str, Any]]:
+        """Get all PDF documents with embeddings (and text, for the lexical index) for the in-process indexes"""
+        try:
+            response = self.client.table("pdf_documents").select(
+                "id, title, rti_category, rti_department, extracted_text, embedding"
+            ).execute()
+            return response.data if response.data else []
+        except Exception as e:
+            print(f"Error getting PDF documents for index: {e}")
+            return []
+
+    async def add_pdf_chunks(self, document_id: str, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Store chunk embeddings for a PDF document"""
+        try:
+            if not chunks:
+                return []
+            rows = [{
+                "document_id": document_id,
+                "chunk_index": chunk["chunk_index"],
+                "content": chunk["content"],
+                "token_count": chunk["token_count"],
+                "embedding": chunk["embedding"]
+            } for chunk in chunks]
+            response = self.client.table("pdf_chunks").insert(rows).execute()
+            return response.data if response.data else []
+        except Exception as e:
+            print(f"Error adding PDF chunks: {e}")
+            return []
+
+    async def delete_pdf_chunks(self, document_id: str) -> None:
+        """Delete all chunks of a PDF document"""
+        try:
+            self.client.table("pdf_chunks").delete().eq("document_id", document_id).execute()
+        except Exception as e:
+            print(f"Error deleting PDF chunks: {e}")
+
+    async def search_pdf_chunks(self, query_embedding: List[float], threshold: float = None, limit: int = None) -> List[Dict[str, Any]]:
+        """Search PDF chunks using vector similarity"""
+        try:
+            response = self.client.rpc("search_pdf_chunks", {
+                "query_embedding": query_embedding,
+                "match_threshold": threshold or settings.RAG_SIMILARITY_THRESHOLD,
+                "match_count": limit or settings.RAG_MAX_CHUNKS
+            }).execute()
+            return response.data if response.data else []
+        except Exception as e:
+            print(f"Error searching PDF chunks: {e}")
+            return []
+
+    async def get_pdf_chunks_for_index(self) -> List[Dict[str, Any]]:
+        """Get all PDF chunks with embeddings and document details for the in-process index"""
+        try:
+            response = self.client.table("pdf_chunks").select(
+                "id, document_id, chunk_index, content, token_count, embedding, "
+                "pdf_documents(title, rti_category, rti_department)"
+            ).execute()
+            chunks = []
+            for row in response.data or []:
+                document = row.pop("pdf_documents", None) or {}
+                chunks.append({**row, **document})
+            return chunks
+        except Exception as e:
+            print(f"Error getting PDF chunks for index: {e}")
+            return []
+
+    async def get_pdf_chunks_by_ids(self, chunk_ids: List[str]) -> List[Dict[str, Any]]:
+        """Get PDF chunks with their document details by id, in the given order"""
+        if not chunk_ids:
+            return []
+        try:
+            response = self.client.table("pdf_chunks").select(
+                "id, document_id, chunk_index, content, token_count, "
+                "pdf_documents(title, rti_category, rti_department)"
+            ).in_("id", chunk_ids).execute()
+            by_id = {}
+            for row in response.data or []:
+                document = row.pop("pdf_documents", None) or {}
+                by_id[row["id"]] = {**row, **document}
+            return [by_id[chunk_id] for chunk_id in chunk_ids if chunk_id in by_id]
+        except Exception as e:
+            print(f"Error getting PDF chunks by id: {e}")
+            return []
+
     async def search_pdf_documents_by_category(self, category: str, department: str = None) -> List[Dict[str, Any]]:
         """Search PDF documents by RTI category"""
         try:
@@ -232,21 +533,12 @@ class SupabaseService:
     async def add_pdf_document(self, title: str, description: str, file_name: str, file_data: bytes, 
                               file_size: int, extracted_text: str, embedding: List[float], 
                               rti_category: str, rti_department: str = None, metadata: Dict = None) -> Dict[str, Any]:
-        """Add a PDF document to the knowledge base"""
+        """Add a PDF document to the knowledge base, storing the file itself in blob storage"""
         try:
-            # Convert bytes to base64 for Supabase storage
-            import base64
-            file_data_base64 = base64.b64encode(file_data).decode('utf-8')
-            
-            print(f"Original file_data type: {type(file_data)}")
-            print(f"Base64 file_data type: {type(file_data_base64)}")
-            print(f"Base64 length: {len(file_data_base64)}")
-            
-            response = self.client.table("pdf_documents").insert({
+            document = {
                 "title": title,
                 "description": description,
                 "file_name": file_name,
-                "file_data": file_data_base64,  # Store as base64 string
                 "file_size": file_size,
                 "file_type": "application/pdf",
                 "extracted_text": extracted_text,
@@ -254,7 +546,16 @@ class SupabaseService:
                 "rti_category": rti_category,
                 "rti_department": rti_department,
                 "metadata": metadata or {}
-            }).execute()
+            }
+            try:
+                document["file_key"] = await get_blob_storage().put(file_data, "application/pdf")
+                print(f"Stored PDF file as {document['file_key']}")
+            except Exception as e:
+                # Without blob storage the file goes in the row, as before migration_blob_storage.sql
+                print(f"Blob storage unavailable, storing PDF as base64: {e}")
+                document["file_data"] = base64.b64encode(file_data).decode('utf-8')
+            
+            response = self.client.table("pdf_documents").insert(document).execute()
             
             print(f"Successfully added PDF document: {title}")
             return response.data[0] if response.data else None
@@ -266,16 +567,82 @@ class SupabaseService:
             return None
     
     async def get_pdf_document(self, document_id: str) -> Dict[str, Any]:
-        """Get a PDF document by ID"""
+        """Get a PDF document by ID, without the file bytes or embedding"""
         try:
-            response = self.client.table("pdf_documents").select("*").eq("id", document_id).execute()
+            response = self.client.table("pdf_documents").select(PDF_DOCUMENT_COLUMNS).eq("id", document_id).execute()
             return response.data[0] if response.data else None
         except Exception as e:
             print(f"Error getting PDF document: {e}")
             return None
+    
+    async def get_pdf_document_file(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Get a PDF document's file name, type and blob key (or legacy base64 file_data)"""
+        try:
+            response = self.client.table("pdf_documents").select(
+                "file_name, file_type, file_key"
+            ).eq("id", document_id).execute()
+            if not response.data:
+                return None
+            document = response.data[0]
+            if not document.get("file_key"):
+                # Rows not yet moved by migrate_files_to_blob_storage.py
+                legacy = self.client.table("pdf_documents").select("file_data").eq("id", document_id).execute()
+                document["file_data"] = legacy.data[0].get("file_data") if legacy.data else None
+            return document
+        except Exception as e:
+            print(f"Error getting PDF document file: {e}")
+            return None
+
+    async def record_file_upload(self, user_id: str, file_key: str, file_name: str, content_type: str,
+                                 file_size: int) -> Optional[Dict[str, Any]]:
+        """Record that a user uploaded a blob, so they can download it and attach it later"""
+        try:
+            await self.ensure_user_profile_exists(user_id)
+            response = self.client.table("file_uploads").upsert({
+                "user_id": user_id,
+                "file_key": file_key,
+                "file_name": file_name,
+                "content_type": content_type,
+                "file_size": file_size
+            }).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            print(f"Error recording file upload: {e}")
+            return None
+    
+    async def get_file_upload(self, user_id: str, file_key: str) -> Optional[Dict[str, Any]]:
+        """Get the user's record of an uploaded blob, or None if they never uploaded it"""
+        try:
+            response = self.client.table("file_uploads").select("*").eq("user_id", user_id).eq(
+                "file_key", file_key
+            ).limit(1).execute()
+            return response.data[0] if response.data else None
+        except Exception as e:
+            print(f"Error getting file upload: {e}")
+            return None
+    
+    async def can_access_blob(self, user_id: str, key: str) -> bool:
+        """Whether a blob key belongs to a knowledge-base PDF, or the user uploaded it or attached it to an RTI application"""
+        try:
+            response = self.client.table("pdf_documents").select("id").eq("file_key", key).limit(1).execute()
+            if response.data:
+                return True
+            if await self.get_file_upload(user_id, key):
+                return True
+            response = self.client.table("rti_applications").select("id").eq(
+                "attached_file_key", key
+            ).eq("user_id", user_id).limit(1).execute()
+            return bool(response.data)
+        except Exception as e:
+            print(f"Error checking blob access: {e}")
+            return False
 
 # Global service instance
-supabase_service = SupabaseService()
+if settings.DATABASE_BACKEND == "postgres":
+    from app.services.postgres_client import PostgresService
+    supabase_service = PostgresService()
+else:
+    supabase_service = SupabaseService()
 
 def get_supabase_client() -> SupabaseService:
     """Get Supabase service instance"""
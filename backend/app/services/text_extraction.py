@@ -0,0 +1,442 @@
+"""
+Text extraction for uploaded PDF, DOCX and TXT files.
+
+Parsing is CPU-bound, so TextExtractionService runs it in a process pool
+instead of on the event loop.
+"""
+
+import asyncio
+import io
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, Iterator, Optional, Tuple
+import PyPDF2
+import tiktoken
+from docx import Document
+from app.core.config import settings
+from app.services.text_normalization import normalize_text, normalize_pdf_text
+from app.services.extraction_cache import get_extraction_cache
+
+# Bump when extraction or normalization output changes, so cached results are not reused
+EXTRACTOR_VERSION = 4
+
+# How long past its own deadline a worker may run before it is taken to be stuck
+DEADLINE_GRACE_SECONDS = 5.0
+
+_encoding = None
+
+def _get_encoding():
+    """Tokenizer for budget checks, loaded once per worker process"""
+    global _encoding
+    if _encoding is None:
+        _encoding = tiktoken.get_encoding("cl100k_base")
+    return _encoding
+
+def count_tokens(text: str) -> int:
+    """Count tokens, estimating from length if the tokenizer can't be loaded"""
+    try:
+        return len(_get_encoding().encode(text))
+    except Exception:
+        return len(text) // 4
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to at most max_tokens tokens"""
+    try:
+        encoding = _get_encoding()
+        return encoding.decode(encoding.encode(text)[:max_tokens])
+    except Exception:
+        return text[:max_tokens * 4]
+
+def parse_page_range(value: Optional[str]) -> Optional[Tuple[int, Optional[int]]]:
+    """Parse "5", "3-7" or "3-" into 1-based (first, last) pages; last is None for open ranges"""
+    if not value or not value.strip():
+        return None
+    first, dash, last = value.strip().partition("-")
+    first_page = int(first)
+    last_page = (int(last) if last.strip() else None) if dash else first_page
+    if first_page < 1 or (last_page is not None and last_page < first_page):
+        raise ValueError(f"Invalid page range: {value}")
+    return first_page, last_page
+
+def extract_document(
+    file_content: bytes,
+    file_extension: str,
+    max_pages: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+    page_range: Optional[Tuple[int, Optional[int]]] = None
+) -> Dict[str, Any]:
+    """Extract text from a PDF, DOCX or TXT file, stopping at max_tokens.
+    
+    Returns the text with its token_count, whether it was truncated, and for
+    PDFs the total page_count and the first_page/last_page actually read.
+    """
+    try:
+        print(f"File size: {len(file_content)} bytes, Extension: {file_extension}")
+        
+        if file_extension.lower() == '.pdf':
+            return extract_pdf_document(file_content, max_pages, max_tokens, page_range)
+        elif file_extension.lower() == '.docx':
+            text = extract_docx_text(file_content)
+        elif file_extension.lower() == '.txt':
+            text = extract_txt_text(file_content)
+        else:
+            raise Exception(f"Unsupported file type: {file_extension}")
+        
+        token_count = count_tokens(text)
+        truncated = bool(max_tokens) and token_count > max_tokens
+        if truncated:
+            text = truncate_to_tokens(text, max_tokens)
+            token_count = max_tokens
+        return {
+            "text": text, "token_count": token_count, "truncated": truncated,
+            "page_count": None, "first_page": None, "last_page": None
+        }
+    
+    except Exception as e:
+        print(f"Error extracting text from {file_extension}: {e}")
+        raise e
+
+def extract_text_from_file(file_content: bytes, file_extension: str, max_pages: Optional[int] = None) -> str:
+    """Extract text content from various file types (PDF, DOCX, TXT)"""
+    return extract_document(file_content, file_extension, max_pages)["text"]
+
+def extract_pdf_text(file_content: bytes, max_pages: Optional[int] = None) -> str:
+    """Extract text content from PDF file, reading at most max_pages pages"""
+    return extract_pdf_document(file_content, max_pages)["text"]
+
+def open_pdf(file_content: bytes) -> PyPDF2.PdfReader:
+    """Open a PDF for reading; pages are only parsed when accessed"""
+    pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
+    
+    # Check if PDF is encrypted
+    if pdf_reader.is_encrypted:
+        print("PDF is encrypted")
+        raise Exception("PDF is password protected or encrypted")
+    return pdf_reader
+
+def iter_pdf_pages(pdf_reader: PyPDF2.PdfReader, first_page: int = 1,
+                   last_page: Optional[int] = None) -> Iterator[Tuple[int, str]]:
+    """Yield (page number, normalized text) one page at a time, skipping pages with no text"""
+    last_page = min(last_page or len(pdf_reader.pages), len(pdf_reader.pages))
+    for page_number in range(first_page, last_page + 1):
+        page_text = normalize_pdf_text(pdf_reader.pages[page_number - 1].extract_text() or "")
+        if page_text:
+            print(f"Page {page_number} text length: {len(page_text)}")
+            yield page_number, page_text
+        else:
+            print(f"Page {page_number}: No text extracted")
+
+def extract_pdf_document(
+    file_content: bytes,
+    max_pages: Optional[int] = None,
+    max_tokens: Optional[int] = None,
+    page_range: Optional[Tuple[int, Optional[int]]] = None
+) -> Dict[str, Any]:
+    """Extract PDF text page by page until max_pages pages or max_tokens tokens have been read.
+    
+    ``page_range`` is clamped to the document; a range starting past the last
+    page gives empty text with the page_count and no first_page/last_page.
+    """
+    try:
+        print(f"PDF file size: {len(file_content)} bytes")
+        
+        pdf_reader = open_pdf(file_content)
+        page_count = len(pdf_reader.pages)
+        print(f"PDF pages: {page_count}")
+        
+        first_page, last_page = page_range or (1, None)
+        if first_page > page_count:
+            # Nothing to read; first_page/last_page stay unset so no page span is reported
+            print(f"Requested page {first_page} is past the end of the {page_count}-page PDF")
+            return {
+                "text": "", "token_count": 0, "truncated": False,
+                "page_count": page_count, "first_page": None, "last_page": None
+            }
+        last_page = min(last_page or page_count, page_count)
+        if max_pages and last_page - first_page + 1 > max_pages:
+            print(f"PDF has {page_count} pages, extracting {max_pages} from page {first_page}")
+            last_page = first_page + max_pages - 1
+        
+        # Pages are parsed lazily, so nothing past the token budget is extracted
+        text_parts = []
+        token_count = 0
+        pages_read = first_page - 1
+        truncated = first_page > 1 or last_page < page_count
+        for page_number, page_text in iter_pdf_pages(pdf_reader, first_page, last_page):
+            page_tokens = count_tokens(page_text)
+            if max_tokens and token_count + page_tokens > max_tokens:
+                remaining = max_tokens - token_count
+                if remaining > 0:
+                    text_parts.append(truncate_to_tokens(page_text, remaining))
+                    token_count = max_tokens
+                    pages_read = page_number
+                truncated = True
+                print(f"Token budget of {max_tokens} reached on page {page_number}")
+                break
+            text_parts.append(page_text)
+            token_count += page_tokens
+            pages_read = page_number
+        else:
+            pages_read = last_page
+        
+        # Pages are already normalized, so joining with a space gives the final text
+        full_text = " ".join(text_parts)
+        
+        print(f"Total extracted text length: {len(full_text)}")
+        print(f"First 500 chars: {full_text[:500]}")
+        
+        return {
+            "text": full_text.strip(),
+            "token_count": token_count,
+            "truncated": truncated,
+            "page_count": page_count,
+            "first_page": first_page,
+            "last_page": pages_read
+        }
+    except Exception as e:
+        print(f"Error extracting PDF text: {e}")
+        print(f"Error type: {type(e)}")
+        raise e  # Re-raise the exception instead of returning error string
+
+def extract_docx_text(file_content: bytes) -> str:
+    """Extract text content from DOCX file"""
+    try:
+        print(f"DOCX file size: {len(file_content)} bytes")
+        
+        # Create a BytesIO object from the file content
+        docx_file = io.BytesIO(file_content)
+        
+        # Create Document object
+        doc = Document(docx_file)
+        
+        # Extract text from all paragraphs
+        text_parts = []
+        for paragraph in doc.paragraphs:
+            if paragraph.text.strip():
+                text_parts.append(paragraph.text.strip())
+        
+        # Join all text parts
+        full_text = "\n".join(text_parts)
+        
+        # Fix extraction artefacts and normalize whitespace
+        full_text = normalize_text(full_text)
+        
+        print(f"Total extracted text length: {len(full_text)}")
+        print(f"First 500 chars: {full_text[:500]}")
+        
+        return full_text.strip()
+    except Exception as e:
+        print(f"Error extracting DOCX text: {e}")
+        print(f"Error type: {type(e)}")
+        raise e
+
+def extract_txt_text(file_content: bytes) -> str:
+    """Extract text content from TXT file"""
+    try:
+        print(f"TXT file size: {len(file_content)} bytes")
+        
+        # Decode bytes to text
+        text = file_content.decode('utf-8')
+        
+        # Fix extraction artefacts and normalize whitespace
+        text = normalize_text(text)
+        
+        print(f"Total extracted text length: {len(text)}")
+        print(f"First 500 chars: {text[:500]}")
+        
+        return text.strip()
+    except UnicodeDecodeError:
+        # Try with different encodings
+        try:
+            text = file_content.decode('latin-1')
+            
+            text = normalize_text(text)
+            print(f"Decoded with latin-1, length: {len(text)}")
+            return text.strip()
+        except Exception as e:
+            print(f"Error decoding TXT file: {e}")
+            raise e
+    except Exception as e:
+        print(f"Error extracting TXT text: {e}")
+        print(f"Error type: {type(e)}")
+        raise e
+
+def extract_document_with_deadline(timeout_seconds: float, *args) -> Dict[str, Any]:
+    """extract_document for a pool worker, raising TimeoutError after timeout_seconds.
+
+    A running pool job can't be cancelled from outside, so the worker stops
+    itself with SIGALRM and stays usable for the next file. Where setitimer
+    doesn't exist (Windows) only the caller's timeout applies.
+    """
+    if not hasattr(signal, "setitimer"):
+        return extract_document(*args)
+
+    def expire(signum, frame):
+        raise TimeoutError(f"Text extraction timed out after {timeout_seconds:g} seconds")
+
+    previous = signal.signal(signal.SIGALRM, expire)
+    signal.setitimer(signal.ITIMER_REAL, timeout_seconds)
+    try:
+        return extract_document(*args)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+class TextExtractionService:
+    """Run file text extraction in a bounded process pool.
+
+    Each file gets ``EXTRACTION_TIMEOUT_SECONDS`` and at most
+    ``EXTRACTION_MAX_PAGES`` PDF pages. One pool of ``EXTRACTION_MAX_WORKERS``
+    processes lives as long as the app, and ``EXTRACTION_MAX_QUEUE`` more
+    files may wait for it; beyond that new files are rejected instead of
+    piling up. Workers enforce the timeout themselves, so a slow file fails
+    without touching anyone else's. Only a worker that is still stuck well
+    past its deadline gets the pool replaced: new files go to a fresh pool
+    while the old one finishes its running jobs and exits. Results are cached
+    by content hash, so a file that is attached again is never parsed twice.
+    """
+
+    def __init__(self):
+        self.max_workers = settings.EXTRACTION_MAX_WORKERS
+        self.max_queue = settings.EXTRACTION_MAX_QUEUE
+        self.timeout_seconds = settings.EXTRACTION_TIMEOUT_SECONDS
+        self.max_pages = settings.EXTRACTION_MAX_PAGES
+        self.cache = get_extraction_cache()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._in_flight = 0
+        self.completed = 0
+        self.failures = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.pool_replacements = 0
+        self.total_seconds = 0.0
+
+    def _get_pool(self) -> Optional[ProcessPoolExecutor]:
+        """Create the pool on first use; None if processes can't be started here"""
+        if self._pool is None and self.max_workers > 0:
+            try:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            except Exception as e:
+                print(f"Process pool unavailable, extracting in threads: {e}")
+                self.max_workers = 0
+        return self._pool
+
+    def _retire_pool(self, pool: ProcessPoolExecutor) -> None:
+        """Send new files to a fresh pool; the old one exits once its running jobs end"""
+        if pool is self._pool:
+            self._pool = None
+            self.pool_replacements += 1
+        pool.shutdown(wait=False)
+
+    async def _run_in_pool(self, pool: ProcessPoolExecutor, args: tuple) -> Dict[str, Any]:
+        """Parse in the pool, retiring it if the worker overruns even its own deadline"""
+        job = asyncio.get_running_loop().run_in_executor(
+            pool, extract_document_with_deadline, self.timeout_seconds, *args
+        )
+        done, _ = await asyncio.wait({job}, timeout=self.timeout_seconds + DEADLINE_GRACE_SECONDS)
+        if not done:
+            print("Extraction worker is stuck past its deadline, replacing the process pool")
+            job.cancel()
+            self._retire_pool(pool)
+            raise TimeoutError(f"Text extraction timed out after {self.timeout_seconds:g} seconds")
+        return job.result()
+
+    @property
+    def queue_depth(self) -> int:
+        """Files waiting for a free worker"""
+        return max(0, self._in_flight - max(self.max_workers, 1))
+
+    async def extract(self, file_content: bytes, file_extension: str) -> str:
+        """Extract text from a file without blocking the event loop"""
+        return (await self.extract_document(file_content, file_extension))["text"]
+
+    async def extract_document(
+        self,
+        file_content: bytes,
+        file_extension: str,
+        max_tokens: Optional[int] = None,
+        page_range: Optional[Tuple[int, Optional[int]]] = None
+    ) -> Dict[str, Any]:
+        """Get a file's text and token count, parsing it only if it isn't cached.
+        
+        ``max_tokens`` stops PDF extraction at the first page past the budget;
+        ``page_range`` limits it to (first, last) pages.
+        """
+        content_hash = self.cache.content_hash(file_content)
+        first_page, last_page = page_range or (1, None)
+        variant = (
+            f"{file_extension.lower()}:{self.max_pages or 0}:{max_tokens or 0}:"
+            f"{first_page}-{last_page or ''}:v{EXTRACTOR_VERSION}"
+        )
+        cached = self.cache.get(content_hash, variant)
+        if cached is not None:
+            print(f"Extraction cache hit for {content_hash[:12]} ({len(cached['text'])} characters)")
+            return cached
+
+        result = await self._run(file_content, file_extension, max_tokens, page_range)
+        self.cache.set(content_hash, variant, result)
+        return result
+
+    async def _run(self, file_content: bytes, file_extension: str, max_tokens: Optional[int],
+                   page_range: Optional[Tuple[int, Optional[int]]]) -> Dict[str, Any]:
+        """Parse a file in the worker pool, or a thread where processes are unavailable"""
+        if self._in_flight >= max(self.max_workers, 1) + self.max_queue:
+            self.rejected += 1
+            raise Exception("Too many files are being processed right now. Please try again shortly.")
+
+        self._in_flight += 1
+        started = time.perf_counter()
+        args = (file_content, file_extension, self.max_pages, max_tokens, page_range)
+        try:
+            if self._pool is None and self.max_workers > 0:
+                # Forked workers inherit the tokenizer instead of each loading it
+                await asyncio.to_thread(count_tokens, "")
+            pool = self._get_pool()
+            if pool is not None:
+                result = await self._run_in_pool(pool, args)
+            else:
+                # No timeout here: a thread can't be stopped, so wait_for would only
+                # stop waiting while the parse kept running in the background
+                result = await asyncio.to_thread(extract_document, *args)
+            self.completed += 1
+            return result
+        except TimeoutError:
+            self.timeouts += 1
+            print(f"Text extraction timed out after {self.timeout_seconds}s ({len(file_content)} bytes)")
+            raise Exception(f"Text extraction timed out after {self.timeout_seconds:g} seconds")
+        except Exception:
+            self.failures += 1
+            raise
+        finally:
+            self._in_flight -= 1
+            self.total_seconds += time.perf_counter() - started
+
+    def stats(self) -> Dict[str, Any]:
+        """Pool size, queue depth and outcome counters"""
+        finished = self.completed + self.failures + self.timeouts
+        return {
+            "workers": self.max_workers,
+            "in_flight": self._in_flight,
+            "queue_depth": self.queue_depth,
+            "max_queue": self.max_queue,
+            "completed": self.completed,
+            "failures": self.failures,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "pool_replacements": self.pool_replacements,
+            "avg_seconds": round(self.total_seconds / finished, 3) if finished else 0.0
+        }
+
+    def shutdown(self) -> None:
+        """Stop the worker pool, dropping files that haven't started"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+# Global extraction service instance
+text_extraction_service = TextExtractionService()
+
+def get_text_extraction_service() -> TextExtractionService:
+    """Get text extraction service instance"""
+    return text_extraction_service
@@ -0,0 +1,84 @@
+"""
+Single-pass normalization of text extracted from uploaded documents
+"""
+
+import re
+import unicodedata
+
+# Invisible characters that only get in the way of search and token counts
+CHARACTER_REPLACEMENTS = {
+    "\u00ad": "",     # soft hyphen
+    "\u200b": "",     # zero-width space
+    "\u200c": "",     # zero-width non-joiner
+    "\u200d": "",     # zero-width joiner
+    "\ufeff": "",     # byte order mark
+}
+
+# Glyphs that PDF text extraction returns in place of letters. The
+# presentation-form ligatures (U+FB00-FB06) are spelled out here so the common
+# case never needs NFKC, and Word's Symbol-font bullets come out as
+# private-use code points. Only applied to PDF pages.
+PDF_CHARACTER_REPLACEMENTS = {
+    **CHARACTER_REPLACEMENTS,
+    "\ufb00": "ff",
+    "\ufb01": "fi",
+    "\ufb02": "fl",
+    "\ufb03": "ffi",
+    "\ufb04": "ffl",
+    "\ufb05": "st",
+    "\ufb06": "st",
+    "\uf0b7": "\u2022",  # Symbol-font bullet
+    "\uf0a7": "\u25aa",  # Wingdings square bullet
+    "\uf0d8": "\u27a2",  # Wingdings arrow bullet
+}
+
+# Calibri's ti/tt ligatures come out as look-alike Latin letters. Those are
+# real letters elsewhere, so they are only replaced on PDF pages and only
+# next to a Latin letter or ligature ("applica Ɵon", "maƩer", "cer Ɵﬁed").
+PDF_LOOKALIKE_REPLACEMENTS = {
+    "\u019f": "ti",   # Ɵ
+    "\u01a9": "tt",   # Ʃ
+}
+
+# One compiled character class finds every glyph in a single scan. (str.translate
+# would be the obvious tool, but with multi-character replacements on non-Latin-1
+# text CPython takes its slow per-character path, about 4x slower than this.)
+ARTEFACT_PATTERN = re.compile("[%s]" % "".join(CHARACTER_REPLACEMENTS))
+PDF_ARTEFACT_PATTERN = re.compile("[%s]" % "".join({**PDF_CHARACTER_REPLACEMENTS, **PDF_LOOKALIKE_REPLACEMENTS}))
+
+# What counts as a neighbouring letter for the look-alike glyphs
+LATIN_LETTER_PATTERN = re.compile("[A-Za-z\ufb00-\ufb06]")
+
+def _replace_artefact(match: "re.Match") -> str:
+    return CHARACTER_REPLACEMENTS[match.group()]
+
+def _replace_pdf_artefact(match: "re.Match") -> str:
+    glyph = match.group()
+    replacement = PDF_LOOKALIKE_REPLACEMENTS.get(glyph)
+    if replacement is None:
+        return PDF_CHARACTER_REPLACEMENTS[glyph]
+    # Checked in the callback so the pattern stays a single character class
+    text, start = match.string, match.start()
+    if LATIN_LETTER_PATTERN.match(text, start + 1) or (start and LATIN_LETTER_PATTERN.match(text, start - 1)):
+        return replacement
+    return glyph
+
+def _normalize(text: str, pattern: "re.Pattern", replace) -> str:
+    if not text.isascii():
+        text = pattern.sub(replace, text)
+        if not unicodedata.is_normalized("NFKC", text):
+            text = unicodedata.normalize("NFKC", text)
+    return " ".join(text.split())
+
+def normalize_text(text: str) -> str:
+    """Drop invisible characters, apply NFKC and collapse whitespace.
+
+    ASCII text skips both the fix-ups and NFKC; everything else gets one
+    regex pass and is only run through NFKC when something is left to fold
+    (non-breaking spaces, full-width forms and the like).
+    """
+    return _normalize(text, ARTEFACT_PATTERN, _replace_artefact)
+
+def normalize_pdf_text(text: str) -> str:
+    """normalize_text for a PDF page, also repairing ligature and bullet glyphs"""
+    return _normalize(text, PDF_ARTEFACT_PATTERN, _replace_pdf_artefact)
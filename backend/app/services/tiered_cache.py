@@ -0,0 +1,152 @@
+"""
+Bounded LRU + TTL cache with an optional SQLite tier, shared by the embedding and extraction caches
+"""
+
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+class TieredCache(ABC):
+    """Bounded LRU + TTL cache with an optional on-disk tier.
+
+    The memory tier is an OrderedDict used as an LRU. When ``db_path`` is set,
+    entries are also written to a SQLite table so they survive restarts; disk
+    hits are promoted back into memory. Subclasses name the table, derive the
+    keys and implement ``_encode``/``_decode`` for the disk tier.
+    """
+
+    table = "cache_entries"
+    label = "cache"
+
+    def __init__(self, max_size: int, ttl_seconds: int, db_path: Optional[str] = None):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self._db = None
+        if db_path:
+            self._init_db(db_path)
+
+    def _init_db(self, db_path: str) -> None:
+        """Open the SQLite tier, continuing memory-only if it can't be opened"""
+        try:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} ("
+                "key TEXT PRIMARY KEY, value BLOB NOT NULL, created_at REAL NOT NULL)"
+            )
+            self._db.commit()
+            print(f"{self.label.capitalize()} disk tier: {db_path}")
+        except Exception as e:
+            print(f"Error opening {self.label} database, using memory only: {e}")
+            self._db = None
+
+    @abstractmethod
+    def _encode(self, value: Any) -> Any:
+        """Value as stored in the SQLite tier"""
+
+    @abstractmethod
+    def _decode(self, stored: Any) -> Any:
+        """Value read back from the SQLite tier"""
+
+    def _get(self, key: str) -> Optional[Any]:
+        """Get a cached value, or None on a miss"""
+        value = self._load(key)
+        self._record(value is not None)
+        return value
+
+    def _load(self, key: str) -> Optional[Any]:
+        """Look a key up in memory, then on disk, without counting a hit or miss"""
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, value = entry
+                if now - created_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    return value
+                del self._entries[key]
+
+            value = self._get_from_disk(key, now)
+            if value is not None:
+                self._put_in_memory(key, value, now)
+                self.disk_hits += 1
+            return value
+
+    def _record(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _set(self, key: str, value: Any) -> None:
+        """Store a value in memory and, if enabled, on disk"""
+        now = time.time()
+
+        with self._lock:
+            self._put_in_memory(key, value, now)
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        f"INSERT OR REPLACE INTO {self.table} (key, value, created_at) VALUES (?, ?, ?)",
+                        (key, self._encode(value), now)
+                    )
+                    self._db.commit()
+                except Exception as e:
+                    print(f"Error writing {self.label} entry to disk: {e}")
+
+    def _put_in_memory(self, key: str, value: Any, created_at: float) -> None:
+        self._entries[key] = (created_at, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _get_from_disk(self, key: str, now: float) -> Optional[Any]:
+        if self._db is None:
+            return None
+        try:
+            row = self._db.execute(
+                f"SELECT value, created_at FROM {self.table} WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            stored, created_at = row
+            if now - created_at > self.ttl_seconds:
+                self._db.execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            return self._decode(stored)
+        except Exception as e:
+            print(f"Error reading {self.label} entry from disk: {e}")
+            return None
+
+    def clear(self) -> None:
+        """Drop all entries from both tiers"""
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute(f"DELETE FROM {self.table}")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache counters"""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "evictions": self.evictions,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
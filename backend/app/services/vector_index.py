@@ -0,0 +1,170 @@
+"""
+In-process vector index for the RTI template corpus
+"""
+
+import json
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from app.core.config import settings
+
+# Fields kept per row, matching what the corresponding search RPC returns.
+# Documents keep no text: it is fetched only for those that go in the prompt.
+DOCUMENT_FIELDS = ("id", "title", "rti_category", "rti_department")
+CHUNK_FIELDS = ("id", "document_id", "chunk_index", "content", "token_count", "title", "rti_category", "rti_department")
+
+class VectorIndex:
+    """In-memory cosine similarity index over pdf_documents (or pdf_chunks) embeddings.
+
+    The template corpus is small (a few dozen PDFs), so the whole embedding
+    matrix is kept L2-normalised in memory and a search is a single
+    matrix-vector product. Rows and matrix are swapped together on every
+    update so readers always see a consistent snapshot.
+    """
+
+    def __init__(self, fields: Tuple[str, ...] = DOCUMENT_FIELDS):
+        self.fields = fields
+        self._lock = threading.Lock()
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._rows: List[Dict[str, Any]] = []
+        self.is_loaded = False
+        self.version = 0  # Bumped on every change so dependent caches can invalidate
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    @staticmethod
+    def _parse_embedding(embedding: Any) -> Optional[np.ndarray]:
+        """Convert a stored embedding (list or pgvector text) into a normalised vector"""
+        if embedding is None:
+            return None
+        if isinstance(embedding, str):
+            embedding = json.loads(embedding)
+        vector = np.asarray(embedding, dtype=np.float32)
+        if vector.ndim != 1 or vector.size == 0:
+            return None
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            return None
+        return vector / norm
+
+    def _row_from_document(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        """Keep the same fields the search RPC returns"""
+        return {field: document.get(field) for field in self.fields}
+
+    def load(self, documents: List[Dict[str, Any]]) -> None:
+        """Replace the index contents with the given rows"""
+        rows = []
+        vectors = []
+        for document in documents:
+            vector = self._parse_embedding(document.get("embedding"))
+            if vector is None:
+                print(f"Skipping document without embedding: {document.get('title')}")
+                continue
+            if vectors and vector.shape != vectors[0].shape:
+                print(f"Skipping document with mismatched embedding size: {document.get('title')}")
+                continue
+            rows.append(self._row_from_document(document))
+            vectors.append(vector)
+
+        matrix = np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+        with self._lock:
+            self._matrix = matrix
+            self._rows = rows
+            self.is_loaded = True
+            self.version += 1
+        print(f"Vector index loaded with {len(rows)} rows")
+
+    def add_document(self, document: Dict[str, Any], embedding: List[float]) -> bool:
+        """Add or replace a single document without reloading the whole corpus"""
+        vector = self._parse_embedding(embedding)
+        if vector is None:
+            return False
+
+        with self._lock:
+            if self._matrix.size and vector.shape[0] != self._matrix.shape[1]:
+                print(f"Not indexing document with mismatched embedding size: {document.get('title')}")
+                return False
+
+            row = self._row_from_document(document)
+            rows = [r for r in self._rows if r["id"] != row["id"]]
+            keep = [i for i, r in enumerate(self._rows) if r["id"] != row["id"]]
+            existing = self._matrix[keep] if self._matrix.size else np.zeros((0, vector.shape[0]), dtype=np.float32)
+
+            self._matrix = np.vstack([existing, vector[np.newaxis, :]])
+            self._rows = rows + [row]
+            self.version += 1
+        return True
+
+    def search(self, query_embedding: List[float], threshold: float = None, limit: int = None,
+               where: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """Return documents with cosine similarity above threshold, best first.
+
+        Mirrors the search_pdf_documents_slim RPC: strict ``similarity > threshold``,
+        ordered by similarity and capped at ``limit`` rows. ``where`` keeps only
+        rows whose fields equal the given values, e.g. ``{"rti_category": "passport"}``.
+        """
+        threshold = settings.RAG_SIMILARITY_THRESHOLD if threshold is None else threshold
+        limit = settings.RAG_MAX_RESULTS if limit is None else limit
+
+        matrix, rows = self._matrix, self._rows
+        query = self._parse_embedding(query_embedding)
+        if query is None or not rows or query.shape[0] != matrix.shape[1] or limit <= 0:
+            return []
+
+        similarities = matrix @ query
+        if where:
+            keep = np.array([all(row.get(field) == value for field, value in where.items()) for row in rows])
+            similarities = np.where(keep, similarities, -np.inf)
+        candidates = np.flatnonzero(similarities > threshold)
+        if candidates.size > limit:
+            top = np.argpartition(-similarities[candidates], limit - 1)[:limit]
+            candidates = candidates[top]
+        order = candidates[np.argsort(-similarities[candidates], kind="stable")]
+
+        return [
+            {**rows[i], "similarity": float(similarities[i])}
+            for i in order
+        ]
+
+    def rows_by_id(self, ids: List[Any]) -> List[Dict[str, Any]]:
+        """Rows with the given ids, in the given order; unknown ids are left out"""
+        by_id = {row["id"]: row for row in self._rows}
+        return [dict(by_id[row_id]) for row_id in ids if row_id in by_id]
+
+    def centroids(self, field: str) -> Tuple[List[Any], np.ndarray]:
+        """Normalised mean embedding of the rows sharing each value of ``field``"""
+        matrix, rows = self._matrix, self._rows
+        groups: Dict[Any, List[int]] = {}
+        for i, row in enumerate(rows):
+            if row.get(field):
+                groups.setdefault(row[field], []).append(i)
+        if not groups:
+            return [], np.zeros((0, 0), dtype=np.float32)
+
+        labels = list(groups)
+        means = np.vstack([matrix[groups[label]].mean(axis=0) for label in labels])
+        norms = np.linalg.norm(means, axis=1, keepdims=True)
+        return labels, means / np.where(norms == 0, 1, norms)
+
+    def remove_where(self, field: str, value: Any) -> None:
+        """Drop all rows whose ``field`` equals ``value``"""
+        with self._lock:
+            keep = [i for i, r in enumerate(self._rows) if r.get(field) != value]
+            if len(keep) == len(self._rows):
+                return
+            self._rows = [self._rows[i] for i in keep]
+            self._matrix = self._matrix[keep] if keep else np.zeros((0, self._matrix.shape[1]), dtype=np.float32)
+            self.version += 1
+
+# Global index instances
+vector_index = VectorIndex(DOCUMENT_FIELDS)
+chunk_index = VectorIndex(CHUNK_FIELDS)
+
+def get_vector_index() -> VectorIndex:
+    """Get vector index instance"""
+    return vector_index
+
+def get_chunk_index() -> VectorIndex:
+    """Get chunk vector index instance"""
+    return chunk_index
@@ -0,0 +1,47 @@
+"""
+Shared test setup: settings that need no real services, and no network for the tokenizer
+"""
+
+import os
+import tempfile
+
+# Settings are read at import, so these must be in place before any app module loads.
+# The Supabase keys only need the shape of a JWT; nothing is ever sent to SUPABASE_URL.
+FAKE_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.signature"
+for name, value in {
+    "SUPABASE_URL": "http://localhost:54321",
+    "SUPABASE_ANON_KEY": FAKE_KEY,
+    "SUPABASE_SERVICE_ROLE_KEY": FAKE_KEY,
+    "OPENAI_API_KEY": "sk-test",
+    "DATABASE_URL": "postgresql://test@localhost/test",
+    "SECRET_KEY": "test-secret",
+    "RAZORPAY_KEY_ID": "rzp_test",
+    "RAZORPAY_KEY_SECRET": "rzp_secret",
+    "SMTP_USERNAME": "test@example.com",
+    "SMTP_PASSWORD": "test",
+    "ADMIN_EMAIL": "admin@example.com",
+    "BLOB_STORAGE_BACKEND": "local",
+    "BLOB_STORAGE_LOCAL_PATH": os.path.join(tempfile.mkdtemp(), "blobs"),
+}.items():
+    os.environ.setdefault(name, value)
+
+import tiktoken
+
+_get_encoding = tiktoken.get_encoding
+
+class _WhitespaceEncoding:
+    """Stands in for cl100k_base when its BPE file can't be downloaded"""
+
+    def encode(self, text):
+        return text.split()
+
+    def decode(self, tokens):
+        return " ".join(tokens)
+
+def _get_encoding_offline(name):
+    try:
+        return _get_encoding(name)
+    except Exception:
+        return _WhitespaceEncoding()
+
+tiktoken.get_encoding = _get_encoding_offline
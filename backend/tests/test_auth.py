@@ -0,0 +1,102 @@
+"""
+TokenVerifier: algorithms are pinned by the key, never taken from the token header
+"""
+
+import asyncio
+import base64
+import hashlib
+import hmac
+import json
+import time
+
+import pytest
+from cryptography.hazmat.primitives.asymmetric import ec
+from fastapi import HTTPException
+from jose import jwk, jwt
+
+from app.core import auth
+from app.core.config import settings
+
+SECRET = "jwt-secret"
+
+def _claims(**overrides):
+    return {"sub": "user-1", "aud": "authenticated", "exp": int(time.time()) + 300, **overrides}
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _hmac_token(claims, key: bytes, algorithm: str, kid: str) -> str:
+    """Sign by hand: jose refuses to use a public key as an HMAC secret, an attacker doesn't"""
+    header = _b64(json.dumps({"alg": algorithm, "typ": "JWT", "kid": kid}).encode())
+    payload = _b64(json.dumps(claims).encode())
+    digest = {"HS256": hashlib.sha256, "HS384": hashlib.sha384}[algorithm]
+    signature = hmac.new(key, f"{header}.{payload}".encode(), digest).digest()
+    return f"{header}.{payload}.{_b64(signature)}"
+
+def _verify(verifier, token):
+    return asyncio.run(verifier.verify(token))
+
+@pytest.fixture
+def verifier(monkeypatch):
+    monkeypatch.setattr(settings, "SUPABASE_JWT_SECRET", SECRET)
+    monkeypatch.setattr(settings, "SUPABASE_JWT_AUDIENCE", "authenticated")
+    verifier = auth.TokenVerifier()
+
+    def remote(token):
+        raise HTTPException(status_code=401, detail="rejected by Supabase Auth")
+
+    verifier._get_user_remotely = remote
+    return verifier
+
+@pytest.fixture
+def ec_key():
+    private_key = ec.generate_private_key(ec.SECP256R1())
+    public_jwk = jwk.construct(private_key.public_key(), "ES256").to_dict()
+    return private_key, {**public_jwk, "kid": "ec-1", "alg": "ES256"}
+
+def _use_jwks(verifier, *keys):
+    verifier._jwks = {key["kid"]: key for key in keys}
+    verifier._jwks_fetched_at = time.time()
+
+def test_hs256_token_signed_with_secret_is_accepted(verifier):
+    token = jwt.encode(_claims(), SECRET, algorithm="HS256")
+    assert _verify(verifier, token) == "user-1"
+
+def test_other_hmac_algorithm_is_not_decoded_with_secret(verifier):
+    token = jwt.encode(_claims(), SECRET, algorithm="HS512")
+    with pytest.raises(HTTPException) as error:
+        _verify(verifier, token)
+    assert error.value.status_code == 401
+
+def test_es256_token_is_accepted_with_matching_jwk(verifier, ec_key):
+    private_key, public_jwk = ec_key
+    _use_jwks(verifier, public_jwk)
+    token = jwt.encode(_claims(), private_key, algorithm="ES256", headers={"kid": "ec-1"})
+    assert _verify(verifier, token) == "user-1"
+
+@pytest.mark.parametrize("algorithm", ["HS256", "HS384"])
+def test_forged_alg_for_jwks_key_is_rejected(verifier, ec_key, algorithm):
+    _, public_jwk = ec_key
+    _use_jwks(verifier, public_jwk)
+    # Signed with HMAC over the public key, naming the JWKS key in the header
+    public_key = jwk.construct(public_jwk, "ES256").to_pem()
+    token = _hmac_token(_claims(), public_key, algorithm, "ec-1")
+    with pytest.raises(HTTPException) as error:
+        _verify(verifier, token)
+    assert error.value.status_code == 401
+
+def test_jwks_key_outside_allowlist_is_rejected(verifier):
+    _use_jwks(verifier, {"kid": "oct-1", "kty": "oct", "k": "c2VjcmV0", "alg": "HS512"})
+    token = jwt.encode(_claims(), "secret", algorithm="HS512", headers={"kid": "oct-1"})
+    with pytest.raises(HTTPException) as error:
+        _verify(verifier, token)
+    assert "does not match signing key" in error.value.detail
+
+def test_test_token_is_rejected_by_strict_dependency(monkeypatch):
+    async def verify(token):
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+    monkeypatch.setattr(auth.token_verifier, "verify", verify)
+    credentials = auth.HTTPAuthorizationCredentials(scheme="Bearer", credentials=auth.TEST_TOKEN)
+    with pytest.raises(HTTPException):
+        asyncio.run(auth.get_current_user_id(credentials))
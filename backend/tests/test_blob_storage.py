@@ -0,0 +1,59 @@
+"""
+SupabaseBlobStorage only uploads bytes the bucket doesn't already have
+"""
+
+import asyncio
+
+import pytest
+from storage3.utils import StorageException
+
+from app.services.blob_storage import SupabaseBlobStorage
+
+DATA = b"%PDF-1.4 attachment"
+
+class FakeBucket:
+    def __init__(self, stored=(), upload_error=None):
+        self.stored = set(stored)
+        self.upload_error = upload_error
+        self.uploads = []
+
+    def list(self, folder, options):
+        return [{"name": key.rsplit("/", 1)[1]} for key in self.stored if key.startswith(folder + "/")]
+
+    def upload(self, key, source, options):
+        self.uploads.append((key, options))
+        if self.upload_error:
+            raise self.upload_error
+        self.stored.add(key)
+
+class FakeClient:
+    def __init__(self, bucket):
+        self.storage = self
+        self.bucket = bucket
+
+    def from_(self, name):
+        return self.bucket
+
+def storage_with(bucket):
+    storage = SupabaseBlobStorage("uploads")
+    storage._client = FakeClient(bucket)
+    return storage
+
+def test_new_blob_is_uploaded_without_upsert():
+    bucket = FakeBucket()
+    key = asyncio.run(storage_with(bucket).put(DATA, "application/pdf"))
+    assert bucket.uploads == [(key, {"content-type": "application/pdf"})]
+
+def test_existing_blob_is_not_uploaded_again():
+    bucket = FakeBucket(stored={SupabaseBlobStorage.key_for(DATA)})
+    asyncio.run(storage_with(bucket).put(DATA))
+    assert bucket.uploads == []
+
+def test_duplicate_from_a_concurrent_upload_is_ignored():
+    bucket = FakeBucket(upload_error=StorageException({"error": "Duplicate", "statusCode": 400}))
+    assert asyncio.run(storage_with(bucket).put(DATA)) == SupabaseBlobStorage.key_for(DATA)
+
+def test_other_upload_errors_propagate():
+    bucket = FakeBucket(upload_error=StorageException({"error": "Unauthorized", "statusCode": 403}))
+    with pytest.raises(StorageException):
+        asyncio.run(storage_with(bucket).put(DATA))
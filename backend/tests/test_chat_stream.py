@@ -0,0 +1,95 @@
+"""
+The streaming chat turn only caches answers the model finished, and flags cut-off ones
+"""
+
+import asyncio
+
+import pytest
+
+from app.api.v1.endpoints import chat
+
+class FakeRequest:
+    conversation_id = "conversation-1"
+
+class FakeRAGService:
+    def __init__(self, deltas, finish_reason=None, error=None):
+        self.deltas = deltas
+        self.finish_reason = finish_reason
+        self.error = error
+
+    async def stream_enhanced_response(self, user_message, conversation_history=None, context_parts=None,
+                                       completion_info=None):
+        for delta in self.deltas:
+            yield delta
+        if self.error:
+            raise self.error
+        if self.finish_reason:
+            completion_info["finish_reason"] = self.finish_reason
+
+class FakeResponseCache:
+    def __init__(self):
+        self.stored = []
+
+    def get(self, query_embedding):
+        return None
+
+    def set(self, query_embedding, query, answer):
+        self.stored.append(answer)
+
+@pytest.fixture
+def stream(monkeypatch):
+    cache, saved = FakeResponseCache(), {}
+
+    async def save_bot_message(turn, ai_response, incomplete=False):
+        saved.update(content=ai_response, incomplete=incomplete)
+        return "message-1"
+
+    async def no_suggestions(turn):
+        return None
+
+    monkeypatch.setattr(chat, "get_response_cache", lambda: cache)
+    monkeypatch.setattr(chat, "_save_bot_message", save_bot_message)
+    monkeypatch.setattr(chat, "_get_suggestions", no_suggestions)
+
+    def run(rag_service):
+        monkeypatch.setattr(chat, "get_rag_service", lambda: rag_service)
+
+        async def collect():
+            async def resolved(value):
+                return value
+            turn = {
+                "chat_request": FakeRequest(),
+                "is_rti_related": True,
+                "use_response_cache": True,
+                "user_content": "What is the RTI fee?",
+                "conversation_history": [],
+                "embedding_task": asyncio.ensure_future(resolved([1.0, 0.0])),
+                "context_task": asyncio.ensure_future(resolved(None)),
+            }
+            return [event async for event in chat._stream_chat_turn(turn)]
+
+        events = [event.split("\n", 1)[0][len("event: "):] for event in asyncio.run(collect())]
+        return events, cache.stored, saved
+
+    return run
+
+def test_finished_answer_is_cached(stream):
+    events, cached, saved = stream(FakeRAGService(["Rs. ", "10"], finish_reason="stop"))
+    assert events == ["start", "delta", "delta", "done"]
+    assert cached == ["Rs. 10"]
+    assert saved == {"content": "Rs. 10", "incomplete": False}
+
+def test_truncated_answer_is_not_cached(stream):
+    events, cached, saved = stream(FakeRAGService(["Rs. "], finish_reason="length"))
+    assert events == ["start", "delta", "done"]
+    assert cached == []
+
+def test_answer_without_finish_reason_is_not_cached(stream):
+    _, cached, _ = stream(FakeRAGService(["I apologize, but something went wrong"]))
+    assert cached == []
+
+def test_mid_stream_failure_sends_error_and_marks_message(stream):
+    events, cached, saved = stream(FakeRAGService(["Rs. "], error=ConnectionError("reset")))
+    assert events == ["start", "delta", "error", "done"]
+    assert cached == []
+    assert saved == {"content": "Rs. ", "incomplete": True}
@@ -0,0 +1,38 @@
+"""
+ExtractionCache keeps every variant of a file under the file's content hash
+"""
+
+from app.services.extraction_cache import ExtractionCache
+
+CONTENT_HASH = ExtractionCache.content_hash(b"%PDF-1.4 same bytes")
+
+def result(text):
+    return {"text": text, "token_count": 2, "truncated": False, "page_count": 1, "first_page": 1, "last_page": 1}
+
+def test_variants_share_one_entry():
+    cache = ExtractionCache()
+    cache.set(CONTENT_HASH, ".pdf:50:0:1-:v4", result("full text"))
+    cache.set(CONTENT_HASH, ".pdf:50:6000:1-:v4", result("budgeted text"))
+
+    assert cache.get(CONTENT_HASH, ".pdf:50:0:1-:v4")["text"] == "full text"
+    assert cache.get(CONTENT_HASH, ".pdf:50:6000:1-:v4")["text"] == "budgeted text"
+    assert cache.get(CONTENT_HASH, ".pdf:50:0:2-3:v4") is None
+    assert cache.stats()["size"] == 1
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (2, 1)
+
+def test_oldest_variant_is_dropped(monkeypatch):
+    monkeypatch.setattr(ExtractionCache, "MAX_VARIANTS", 2)
+    cache = ExtractionCache()
+    for page in range(1, 4):
+        cache.set(CONTENT_HASH, f".pdf:50:0:{page}-{page}:v4", result(f"page {page}"))
+
+    assert cache.get(CONTENT_HASH, ".pdf:50:0:1-1:v4") is None
+    assert cache.get(CONTENT_HASH, ".pdf:50:0:3-3:v4")["text"] == "page 3"
+
+def test_disk_tier_round_trip(tmp_path):
+    db_path = str(tmp_path / "extraction.sqlite3")
+    ExtractionCache(db_path=db_path).set(CONTENT_HASH, ".pdf:50:0:1-:v4", result("full text"))
+
+    cache = ExtractionCache(db_path=db_path)
+    assert cache.get(CONTENT_HASH, ".pdf:50:0:1-:v4")["text"] == "full text"
+    assert cache.stats()["disk_hits"] == 1
@@ -0,0 +1,144 @@
+"""
+Blob downloads only serve keys that belong to a PDF document, or that the caller uploaded or attached
+"""
+
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+
+from app.core import auth
+from app.main import app
+from app.services.blob_storage import LocalBlobStorage
+from app.api.v1.endpoints import files, rti_applications
+
+USERS = {"token-alice": "alice", "token-bob": "bob"}
+
+class FakeDatabase:
+    """Which blob keys each user may read"""
+
+    def __init__(self, pdf_keys=(), application_keys=None):
+        self.pdf_keys = set(pdf_keys)
+        self.application_keys = application_keys or {}
+        self.uploads = {}
+
+    async def record_file_upload(self, user_id, file_key, file_name, content_type, file_size):
+        self.uploads[(user_id, file_key)] = {"file_key": file_key, "file_name": file_name, "file_size": file_size}
+        return self.uploads[(user_id, file_key)]
+
+    async def get_file_upload(self, user_id, file_key):
+        return self.uploads.get((user_id, file_key))
+
+    async def can_access_blob(self, user_id, key):
+        return key in self.pdf_keys or key in self.application_keys.get(user_id, set()) \
+            or (user_id, key) in self.uploads
+
+@pytest.fixture
+def storage(tmp_path, monkeypatch):
+    storage = LocalBlobStorage(str(tmp_path))
+    monkeypatch.setattr(files, "get_blob_storage", lambda: storage)
+    return storage
+
+@pytest.fixture
+def client(monkeypatch):
+    async def verify(token):
+        if token not in USERS:
+            raise HTTPException(status_code=401, detail="Invalid token")
+        return USERS[token]
+
+    monkeypatch.setattr(auth.token_verifier, "verify", verify)
+    return TestClient(app)
+
+def _get(client, key, token):
+    return client.get(f"/api/v1/files/{key}", headers={"Authorization": f"Bearer {token}"})
+
+def test_owner_can_download_application_attachment(client, storage, monkeypatch):
+    key = asyncio.run(storage.put(b"alice's attachment"))
+    monkeypatch.setattr(files, "get_supabase_client", lambda: FakeDatabase(application_keys={"alice": {key}}))
+    response = _get(client, key, "token-alice")
+    assert response.status_code == 200
+    assert response.content == b"alice's attachment"
+
+def test_other_users_attachment_is_not_found(client, storage, monkeypatch):
+    key = asyncio.run(storage.put(b"alice's attachment"))
+    monkeypatch.setattr(files, "get_supabase_client", lambda: FakeDatabase(application_keys={"alice": {key}}))
+    assert _get(client, key, "token-bob").status_code == 404
+
+def test_unreferenced_blob_is_not_found(client, storage, monkeypatch):
+    key = asyncio.run(storage.put(b"uploaded but never attached"))
+    monkeypatch.setattr(files, "get_supabase_client", lambda: FakeDatabase())
+    assert _get(client, key, "token-alice").status_code == 404
+
+def _upload(client, token, content=b"my upload"):
+    return client.post(
+        "/api/v1/files",
+        files={"file": ("note.txt", content)},
+        headers={"Authorization": f"Bearer {token}"}
+    )
+
+def test_upload_is_downloadable_by_its_uploader_only(client, storage, monkeypatch):
+    database = FakeDatabase()
+    monkeypatch.setattr(files, "get_supabase_client", lambda: database)
+    response = _upload(client, "token-alice")
+    assert response.status_code == 200
+    key = response.json()["data"]["key"]
+    assert _get(client, key, "token-alice").content == b"my upload"
+    assert _get(client, key, "token-bob").status_code == 404
+
+def test_upload_fails_if_ownership_is_not_recorded(client, storage, monkeypatch):
+    class NoRecords(FakeDatabase):
+        async def record_file_upload(self, *args):
+            return None
+
+    monkeypatch.setattr(files, "get_supabase_client", lambda: NoRecords())
+    assert _upload(client, "token-alice").status_code == 500
+
+def test_payment_attaches_only_the_users_own_upload(monkeypatch):
+    database = FakeDatabase()
+    key = "sha256/ab/" + "ab" * 32
+    asyncio.run(database.record_file_upload("alice", key, "note.txt", "text/plain", 9))
+    monkeypatch.setattr(rti_applications, "get_supabase_client", lambda: database)
+
+    attachment = asyncio.run(rti_applications._uploaded_attachment("alice", key))
+    assert attachment == {"attached_file_name": "note.txt", "attached_file_key": key, "attached_file_size": 9}
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(rti_applications._uploaded_attachment("bob", key))
+    assert error.value.status_code == 404
+
+def test_pdf_document_blob_is_readable_by_any_user(client, storage, monkeypatch):
+    key = asyncio.run(storage.put(b"%PDF template"))
+    monkeypatch.setattr(files, "get_supabase_client", lambda: FakeDatabase(pdf_keys={key}))
+    assert _get(client, key, "token-bob").status_code == 200
+
+def test_test_token_cannot_download_or_upload(client, storage, monkeypatch):
+    key = asyncio.run(storage.put(b"%PDF template"))
+    monkeypatch.setattr(files, "get_supabase_client", lambda: FakeDatabase(pdf_keys={key}))
+    assert _get(client, key, auth.TEST_TOKEN).status_code == 401
+    assert _upload(client, auth.TEST_TOKEN, b"anonymous upload").status_code == 401
+
+class FakeRazorpay:
+    def __init__(self, notes):
+        self.order = self
+        self.notes = notes
+
+    def fetch(self, order_id):
+        return {"id": order_id, "notes": self.notes}
+
+def test_verify_payment_accepts_attachment_recorded_on_order():
+    razorpay = FakeRazorpay({"user_id": "alice", "attached_file_key": "sha256/ab/" + "ab" * 32})
+    rti_applications._check_attachment_key(
+        razorpay, "order_1", "alice", {"attached_file_key": "sha256/ab/" + "ab" * 32}
+    )
+
+@pytest.mark.parametrize("notes", [
+    {"user_id": "alice", "attached_file_key": "sha256/cd/" + "cd" * 32},
+    {"user_id": "bob", "attached_file_key": "sha256/ab/" + "ab" * 32},
+    {},
+])
+def test_verify_payment_rejects_attachment_from_elsewhere(notes):
+    with pytest.raises(HTTPException) as error:
+        rti_applications._check_attachment_key(
+            FakeRazorpay(notes), "order_1", "alice", {"attached_file_key": "sha256/ab/" + "ab" * 32}
+        )
+    assert error.value.status_code == 400
@@ -0,0 +1,27 @@
+"""
+Page ranges are clamped to the PDF, and a range starting past the end reads nothing
+"""
+
+import io
+
+import PyPDF2
+
+from app.services.text_extraction import extract_pdf_document
+
+def blank_pdf(page_count):
+    writer = PyPDF2.PdfWriter()
+    for _ in range(page_count):
+        writer.add_blank_page(width=612, height=792)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+def test_range_past_the_end_is_clamped():
+    result = extract_pdf_document(blank_pdf(5), page_range=(3, 99))
+    assert (result["first_page"], result["last_page"], result["page_count"]) == (3, 5, 5)
+
+def test_range_starting_past_the_end_reads_nothing():
+    result = extract_pdf_document(blank_pdf(5), page_range=(10, None))
+    assert result["text"] == ""
+    assert result["page_count"] == 5
+    assert result["first_page"] is None and result["last_page"] is None
@@ -0,0 +1,49 @@
+"""
+ResponseCache drops its entries when the template corpus or the system prompt changes
+"""
+
+import pytest
+
+from app.services import response_cache as response_cache_module
+from app.services.openai_client import get_async_openai_client
+from app.services.response_cache import ResponseCache
+
+QUERY = [1.0, 0.0, 0.0]
+
+class FakeIndex:
+    def __init__(self):
+        self.version = 1
+
+@pytest.fixture
+def indexes(monkeypatch):
+    documents, chunks = FakeIndex(), FakeIndex()
+    monkeypatch.setattr(response_cache_module, "get_vector_index", lambda: documents)
+    monkeypatch.setattr(response_cache_module, "get_chunk_index", lambda: chunks)
+    return documents, chunks
+
+@pytest.fixture
+def cache(indexes):
+    cache = ResponseCache(threshold=0.9)
+    cache.set(QUERY, "What is the RTI fee?", "Rs. 10")
+    return cache
+
+def test_similar_question_hits(cache):
+    assert cache.get([0.99, 0.05, 0.0]) == "Rs. 10"
+
+def test_index_version_change_invalidates(cache, indexes):
+    documents, _ = indexes
+    documents.version += 1
+    assert cache.get(QUERY) is None
+    assert cache.invalidations == 1
+
+def test_system_prompt_change_invalidates(cache, monkeypatch):
+    client = get_async_openai_client()
+    original = client._get_system_message
+    monkeypatch.setattr(client, "_get_system_message", lambda context=None: original(context) + "\nNew rule.")
+    assert cache.get(QUERY) is None
+    assert cache.invalidations == 1
+
+def test_unchanged_version_keeps_entries(cache):
+    for _ in range(3):
+        assert cache.get(QUERY) == "Rs. 10"
+    assert cache.invalidations == 0
@@ -0,0 +1,100 @@
+"""
+The extraction pool is shared and long-lived; a file that times out fails alone
+"""
+
+import asyncio
+import multiprocessing
+import signal
+import time
+
+import pytest
+
+from app.services import text_extraction
+
+pytestmark = pytest.mark.skipif(
+    multiprocessing.get_start_method() != "fork" or not hasattr(signal, "setitimer"),
+    reason="workers only see the patched extract_document when forked, and need SIGALRM"
+)
+
+def slow_extract(file_content, file_extension, *args):
+    if file_content == b"hang":
+        time.sleep(60)
+    if file_content == b"stuck":
+        # Like a parser stuck in C code: the worker's own deadline can't interrupt it
+        signal.pthread_sigmask(signal.SIG_BLOCK, {signal.SIGALRM})
+        time.sleep(3)
+    time.sleep(0.2)
+    return {"text": file_content.decode(), "token_count": 1}
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(text_extraction, "extract_document", slow_extract)
+    monkeypatch.setattr(text_extraction, "DEADLINE_GRACE_SECONDS", 0.5)
+    service = text_extraction.TextExtractionService()
+    service.max_workers = 3
+    service.timeout_seconds = 1.0
+    monkeypatch.setattr(service.cache, "get", lambda *args: None)
+    monkeypatch.setattr(service.cache, "set", lambda *args: None)
+    yield service
+    service.shutdown()
+
+def test_timeout_does_not_break_concurrent_jobs(service):
+    async def run():
+        return await asyncio.gather(
+            service.extract(b"hang", ".txt"),
+            service.extract(b"first", ".txt"),
+            service.extract(b"second", ".txt"),
+            service.extract(b"third", ".txt"),
+            return_exceptions=True
+        )
+
+    started = time.perf_counter()
+    results = asyncio.run(run())
+    assert "timed out" in str(results[0])
+    assert results[1:] == ["first", "second", "third"]
+    assert time.perf_counter() - started < 5
+    assert service.stats()["timeouts"] == 1
+    assert service.stats()["completed"] == 3
+
+def test_pool_is_reused_after_a_timeout(service):
+    async def run():
+        assert await service.extract(b"before", ".txt") == "before"
+        pool = service._pool
+        with pytest.raises(Exception, match="timed out"):
+            await service.extract(b"hang", ".txt")
+        assert await service.extract(b"after", ".txt") == "after"
+        return pool
+
+    assert asyncio.run(run()) is service._pool
+    assert service.stats()["pool_replacements"] == 0
+
+def test_stuck_worker_replaces_the_pool(service):
+    async def run():
+        results = await asyncio.gather(
+            service.extract(b"stuck", ".txt"),
+            service.extract(b"neighbour", ".txt"),
+            return_exceptions=True
+        )
+        pool = service._pool
+        return results, await service.extract(b"after", ".txt"), pool
+
+    results, after, pool = asyncio.run(run())
+    assert "timed out" in str(results[0])
+    assert results[1] == "neighbour"
+    assert after == "after"
+    assert pool is None and service._pool is not None
+    assert service.stats()["pool_replacements"] == 1
+
+def test_queue_limit_rejects_extra_files(service):
+    service.max_workers = 1
+    service.max_queue = 1
+
+    async def run():
+        return await asyncio.gather(
+            *(service.extract(f"file {i}".encode(), ".txt") for i in range(3)),
+            return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert sum(isinstance(result, Exception) for result in results) == 1
+    assert service.stats()["rejected"] == 1
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+Benchmark template retrieval: vector-only against hybrid (BM25 + vector, reciprocal-rank fusion)
+Run from the backend directory: python ../benchmark_hybrid_retrieval.py [--rpc] [rounds]
+Needs the Supabase and OpenAI settings from backend/.env; --rpc also times the database functions
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+# Add the backend directory to Python path
+sys.path.append('.')
+
+from app.core.config import settings
+from app.services.openai_client import get_async_openai_client
+from app.services.supabase_client import get_supabase_client
+from app.services.rag_service import get_rag_service
+
+# (query, case-insensitive part of the expected template title), many hinging on proper nouns
+QUERIES = [
+    ("Dharani portal land mutation pending in Telangana", "dharani"),
+    ("Meebhoomi adangal record correction", "meebhoomi"),
+    ("Khasra Pahani copy for my survey number", "khasra pahani"),
+    ("IRCTC ticket refund not received", "irctc"),
+    ("EPF withdrawal claim status", "epf"),
+    ("My passport application is delayed", "passport"),
+    ("Income tax refund not credited", "income tax"),
+    ("Copy of FIR filed at police station", "fir copy"),
+    ("Encumbrance certificate for my property", "encumbrance"),
+    ("Toll plaza collection on the highway", "toll"),
+    ("Street lights not working in our colony", "street lights"),
+    ("MP MLA LAD fund utilisation in my constituency", "mp mla"),
+    ("Gram panchayat expenditure inquiry", "gram panchayat"),
+    ("Marksheet verification from the university", "marksheet"),
+    ("Track my pension application", "pension"),
+    ("Certified copy of sale deed from sub registrar", "sale deed"),
+    ("RTA driving licence pending", "rta"),
+    ("Details of road work contract in my ward", "road work"),
+    ("First appeal because the PIO did not reply", "first appeal"),
+    ("Second appeal to the information commission", "second appeal"),
+    ("Mutation of agricultural land records", "mutation"),
+    ("Municipality garbage collection complaint", "municipality"),
+    ("Land survey measurement records", "land survey"),
+    ("Registration fee refund", "registration refund"),
+    ("Status of the complaint I filed with the department", "complaint tracking"),
+]
+
+def first_hit(results, expected: str):
+    """1-based rank of the first result whose title contains ``expected``, or None"""
+    for rank, result in enumerate(results, 1):
+        if expected in (result.get("title") or "").lower():
+            return rank
+    return None
+
+def report(name: str, ranks, timings) -> None:
+    found = [rank for rank in ranks if rank]
+    hit1 = sum(1 for rank in found if rank == 1) / len(ranks)
+    hit5 = sum(1 for rank in found if rank <= 5) / len(ranks)
+    mrr = sum(1 / rank for rank in found) / len(ranks)
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    print(f"{name:<22} hit@1 {hit1:6.1%}  hit@5 {hit5:6.1%}  MRR {mrr:.3f}  "
+          f"mean {statistics.mean(timings):8.3f} ms  p95 {p95:8.3f} ms")
+
+async def run(name: str, search, embeddings, rounds: int, misses: bool = True) -> None:
+    ranks, timings = [], []
+    for (query, expected), embedding in zip(QUERIES, embeddings):
+        for _ in range(rounds):
+            started = time.perf_counter()
+            results = await search(query, embedding)
+            timings.append((time.perf_counter() - started) * 1000)
+        rank = first_hit(results, expected)
+        ranks.append(rank)
+        if misses and rank != 1:
+            top = results[0]["title"] if results else "-"
+            print(f"  {name}: '{query}' -> {top} (expected rank {rank or 'none'})")
+    report(name, ranks, timings)
+
+async def main():
+    use_rpc = "--rpc" in sys.argv
+    numbers = [arg for arg in sys.argv[1:] if arg.isdigit()]
+    rounds = int(numbers[0]) if numbers else 20
+
+    rag = get_rag_service()
+    supabase = get_supabase_client()
+    openai_client = get_async_openai_client()
+
+    print("🔍 Loading template indexes...")
+    settings.RAG_USE_LOCAL_INDEX = True
+    settings.RAG_HYBRID_SEARCH = True
+    await rag.load_vector_index()
+    if not len(rag.vector_index):
+        print("❌ No templates with embeddings found")
+        return
+
+    # Embedding time is the same for every retriever, so it is left out
+    embeddings = await openai_client.get_embeddings([query for query, _ in QUERIES])
+    limit = settings.RAG_MAX_RESULTS
+    print(f"📊 {len(rag.vector_index)} templates, {len(QUERIES)} queries, {rounds} rounds, top {limit}")
+    print("=" * 60)
+
+    async def local_vector(query, embedding):
+        return rag.vector_index.search(embedding, threshold=settings.RAG_SIMILARITY_THRESHOLD, limit=limit)
+
+    async def local_hybrid(query, embedding):
+        return rag._hybrid_search(rag.vector_index, rag.lexical_index, embedding, query, limit)
+
+    await run("local vector", local_vector, embeddings, rounds)
+    await run("local hybrid (RRF)", local_hybrid, embeddings, rounds)
+
+    if use_rpc:
+        async def rpc_vector(query, embedding):
+            return await supabase.search_pdf_documents_slim(embedding, settings.RAG_SIMILARITY_THRESHOLD, limit)
+
+        async def rpc_hybrid(query, embedding):
+            return await supabase.hybrid_search_pdf_documents(query, embedding, settings.RAG_SIMILARITY_THRESHOLD, limit)
+
+        rpc_rounds = max(1, rounds // 10)
+        await run("rpc vector", rpc_vector, embeddings, rpc_rounds)
+        await run("rpc hybrid (RRF)", rpc_hybrid, embeddings, rpc_rounds)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark for extracted-text normalization on the bundled RTI template PDFs
+Run from the backend directory: python ../benchmark_text_normalization.py [pdf_dir] [rounds]
+"""
+
+import glob
+import os
+import sys
+import time
+
+# Add the backend directory to Python path
+sys.path.append('.')
+
+import PyPDF2
+from app.services.text_normalization import normalize_pdf_text, PDF_CHARACTER_REPLACEMENTS, PDF_LOOKALIKE_REPLACEMENTS
+
+# The per-page cleanup extract_pdf_text used to do: a 52-entry dict whose keys
+# were all the same character, applied with one str.replace per entry
+LEGACY_REPLACEMENTS = [('Ɵ', c) for c in "toaeiunsrlcdfghjkmpqvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ"]
+
+def legacy_normalize(text: str) -> str:
+    char_replacements = dict(LEGACY_REPLACEMENTS)
+    for old_char, new_char in char_replacements.items():
+        text = text.replace(old_char, new_char)
+    return ' '.join(text.split())
+
+TRANSLATE_TABLE = str.maketrans({**PDF_CHARACTER_REPLACEMENTS, **PDF_LOOKALIKE_REPLACEMENTS})
+
+def translate_normalize(text: str) -> str:
+    return ' '.join(text.translate(TRANSLATE_TABLE).split())
+
+def load_pages(pdf_dir: str):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(pdf_dir, "*.pdf"))):
+        try:
+            reader = PyPDF2.PdfReader(path)
+            pages.extend(page.extract_text() or "" for page in reader.pages)
+        except Exception as e:
+            print(f"⚠️  Skipping {os.path.basename(path)}: {e}")
+    return pages
+
+def time_per_page(normalize, pages, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for page in pages:
+            normalize(page)
+    return (time.perf_counter() - started) / (rounds * len(pages)) * 1e6
+
+def leftover_artefacts(normalize, pages) -> int:
+    return sum(normalize(page).count(char) for page in pages for char in {**PDF_CHARACTER_REPLACEMENTS, **PDF_LOOKALIKE_REPLACEMENTS})
+
+def main():
+    pdf_dir = sys.argv[1] if len(sys.argv) > 1 else ".."
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+    print(f"📄 Extracting pages from {os.path.abspath(pdf_dir)}...")
+    pages = load_pages(pdf_dir)
+    if not pages:
+        print("❌ No PDFs found")
+        return
+    print(f"📊 {len(pages)} pages, {sum(len(page) for page in pages)} characters, {rounds} rounds")
+    print("=" * 60)
+
+    candidates = (
+        ("legacy str.replace loop", legacy_normalize),
+        ("str.translate table", translate_normalize),
+        ("normalize_pdf_text", normalize_pdf_text),
+    )
+    for name, normalize in candidates:
+        per_page = time_per_page(normalize, pages, rounds)
+        print(f"{name:<24} {per_page:8.1f} µs/page   artefacts left: {leftover_artefacts(normalize, pages)}")
+
+    sample = next((page for page in pages if "Ɵ" in page), pages[0])[:160]
+    print("=" * 60)
+    print(f"legacy:         {legacy_normalize(sample)}")
+    print(f"normalize_pdf_text: {normalize_pdf_text(sample)}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Benchmark pgvector indexes for template search: recall@k and latency on a synthetic corpus
+Run from the backend directory: python ../benchmark_vector_index.py [options]
+Needs a local Postgres with pgvector 0.5.0 or later (DATABASE_URL from backend/.env, or --dsn).
+The corpus goes into its own table (benchmark_template_vectors); pdf_documents is not touched.
+"""
+
+import argparse
+import asyncio
+import statistics
+import struct
+import sys
+import time
+
+import numpy as np
+import asyncpg
+
+# Add the backend directory to Python path
+sys.path.append('.')
+
+from app.core.config import settings
+
+TABLE = "benchmark_template_vectors"
+INDEX = "idx_benchmark_template_vectors_embedding"
+
+# Query shapes. NEAREST is what the HNSW migration's functions do (order by
+# distance, then drop rows below the threshold); FILTERED is what they did
+# before (threshold in the WHERE clause of the ordered scan).
+NEAREST_SQL = (
+    f"SELECT id FROM (SELECT id, embedding <=> $1 AS distance FROM {TABLE} "
+    f"ORDER BY embedding <=> $1 LIMIT $2) nearest WHERE 1 - distance > $3 ORDER BY distance"
+)
+FILTERED_SQL = (
+    f"SELECT id FROM {TABLE} WHERE 1 - (embedding <=> $1) > $3 ORDER BY embedding <=> $1 LIMIT $2"
+)
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dsn", default=settings.DATABASE_URL, help="Postgres connection string")
+    parser.add_argument("--rows", type=int, default=100_000, help="synthetic templates")
+    parser.add_argument("--dim", type=int, default=1536, help="embedding dimensions")
+    parser.add_argument("--clusters", type=int, default=1000, help="departments the templates are spread over")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=settings.RAG_MAX_RESULTS, help="results per query")
+    parser.add_argument("--threshold", type=float, default=settings.RAG_SIMILARITY_THRESHOLD)
+    parser.add_argument("--m", type=int, default=16, help="HNSW links per node")
+    parser.add_argument("--ef-construction", type=int, default=64, help="HNSW build candidate list")
+    parser.add_argument("--ef-search", default="10,20,40,80,160", help="comma-separated HNSW search candidate lists")
+    parser.add_argument("--skip-ivfflat", action="store_true", help="don't benchmark the IVFFlat index")
+    parser.add_argument("--maintenance-work-mem", default="1GB", help="memory for index builds")
+    parser.add_argument("--reload", action="store_true", help="regenerate the corpus even if it exists")
+    parser.add_argument("--drop", action="store_true", help="drop the benchmark table when done")
+    parser.add_argument("--seed", type=int, default=42)
+    return parser.parse_args()
+
+def encode_vector(vector) -> bytes:
+    """pgvector binary format: dimensions, an unused int16, then big-endian float4s"""
+    vector = np.asarray(vector, dtype=">f4")
+    return struct.pack(">HH", vector.shape[0], 0) + vector.tobytes()
+
+def decode_vector(data: bytes) -> np.ndarray:
+    dim, _ = struct.unpack_from(">HH", data)
+    return np.frombuffer(data, dtype=">f4", count=dim, offset=4).astype(np.float32)
+
+def normalize(matrix: np.ndarray) -> np.ndarray:
+    return matrix / np.linalg.norm(matrix, axis=-1, keepdims=True)
+
+class SyntheticCorpus:
+    """Template embeddings grouped by department: each row is its department's
+    direction plus noise of varying strength, so similarities within a
+    department spread out as they do for real templates.
+    """
+
+    def __init__(self, dim: int, clusters: int, seed: int):
+        self.dim = dim
+        self.rng = np.random.default_rng(seed)
+        self.centroids = normalize(self.rng.standard_normal((clusters, dim)).astype(np.float32))
+
+    def _near(self, cluster_ids: np.ndarray, noise: np.ndarray) -> np.ndarray:
+        directions = normalize(self.rng.standard_normal((len(cluster_ids), self.dim)).astype(np.float32))
+        return normalize(self.centroids[cluster_ids] + noise[:, None] * directions)
+
+    def rows(self, count: int, batch_size: int = 5000):
+        """Yield (id, cluster, embedding) batches"""
+        for start in range(0, count, batch_size):
+            ids = np.arange(start, min(start + batch_size, count))
+            clusters = ids % len(self.centroids)
+            embeddings = self._near(clusters, self.rng.uniform(0.4, 1.2, len(ids)).astype(np.float32))
+            yield [(int(i), int(c), e) for i, c, e in zip(ids, clusters, embeddings)]
+
+    def queries(self, count: int) -> np.ndarray:
+        """Queries near a random department, like a user describing their request"""
+        clusters = self.rng.integers(0, len(self.centroids), count)
+        return self._near(clusters, np.full(count, 0.9, dtype=np.float32))
+
+async def init_connection(connection: asyncpg.Connection) -> None:
+    """Send and receive vectors in binary (Supabase installs pgvector in the extensions schema)"""
+    schema = await connection.fetchval(
+        "SELECT n.nspname FROM pg_type t JOIN pg_namespace n ON n.oid = t.typnamespace WHERE t.typname = 'vector'"
+    )
+    await connection.set_type_codec(
+        "vector", encoder=encode_vector, decoder=decode_vector, format="binary", schema=schema
+    )
+
+async def check_pgvector(connection: asyncpg.Connection) -> str:
+    await connection.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    version = await connection.fetchval("SELECT extversion FROM pg_extension WHERE extname = 'vector'")
+    if tuple(int(part) for part in version.split("-")[0].split(".")[:2]) < (0, 5):
+        raise SystemExit(f"❌ HNSW needs pgvector 0.5.0 or later, found {version}")
+    return version
+
+async def load_corpus(connection: asyncpg.Connection, args: argparse.Namespace) -> None:
+    """Create and fill the benchmark table, unless it already holds this corpus"""
+    exists = await connection.fetchval("SELECT to_regclass($1) IS NOT NULL", TABLE)
+    if exists and not args.reload:
+        count = await connection.fetchval(f"SELECT count(*) FROM {TABLE}")
+        dim = await connection.fetchval(f"SELECT vector_dims(embedding) FROM {TABLE} LIMIT 1")
+        if count == args.rows and dim == args.dim:
+            print(f"📦 Reusing {count} rows in {TABLE} (--reload to regenerate)")
+            return
+
+    print(f"📦 Generating {args.rows} rows of {args.dim} dimensions in {args.clusters} departments...")
+    await connection.execute(f"DROP TABLE IF EXISTS {TABLE}")
+    await connection.execute(
+        f"CREATE TABLE {TABLE} (id INTEGER PRIMARY KEY, cluster INTEGER NOT NULL, embedding VECTOR({args.dim}) NOT NULL)"
+    )
+    started = time.perf_counter()
+    corpus = SyntheticCorpus(args.dim, args.clusters, args.seed)
+    for batch in corpus.rows(args.rows):
+        await connection.copy_records_to_table(TABLE, records=batch, columns=["id", "cluster", "embedding"])
+    await connection.execute(f"ANALYZE {TABLE}")
+    print(f"   loaded in {time.perf_counter() - started:.1f} s")
+
+async def run_queries(connection: asyncpg.Connection, sql: str, queries: np.ndarray, k: int, threshold: float):
+    """Result ids and latency (ms) of each query"""
+    statement = await connection.prepare(sql)
+    results, timings = [], []
+    for query in queries:
+        started = time.perf_counter()
+        rows = await statement.fetch(query, k, threshold)
+        timings.append((time.perf_counter() - started) * 1000)
+        results.append([row["id"] for row in rows])
+    return results, timings
+
+async def uses_index(connection: asyncpg.Connection, sql: str, query: np.ndarray, k: int, threshold: float) -> bool:
+    plan = await connection.fetchval(f"EXPLAIN (FORMAT JSON) {sql}", query, k, threshold)
+    return INDEX in str(plan)
+
+def recall(results, truth) -> float:
+    """Share of the exact top-k (above the threshold) that the index returned"""
+    scores = [len(set(found) & set(expected)) / len(expected) for found, expected in zip(results, truth) if expected]
+    return statistics.mean(scores) if scores else 0.0
+
+def report(name: str, results, truth, timings, extra: str = "") -> None:
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+    returned = statistics.mean(len(found) for found in results)
+    print(f"{name:<34} recall {recall(results, truth):6.1%}  rows {returned:4.1f}  "
+          f"mean {statistics.mean(timings):8.3f} ms  p50 {statistics.median(timings):8.3f} ms  p95 {p95:8.3f} ms{extra}")
+
+async def build_index(connection: asyncpg.Connection, using: str) -> None:
+    await connection.execute(f"DROP INDEX IF EXISTS {INDEX}")
+    started = time.perf_counter()
+    await connection.execute(f"CREATE INDEX {INDEX} ON {TABLE} USING {using}")
+    size = await connection.fetchval("SELECT pg_size_pretty(pg_relation_size($1::regclass))", INDEX)
+    print(f"🔧 {using}: built in {time.perf_counter() - started:.1f} s, {size}")
+
+async def main():
+    args = parse_args()
+    ef_searches = [int(value) for value in args.ef_search.split(",") if value.strip()]
+
+    connection = await asyncpg.connect(dsn=args.dsn)
+    try:
+        version = await check_pgvector(connection)
+        await init_connection(connection)
+        await connection.execute(f"SET maintenance_work_mem = '{args.maintenance_work_mem}'")
+        await load_corpus(connection, args)
+
+        queries = SyntheticCorpus(args.dim, args.clusters, args.seed).queries(args.queries)
+        print(f"📊 pgvector {version}, {args.rows} rows, {args.queries} queries, top {args.k}, threshold {args.threshold}")
+        print("=" * 60)
+
+        # Exact results from a sequential scan, before any index exists
+        await connection.execute(f"DROP INDEX IF EXISTS {INDEX}")
+        truth, timings = await run_queries(connection, NEAREST_SQL, queries, args.k, args.threshold)
+        report("exact (sequential scan)", truth, truth, timings)
+
+        if not args.skip_ivfflat:
+            # What migration_to_pdf_rag.sql creates: default lists, default probes
+            await build_index(connection, "ivfflat (embedding vector_cosine_ops)")
+            await connection.execute(f"ANALYZE {TABLE}")
+            results, timings = await run_queries(connection, NEAREST_SQL, queries, args.k, args.threshold)
+            report("ivfflat lists=100 probes=1", results, truth, timings)
+
+        await build_index(
+            connection,
+            f"hnsw (embedding vector_cosine_ops) WITH (m = {args.m}, ef_construction = {args.ef_construction})"
+        )
+        await connection.execute(f"ANALYZE {TABLE}")
+        for ef_search in ef_searches:
+            # Same rule as the search functions: never fewer candidates than results
+            await connection.execute(f"SET hnsw.ef_search = {max(ef_search, args.k)}")
+            results, timings = await run_queries(connection, NEAREST_SQL, queries, args.k, args.threshold)
+            report(f"hnsw m={args.m} ef_search={ef_search}", results, truth, timings)
+
+        # Old and new query shape with the default search setting
+        await connection.execute(f"SET hnsw.ef_search = {max(40, args.k)}")
+        for name, sql in (("order, then filter (new)", NEAREST_SQL), ("filter while ordering (old)", FILTERED_SQL)):
+            results, timings = await run_queries(connection, sql, queries, args.k, args.threshold)
+            indexed = await uses_index(connection, sql, queries[0], args.k, args.threshold)
+            report(f"hnsw ef_search=40, {name}", results, truth, timings, f"  index {'yes' if indexed else 'no'}")
+
+        if args.drop:
+            await connection.execute(f"DROP TABLE IF EXISTS {TABLE}")
+            print(f"🧹 Dropped {TABLE}")
+    finally:
+        await connection.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
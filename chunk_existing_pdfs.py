@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""
+Script to build chunk-level embeddings (pdf_chunks) for PDFs already in the database
+Run from the backend directory after applying supabase/migration_pdf_chunks.sql
+"""
+
+import asyncio
+import sys
+
+# Add the backend directory to Python path
+sys.path.append('.')
+
+from app.services.supabase_client import get_supabase_client
+from app.services.rag_service import get_rag_service
+
+async def main():
+    print("🔍 Loading PDFs from database...")
+    
+    supabase = get_supabase_client()
+    rag_service = get_rag_service()
+    
+    result = supabase.client.table('pdf_documents').select('id, title, extracted_text, rti_category, rti_department').execute()
+    documents = result.data or []
+    print(f"📊 Found {len(documents)} PDFs")
+    print("=" * 60)
+    
+    total_chunks = 0
+    for i, document in enumerate(documents, 1):
+        try:
+            # Re-chunking replaces any chunks from a previous run
+            await supabase.delete_pdf_chunks(document['id'])
+            count = await rag_service.index_document_chunks(document, document['extracted_text'])
+            total_chunks += count
+            print(f"{i:2d}. ✅ {document['title']}: {count} chunks")
+        except Exception as e:
+            print(f"{i:2d}. ❌ {document['title']}: {e}")
+    
+    print("=" * 60)
+    print(f"🎉 Stored {total_chunks} chunks for {len(documents)} PDFs")
+    print("ℹ️  Restart the backend to load the new chunks into the in-process index")
+
+if __name__ == "__main__":
+    asyncio.run(main())
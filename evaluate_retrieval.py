@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+Offline retrieval evaluation over the bundled RTI template PDFs
+Run from the backend directory: python ../evaluate_retrieval.py [--embeddings stub|openai] [--misses] [--json out.json]
+
+Every template PDF in the repository root is extracted, chunked and indexed
+in memory exactly as an upload would be, then a labelled query set (a few
+queries per template) is run through each retrieval strategy of the RAG
+service. For each strategy it reports recall@1, recall@5 and MRR of the
+expected template, p50/p99 retrieval latency and the template and prompt
+tokens the retrieved context would cost. Nothing is read from or written to
+the database.
+
+Embeddings:
+  stub    deterministic hashed character n-grams, no API key needed (default)
+  openai  the configured embedding model, cached in --cache so later runs
+          make no API calls and give the same numbers
+"""
+
+import argparse
+import ast
+import asyncio
+import contextlib
+import glob
+import hashlib
+import io
+import json
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+# Add the backend directory to Python path
+sys.path.append('.')
+
+from app.core.config import settings
+from app.services.openai_client import get_async_openai_client
+from app.services.rag_service import get_rag_service
+from app.services.intent_router import get_intent_router
+from app.services.embedding_cache import EmbeddingCache
+from app.services.lexical_index import tokenize
+from app.services.chunking import chunk_text
+from app.services.context_builder import TOKENS_PER_MESSAGE
+from app.services.text_extraction import extract_text_from_file
+
+PDF_DIRECTORY = ".."
+# Hashed n-gram similarities run lower than the embedding model's, so the
+# stub embeddings get their own similarity threshold
+STUB_SIMILARITY_THRESHOLD = 0.2
+# Title, category and department of each PDF, as uploaded
+UPLOAD_SCRIPT = os.path.join(PDF_DIRECTORY, "upload_actual_pdfs.py")
+
+# Queries per template PDF: one naming the template's subject, one
+# paraphrase, one the way users actually type
+LABELLED_QUERIES = {
+    "Certified documents from government offices or departments.pdf": [
+        "certified copies of documents from a government office",
+        "I need attested copies of official records held by a department",
+        "how to get certified copy of govt file",
+    ],
+    "Citizen Charter of Government offices.pdf": [
+        "citizen charter of the government office",
+        "service standards and timelines the office has promised to citizens",
+        "office not following citizen charter timelines",
+    ],
+    "Complaint Tracking.pdf": [
+        "status of the complaint I filed with the department",
+        "action taken on my grievance petition",
+        "no update on my complaint for months",
+    ],
+    "Custom Request.pdf": [
+        "general RTI request for information not covered by other formats",
+        "I want to ask a public authority for some specific information",
+        "custom rti application",
+    ],
+    "Dharani Telangana Land related issues.pdf": [
+        "Dharani portal land issue in Telangana",
+        "pending land application on the Telangana land records portal",
+        "dharani mutation pending telangana",
+    ],
+    "Encumberance Certificate.pdf": [
+        "encumbrance certificate for my property",
+        "certificate showing whether my land has any loans or charges registered",
+        "EC not issued by sub registrar",
+    ],
+    "EPF Status.pdf": [
+        "EPF claim status",
+        "my provident fund withdrawal has not been settled",
+        "pf money not credited uan",
+    ],
+    "FIR Copy.pdf": [
+        "copy of FIR filed at the police station",
+        "police have not given me a copy of the first information report",
+        "fir copy and investigation status",
+    ],
+    "First Appeal Template.pdf": [
+        "first appeal because the PIO did not reply",
+        "the public information officer gave incomplete information, what next",
+        "no reply to my rti in 30 days appeal",
+    ],
+    "Fund Utilization.pdf": [
+        "utilization of funds sanctioned to the department",
+        "how was the budget allotted for the scheme spent",
+        "fund utilisation details of government scheme",
+    ],
+    "Gram Panchayath Inquiry.pdf": [
+        "gram panchayat expenditure inquiry",
+        "works done by our village panchayat and the money spent",
+        "sarpanch spending details panchayath",
+    ],
+    "Income Tax Refund.pdf": [
+        "income tax refund not credited",
+        "my ITR was processed but the refund has not reached my account",
+        "tax refund pending from IT department",
+    ],
+    "IRCTC Refund issues.pdf": [
+        "IRCTC ticket refund not received",
+        "money for my cancelled train e-ticket was not returned",
+        "tdr refund irctc pending",
+    ],
+    "Khasra Pahani Records.pdf": [
+        "khasra pahani records for my survey number",
+        "village revenue records showing cultivation and ownership of my field",
+        "pahani copy",
+    ],
+    "Land Survey related rti.pdf": [
+        "land survey measurement records",
+        "the surveyor measured my plot and I want the survey report",
+        "land survey not done after application",
+    ],
+    "Link document realted rti.pdf": [
+        "link documents for my property",
+        "previous ownership chain documents of the land I bought",
+        "parent documents of flat",
+    ],
+    "Marksheet Verification.pdf": [
+        "marksheet verification from the university",
+        "the board has not verified my exam marks certificate",
+        "marks memo verification pending",
+    ],
+    "Meebhoomi Andhra pradesh land related rti.pdf": [
+        "Meebhoomi Andhra Pradesh land records",
+        "adangal and 1B record correction in Andhra Pradesh",
+        "meebhoomi adangal mistake",
+    ],
+    "Minicipality related rti.pdf": [
+        "municipality garbage collection complaint",
+        "civic works and sanitation by the municipal corporation",
+        "municipal office not cleaning drainage",
+    ],
+    "MP MLA Fund utilization.pdf": [
+        "MP MLA LAD fund utilisation in my constituency",
+        "works sanctioned from my member of parliament's development fund",
+        "mla funds spent in our area",
+    ],
+    "Mutation Realted RTI.pdf": [
+        "mutation of agricultural land records",
+        "the land transfer has not been entered in revenue records after purchase",
+        "mutation pending tahsildar",
+    ],
+    "Passport Delay.pdf": [
+        "my passport application is delayed",
+        "police verification done but passport still not dispatched",
+        "passport not received after 2 months",
+    ],
+    "Pension Inquiry tracking.pdf": [
+        "track my pension application",
+        "retirement pension has not been sanctioned yet",
+        "family pension not started",
+    ],
+    "Public Transport Related RTI.pdf": [
+        "public transport bus services in our city",
+        "number of buses and routes run by the state transport corporation",
+        "bus service stopped in village",
+    ],
+    "Refund from Government offices or departments.pdf": [
+        "refund of money paid to a government department",
+        "the office collected excess fees and has not returned them",
+        "govt refund pending",
+    ],
+    "Registration Refund Related RTI.pdf": [
+        "registration fee refund",
+        "stamp duty paid for a cancelled property registration not refunded",
+        "refund of registration charges",
+    ],
+    "Road Work Related RTI.pdf": [
+        "details of road work contract in my ward",
+        "who built the road, the sanctioned cost and quality checks",
+        "road repair work incomplete contractor",
+    ],
+    "RTA Related Queries.pdf": [
+        "RTA driving licence pending",
+        "vehicle registration certificate not issued by the transport office",
+        "rc book not received rta",
+    ],
+    "Sale deed copies.pdf": [
+        "certified copy of sale deed from sub registrar",
+        "copy of the registered deed for the land I purchased",
+        "sale deed copy",
+    ],
+    "Second Appeal Templae.pdf": [
+        "second appeal to the information commission",
+        "the first appellate authority did not decide my appeal",
+        "appeal to state information commission",
+    ],
+    "Street lights related rti.pdf": [
+        "street lights not working in our colony",
+        "maintenance of lamps on our road by the local body",
+        "street light repair complaint",
+    ],
+    "Toll Collection related rti.pdf": [
+        "toll plaza collection on the highway",
+        "how much has the toll booth collected and when does it end",
+        "toll gate charges nhai",
+    ],
+}
+
+# name: (search chunks, hybrid BM25 + vector, narrow by routed category)
+STRATEGIES = {
+    "vector documents": (False, False, False),
+    "hybrid documents": (False, True, False),
+    "vector chunks": (True, False, False),
+    "hybrid chunks": (True, True, False),
+    "hybrid chunks + routing": (True, True, True),
+}
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--embeddings", choices=("stub", "openai"), default="stub")
+    parser.add_argument("--cache", default="retrieval_eval_embeddings.sqlite3", help="embedding cache for --embeddings openai")
+    parser.add_argument("--stub-dimensions", type=int, default=512)
+    parser.add_argument("--threshold", type=float,
+                        help=f"similarity threshold (default: RAG_SIMILARITY_THRESHOLD, {STUB_SIMILARITY_THRESHOLD} with stub embeddings)")
+    parser.add_argument("--strategies", default=",".join(STRATEGIES), help="comma-separated subset of: " + ", ".join(STRATEGIES))
+    parser.add_argument("--rounds", type=int, default=5, help="timed runs per query")
+    parser.add_argument("--misses", action="store_true", help="list queries whose template is not ranked first")
+    parser.add_argument("--json", help="also write the results to this file")
+    return parser.parse_args()
+
+class StubEmbedder:
+    """Deterministic embeddings: hashed character trigrams of each word, so
+    misspellings ("Minicipality") still land near the right template.
+    Cheap and reproducible, not semantic; use it to compare changes, not to
+    judge absolute quality.
+    """
+
+    name = "stub"
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+
+    def _embed(self, text: str) -> list:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in tokenize(text):
+            padded = f" {word} "
+            for gram in [word] + [padded[i:i + 3] for i in range(len(padded) - 2)]:
+                digest = hashlib.md5(gram.encode("utf-8")).digest()
+                index = int.from_bytes(digest[:4], "little") % self.dimensions
+                vector[index] += 1.0 if digest[4] & 1 else -1.0
+        vector = np.sign(vector) * np.log1p(np.abs(vector))
+        norm = np.linalg.norm(vector)
+        return (vector / norm if norm else vector).tolist()
+
+    async def embed(self, texts: list) -> list:
+        return [self._embed(text) for text in texts]
+
+class CachedEmbedder:
+    """The configured embedding model, with every embedding kept in a SQLite file"""
+
+    def __init__(self, cache_path: str):
+        self.client = get_async_openai_client()
+        self.name = self.client.embedding_model
+        # No expiry: the numbers should not change because a cache entry aged
+        self.cache_path = cache_path
+        self.cache = EmbeddingCache(max_size=100_000, ttl_seconds=10 * 365 * 86400, db_path=cache_path)
+
+    async def embed(self, texts: list) -> list:
+        embeddings = [self.cache.get(self.name, text) for text in texts]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        for start in range(0, len(missing), 100):
+            batch = missing[start:start + 100]
+            for i, embedding in zip(batch, await self.client.get_embeddings([texts[i] for i in batch])):
+                self.cache.set(self.name, texts[i], embedding)
+                embeddings[i] = embedding
+        if missing:
+            print(f"   embedded {len(missing)} texts, {len(texts) - len(missing)} were cached in {self.cache_path}")
+        return embeddings
+
+def template_metadata() -> dict:
+    """PDF_FILES of upload_actual_pdfs.py by file name, read without running the script"""
+    tree = ast.parse(open(UPLOAD_SCRIPT, encoding="utf-8").read())
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and any(getattr(target, "id", None) == "PDF_FILES" for target in node.targets):
+            return {entry["file_path"]: entry for entry in ast.literal_eval(node.value)}
+    return {}
+
+class OfflineTemplateStore:
+    """Stands in for the database on the few calls the local search path makes"""
+
+    def __init__(self, documents: list):
+        self.texts = {document["id"]: document["extracted_text"] for document in documents}
+
+    async def get_pdf_document_texts(self, document_ids: list) -> dict:
+        return {document_id: self.texts[document_id] for document_id in document_ids if document_id in self.texts}
+
+@contextlib.contextmanager
+def quiet():
+    """Silence the service's progress prints while timing"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+async def build_indexes(rag, embedder) -> list:
+    """Extract, chunk, embed and index every bundled template PDF"""
+    metadata = template_metadata()
+    documents = []
+    for path in sorted(glob.glob(os.path.join(PDF_DIRECTORY, "*.pdf"))):
+        file_name = os.path.basename(path)
+        with open(path, "rb") as f:
+            text = extract_text_from_file(f.read(), ".pdf")
+        details = metadata.get(file_name, {})
+        documents.append({
+            "id": file_name,
+            "title": details.get("title", file_name[:-4]),
+            "rti_category": details.get("rti_category"),
+            "rti_department": details.get("rti_department"),
+            "extracted_text": text
+        })
+
+    chunks = []
+    for document in documents:
+        for chunk in chunk_text(document["extracted_text"], rag.openai_client.encoding):
+            chunks.append({
+                **chunk,
+                "id": f"{document['id']}#{chunk['chunk_index']}",
+                "document_id": document["id"],
+                "title": document["title"],
+                "rti_category": document["rti_category"],
+                "rti_department": document["rti_department"]
+            })
+
+    print(f"📄 {len(documents)} templates, {len(chunks)} chunks; embedding with {embedder.name}...")
+    for row, embedding in zip(documents + chunks, await embedder.embed(
+            [document["extracted_text"] for document in documents] + [chunk["content"] for chunk in chunks])):
+        row["embedding"] = embedding
+
+    with quiet():
+        rag.vector_index.load(documents)
+        rag.lexical_index.load(documents)
+        rag.chunk_index.load(chunks)
+        rag.chunk_lexical_index.load(chunks)
+    settings.RAG_DOCUMENT_TEXT_CACHE_SIZE = max(settings.RAG_DOCUMENT_TEXT_CACHE_SIZE, len(documents))
+    for document in documents:
+        rag.cache_document_text(document["id"], document["extracted_text"])
+    rag.supabase_client = OfflineTemplateStore(documents)
+    return documents
+
+async def ranked_templates(rag, query: str, embedding: list, rti_category: str, use_chunks: bool) -> list:
+    """Document ids in ranked order, falling back to all categories as retrieve_templates does"""
+    search = rag._search_chunks if use_chunks else rag._search_documents
+    rows = await search(embedding, query, rti_category) if rti_category else []
+    if not rows:
+        rows = await search(embedding, query)
+    ranked = []
+    for row in rows:
+        document_id = row.get("document_id", row["id"])
+        if document_id not in ranked:
+            ranked.append(document_id)
+    return ranked
+
+def prompt_tokens(rag, query: str, context_parts: list) -> tuple:
+    """Template tokens and total prompt tokens of a first-turn request with this context"""
+    builder = rag.context_builder
+    messages, context = builder.build(rag.openai_client._get_system_message(), context_parts, [], query)
+    full_messages = rag.openai_client._build_chat_messages(messages, context)
+    total = sum(builder.count_tokens(message["content"]) + TOKENS_PER_MESSAGE for message in full_messages)
+    return builder.count_tokens(context), total
+
+def percentile(values: list, fraction: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+async def evaluate(rag, name: str, queries: list, embeddings: list, rounds: int, misses: bool) -> dict:
+    use_chunks, hybrid, routed = STRATEGIES[name]
+    settings.RAG_USE_CHUNKS = use_chunks
+    settings.RAG_HYBRID_SEARCH = hybrid
+    router = get_intent_router()
+
+    ranks, timings, template_tokens, total_tokens = [], [], [], []
+    for (query, expected), embedding in zip(queries, embeddings):
+        rti_category = None
+        with quiet():
+            if routed:
+                route = router.assign_category(router.route(query), embedding)
+                rti_category = route["rti_category"]
+            ranked = await ranked_templates(rag, query, embedding, rti_category, use_chunks)
+            for _ in range(rounds):
+                started = time.perf_counter()
+                selection = await rag.retrieve_templates(query, embedding, rti_category)
+                timings.append((time.perf_counter() - started) * 1000)
+            context_tokens, prompt = prompt_tokens(rag, query, selection["context_parts"])
+        template_tokens.append(context_tokens)
+        total_tokens.append(prompt)
+
+        rank = ranked.index(expected) + 1 if expected in ranked else None
+        ranks.append(rank)
+        if misses and rank != 1:
+            top = ranked[0] if ranked else "-"
+            print(f"  {name}: '{query}' -> {top} (expected {expected}, rank {rank or 'none'})")
+
+    count = len(ranks)
+    return {
+        "strategy": name,
+        "queries": count,
+        "recall@1": sum(1 for rank in ranks if rank == 1) / count,
+        "recall@5": sum(1 for rank in ranks if rank and rank <= 5) / count,
+        "mrr": sum(1 / rank for rank in ranks if rank) / count,
+        "latency_p50_ms": statistics.median(timings),
+        "latency_p99_ms": percentile(timings, 0.99),
+        "template_tokens": statistics.mean(template_tokens),
+        "prompt_tokens": statistics.mean(total_tokens)
+    }
+
+def report(result: dict) -> None:
+    print(f"{result['strategy']:<24} R@1 {result['recall@1']:6.1%}  R@5 {result['recall@5']:6.1%}  "
+          f"MRR {result['mrr']:.3f}  p50 {result['latency_p50_ms']:7.3f} ms  p99 {result['latency_p99_ms']:7.3f} ms  "
+          f"templates {result['template_tokens']:6.0f} tok  prompt {result['prompt_tokens']:6.0f} tok")
+
+async def main():
+    args = parse_args()
+    names = [name.strip() for name in args.strategies.split(",") if name.strip()]
+    unknown = [name for name in names if name not in STRATEGIES]
+    if unknown:
+        raise SystemExit(f"❌ Unknown strategies: {', '.join(unknown)}")
+
+    rag = get_rag_service()
+    embedder = CachedEmbedder(args.cache) if args.embeddings == "openai" else StubEmbedder(args.stub_dimensions)
+    settings.RAG_USE_LOCAL_INDEX = True
+    if args.threshold is not None:
+        settings.RAG_SIMILARITY_THRESHOLD = args.threshold
+    elif args.embeddings == "stub":
+        settings.RAG_SIMILARITY_THRESHOLD = STUB_SIMILARITY_THRESHOLD
+    documents = await build_indexes(rag, embedder)
+
+    known = {document["id"] for document in documents}
+    queries = [(query, file_name) for file_name, texts in LABELLED_QUERIES.items() if file_name in known for query in texts]
+    unlabelled = sorted(known - set(LABELLED_QUERIES))
+    if unlabelled:
+        print(f"⚠️ No labelled queries for: {', '.join(unlabelled)}")
+    embeddings = await embedder.embed([query for query, _ in queries])
+
+    print(f"📊 {len(queries)} queries, {args.rounds} timed rounds each, embeddings: {embedder.name}, "
+          f"threshold {settings.RAG_SIMILARITY_THRESHOLD}")
+    print("=" * 60)
+    results = []
+    for name in names:
+        result = await evaluate(rag, name, queries, embeddings, args.rounds, args.misses)
+        report(result)
+        results.append(result)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({
+                "embeddings": embedder.name,
+                "threshold": settings.RAG_SIMILARITY_THRESHOLD,
+                "results": results
+            }, f, indent=2)
+        print(f"💾 Results written to {args.json}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
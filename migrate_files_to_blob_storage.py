@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Script to move base64 file data out of pdf_documents and rti_applications into blob storage
+Run from the backend directory after applying supabase/migration_blob_storage.sql
+"""
+
+import asyncio
+import base64
+import sys
+
+# Add the backend directory to Python path
+sys.path.append('.')
+
+from app.services.supabase_client import get_supabase_client
+from app.services.blob_storage import get_blob_storage
+
+# (table, base64 column, key column, content type)
+TABLES = [
+    ("pdf_documents", "file_data", "file_key", "application/pdf"),
+    ("rti_applications", "attached_file_data", "attached_file_key", "application/octet-stream"),
+]
+
+async def migrate_table(table: str, data_column: str, key_column: str, content_type: str) -> int:
+    supabase = get_supabase_client()
+    storage = get_blob_storage()
+
+    # Only ids here; each file is fetched on its own so no query drags every file at once
+    try:
+        result = supabase.client.table(table).select("id").is_(key_column, "null").execute()
+    except Exception as e:
+        print(f"⚠️  Skipping {table}: {e}")
+        return 0
+    rows = result.data or []
+    print(f"📊 {table}: {len(rows)} rows to move")
+
+    moved = 0
+    for i, row in enumerate(rows, 1):
+        try:
+            data = supabase.client.table(table).select(data_column).eq("id", row["id"]).execute().data
+            file_data = data[0].get(data_column) if data else None
+            if not file_data:
+                print(f"[{i}/{len(rows)}] {row['id']}: no file data")
+                continue
+
+            key = await storage.put(base64.b64decode(file_data), content_type)
+            supabase.client.table(table).update({key_column: key, data_column: None}).eq("id", row["id"]).execute()
+            moved += 1
+            print(f"[{i}/{len(rows)}] ✅ {row['id']} -> {key}")
+        except Exception as e:
+            print(f"[{i}/{len(rows)}] ❌ {row['id']}: {e}")
+    return moved
+
+async def main():
+    print("🔍 Moving uploaded files into blob storage...")
+    print("=" * 60)
+
+    for table, data_column, key_column, content_type in TABLES:
+        moved = await migrate_table(table, data_column, key_column, content_type)
+        print(f"✅ {table}: moved {moved} files")
+        print("=" * 60)
+
+if __name__ == "__main__":
+    asyncio.run(main())
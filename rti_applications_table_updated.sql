@@ -13,7 +13,8 @@ CREATE TABLE rti_applications (
     email TEXT NOT NULL,
     address TEXT NOT NULL,
     attached_file_name TEXT NOT NULL,
-    attached_file_data TEXT NOT NULL, -- Store file as base64 string
+    attached_file_key TEXT, -- Blob storage key of the attached file
+    attached_file_data TEXT, -- Legacy base64 copy, only for rows not yet moved to blob storage
     attached_file_size INT NOT NULL,
     razorpay_order_id TEXT NOT NULL,
     razorpay_payment_id TEXT,
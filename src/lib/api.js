@@ -124,6 +124,14 @@ class ApiClient {
     }
   }
 
+  // One page of conversations, most recently active first, each with message_count and
+  // last_message_preview. Pass `before` (a next_cursor) to load the next page.
+  async getConversationsPage({ limit = 20, before } = {}) {
+    const params = new URLSearchParams({ limit: String(limit) })
+    if (before) params.set('before', before)
+    return this.request(`/chat/conversations?${params}`, { method: 'GET' })
+  }
+
   async createConversation(title) {
     return this.request('/chat/conversations', {
       method: 'POST',
@@ -135,6 +143,16 @@ class ApiClient {
     return this.request(`/chat/conversations/${conversationId}/messages`, { method: 'GET' })
   }
 
+  // One page of messages, oldest first. Pass `before` (a before_cursor) to load older
+  // messages, or `after`/`since` to fetch only what is new since the last sync.
+  async getMessagesPage(conversationId, { limit = 50, before, after, since, light = true } = {}) {
+    const params = new URLSearchParams({ limit: String(limit), light: String(light) })
+    if (before) params.set('before', before)
+    if (after) params.set('after', after)
+    if (since) params.set('since', since)
+    return this.request(`/chat/conversations/${conversationId}/messages?${params}`, { method: 'GET' })
+  }
+
   async sendMessage(message, conversationId = null, userId = null) {
     return this.request('/chat/send', {
       method: 'POST',
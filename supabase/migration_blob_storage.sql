@@ -0,0 +1,38 @@
+-- Migration to keep uploaded files in Supabase Storage instead of base64 TEXT columns
+-- Run this script in your Supabase SQL editor, then move existing files with
+-- migrate_files_to_blob_storage.py (run from the backend directory)
+
+-- Step 1: Private bucket for uploaded files (objects are keyed sha256/<xx>/<sha256>)
+INSERT INTO storage.buckets (id, name, public)
+VALUES ('documents', 'documents', false)
+ON CONFLICT (id) DO NOTHING;
+
+-- Step 2: Reference files by blob key; file_data is only kept for rows not yet moved
+ALTER TABLE pdf_documents ADD COLUMN IF NOT EXISTS file_key TEXT;
+ALTER TABLE pdf_documents ALTER COLUMN file_data DROP NOT NULL;
+
+DO $$
+BEGIN
+  IF to_regclass('public.rti_applications') IS NOT NULL THEN
+    ALTER TABLE rti_applications ADD COLUMN IF NOT EXISTS attached_file_key TEXT;
+    ALTER TABLE rti_applications ALTER COLUMN attached_file_data DROP NOT NULL;
+  END IF;
+END $$;
+
+-- Step 3: Find rows that still carry their file inline
+CREATE INDEX IF NOT EXISTS idx_pdf_documents_unmigrated_file
+  ON pdf_documents(id) WHERE file_key IS NULL;
+
+-- Step 4: Who uploaded which blob through POST /api/v1/files; the uploader may
+-- download it and attach it to an RTI application by key
+CREATE TABLE IF NOT EXISTS file_uploads (
+  user_id UUID REFERENCES profiles(id) ON DELETE CASCADE,
+  file_key TEXT NOT NULL,
+  file_name TEXT,
+  content_type TEXT,
+  file_size BIGINT,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  PRIMARY KEY (user_id, file_key)
+);
+ALTER TABLE file_uploads ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Users can view own file uploads" ON file_uploads FOR SELECT USING (auth.uid() = user_id);
@@ -0,0 +1,33 @@
+-- Migration to read a conversation's chat context in one round trip
+-- Run this script in your Supabase SQL editor after migration_conversation_summaries.sql
+
+-- Returns no row if the conversation doesn't exist or doesn't belong to the user;
+-- otherwise its summary, total message count and the newest message_limit
+-- messages (oldest first)
+CREATE OR REPLACE FUNCTION get_conversation_context(conv_id UUID, user_uuid UUID, message_limit INT DEFAULT 16)
+RETURNS TABLE (
+  summary TEXT,
+  summarized_count INTEGER,
+  message_count BIGINT,
+  messages JSONB
+) AS $$
+BEGIN
+  RETURN QUERY
+  SELECT
+    COALESCE(s.summary, ''),
+    COALESCE(s.summarized_count, 0),
+    (SELECT COUNT(*) FROM messages m WHERE m.conversation_id = c.id),
+    COALESCE((
+      SELECT jsonb_agg(to_jsonb(r) ORDER BY r.created_at)
+      FROM (
+        SELECT * FROM messages m
+        WHERE m.conversation_id = c.id
+        ORDER BY m.created_at DESC
+        LIMIT message_limit
+      ) r
+    ), '[]'::jsonb)
+  FROM conversations c
+  LEFT JOIN conversation_summaries s ON s.conversation_id = c.id
+  WHERE c.id = conv_id AND c.user_id = user_uuid;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
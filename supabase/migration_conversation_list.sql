@@ -0,0 +1,84 @@
+-- Migration for the aggregated conversation list (sidebar)
+-- Run this script in your Supabase SQL editor after migration_message_pagination.sql
+
+-- Conversations of a user with message count and a preview of the last
+-- message, most recently active first. Activity is the later of the last
+-- message and the conversation's updated_at. Pass the last row's
+-- (last_activity_at, id) as the before_* cursor to get the next page;
+-- page_size NULL returns every conversation.
+CREATE OR REPLACE FUNCTION get_conversation_list(
+  user_uuid UUID,
+  page_size INT DEFAULT NULL,
+  before_activity_at TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+  before_id UUID DEFAULT NULL,
+  preview_length INT DEFAULT 120
+)
+RETURNS TABLE (
+  id UUID,
+  user_id UUID,
+  title TEXT,
+  created_at TIMESTAMP WITH TIME ZONE,
+  updated_at TIMESTAMP WITH TIME ZONE,
+  last_activity_at TIMESTAMP WITH TIME ZONE,
+  message_count BIGINT,
+  last_message_sender TEXT,
+  last_message_preview TEXT
+) AS $$
+BEGIN
+  RETURN QUERY
+  SELECT *
+  FROM (
+    SELECT
+      c.id,
+      c.user_id,
+      c.title,
+      c.created_at,
+      c.updated_at,
+      GREATEST(c.updated_at, last_message.created_at) AS last_activity_at,
+      counts.message_count,
+      last_message.sender,
+      -- Attached file text never shows up in the preview
+      left(split_part(last_message.content, E'\n\n[File Content:]\n', 1), preview_length)
+    FROM conversations c
+    LEFT JOIN LATERAL (
+      SELECT m.sender, m.content, m.created_at
+      FROM messages m
+      WHERE m.conversation_id = c.id
+      ORDER BY m.created_at DESC, m.id DESC
+      LIMIT 1
+    ) last_message ON TRUE
+    CROSS JOIN LATERAL (
+      SELECT COUNT(*) AS message_count FROM messages m WHERE m.conversation_id = c.id
+    ) counts
+    WHERE c.user_id = user_uuid
+  ) listed
+  WHERE before_activity_at IS NULL
+    OR (listed.last_activity_at, listed.id) < (before_activity_at, COALESCE(before_id, '00000000-0000-0000-0000-000000000000'::UUID))
+  ORDER BY listed.last_activity_at DESC, listed.id DESC
+  LIMIT page_size;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Fingerprint of a user's conversation list: it changes whenever a
+-- conversation is added, renamed or deleted, or a message is added. It only
+-- counts and takes maxima, so it is much cheaper than get_conversation_list
+-- and lets the sidebar answer If-None-Match before building the list.
+CREATE OR REPLACE FUNCTION get_conversation_list_version(user_uuid UUID)
+RETURNS TABLE (
+  conversation_count BIGINT,
+  conversations_updated_at TIMESTAMP WITH TIME ZONE,
+  message_count BIGINT,
+  last_message_at TIMESTAMP WITH TIME ZONE
+) AS $$
+BEGIN
+  RETURN QUERY
+  SELECT
+    (SELECT COUNT(*) FROM conversations c WHERE c.user_id = user_uuid),
+    (SELECT MAX(c.updated_at) FROM conversations c WHERE c.user_id = user_uuid),
+    COUNT(m.id),
+    MAX(m.created_at)
+  FROM conversations c
+  JOIN messages m ON m.conversation_id = c.id
+  WHERE c.user_id = user_uuid;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
@@ -0,0 +1,22 @@
+-- Migration to add rolling conversation summaries for chat memory
+-- Run this script in your Supabase SQL editor after schema.sql
+
+-- Step 1: Create the conversation_summaries table
+-- summarized_count is the number of oldest messages folded into the summary
+CREATE TABLE IF NOT EXISTS conversation_summaries (
+  conversation_id UUID PRIMARY KEY REFERENCES conversations(id) ON DELETE CASCADE,
+  summary TEXT NOT NULL DEFAULT '',
+  summarized_count INTEGER NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Step 2: Index for reading the most recent messages of a conversation
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_created_at ON messages(conversation_id, created_at DESC);
+
+-- Step 3: Keep updated_at current
+CREATE TRIGGER update_conversation_summaries_updated_at BEFORE UPDATE ON conversation_summaries FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+
+-- Step 4: Enable RLS
+ALTER TABLE conversation_summaries ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "Users can view summaries of own conversations" ON conversation_summaries FOR SELECT
+  USING (conversation_id IN (SELECT id FROM conversations WHERE user_id = auth.uid()));
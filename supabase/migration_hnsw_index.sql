@@ -0,0 +1,231 @@
+-- Migration from IVFFlat to HNSW vector indexes (needs pgvector 0.5.0 or later)
+-- Run this script in your Supabase SQL editor after migration_hybrid_search.sql
+--
+-- The IVFFlat indexes were created on empty tables with the default number
+-- of lists, so their clusters don't fit the data and recall drops as the
+-- template library grows. HNSW needs no training data and keeps recall high
+-- as rows are added. Settings (edit and re-run the script to change them):
+--   hnsw_m               links per node: higher gives better recall and a bigger index
+--   hnsw_ef_construction candidate list while building: higher gives a better graph and a slower build
+--   hnsw_ef_search       candidate list per search (last block): higher gives better recall and slower searches
+-- From the backend directory, `python ../benchmark_vector_index.py` measures
+-- recall@k and latency for different values on a synthetic corpus.
+
+-- Step 1: Replace the IVFFlat indexes
+DO $$
+DECLARE
+  hnsw_m INT := 16;
+  hnsw_ef_construction INT := 64;
+  pgvector_version TEXT;
+BEGIN
+  SELECT extversion INTO pgvector_version FROM pg_extension WHERE extname = 'vector';
+  IF pgvector_version IS NULL OR string_to_array(split_part(pgvector_version, '-', 1), '.')::INT[] < ARRAY[0, 5] THEN
+    RAISE EXCEPTION 'HNSW indexes need pgvector 0.5.0 or later (installed: %)', COALESCE(pgvector_version, 'none');
+  END IF;
+
+  DROP INDEX IF EXISTS idx_pdf_documents_embedding;
+  EXECUTE format(
+    'CREATE INDEX idx_pdf_documents_embedding ON pdf_documents USING hnsw (embedding vector_cosine_ops) WITH (m = %s, ef_construction = %s)',
+    hnsw_m, hnsw_ef_construction
+  );
+
+  DROP INDEX IF EXISTS idx_pdf_chunks_embedding;
+  EXECUTE format(
+    'CREATE INDEX idx_pdf_chunks_embedding ON pdf_chunks USING hnsw (embedding vector_cosine_ops) WITH (m = %s, ef_construction = %s)',
+    hnsw_m, hnsw_ef_construction
+  );
+END;
+$$;
+
+-- Step 2: Order by distance, then filter by threshold. The inner query is a
+-- plain nearest-neighbour scan (ORDER BY distance LIMIT n) that the HNSW
+-- index answers directly; the threshold is applied to those n rows. With the
+-- threshold in the same WHERE clause as the ordered scan, the planner often
+-- skips the index and compares the query with every row.
+
+CREATE OR REPLACE FUNCTION search_pdf_documents(query_embedding VECTOR(1536), match_threshold FLOAT DEFAULT 0.5, match_count INT DEFAULT 5)
+RETURNS TABLE (
+  id UUID,
+  title TEXT,
+  description TEXT,
+  file_name TEXT,
+  extracted_text TEXT,
+  rti_category TEXT,
+  rti_department TEXT,
+  similarity FLOAT
+) AS $$
+BEGIN
+  -- The index returns at most hnsw.ef_search rows
+  IF match_count > current_setting('hnsw.ef_search')::INT THEN
+    PERFORM set_config('hnsw.ef_search', match_count::TEXT, true);
+  END IF;
+  RETURN QUERY
+  SELECT 
+    nearest.id,
+    nearest.title,
+    nearest.description,
+    nearest.file_name,
+    nearest.extracted_text,
+    nearest.rti_category,
+    nearest.rti_department,
+    1 - nearest.distance as similarity
+  FROM (
+    SELECT pd.id, pd.title, pd.description, pd.file_name, pd.extracted_text, pd.rti_category, pd.rti_department,
+      pd.embedding <=> query_embedding AS distance
+    FROM pdf_documents pd
+    ORDER BY pd.embedding <=> query_embedding
+    LIMIT match_count
+  ) nearest
+  WHERE 1 - nearest.distance > match_threshold
+  ORDER BY nearest.distance;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+CREATE OR REPLACE FUNCTION search_pdf_documents_slim(query_embedding VECTOR(1536), match_threshold FLOAT DEFAULT 0.5, match_count INT DEFAULT 5)
+RETURNS TABLE (
+  id UUID,
+  title TEXT,
+  rti_category TEXT,
+  rti_department TEXT,
+  similarity FLOAT
+) AS $$
+BEGIN
+  -- The index returns at most hnsw.ef_search rows
+  IF match_count > current_setting('hnsw.ef_search')::INT THEN
+    PERFORM set_config('hnsw.ef_search', match_count::TEXT, true);
+  END IF;
+  RETURN QUERY
+  SELECT 
+    nearest.id,
+    nearest.title,
+    nearest.rti_category,
+    nearest.rti_department,
+    1 - nearest.distance as similarity
+  FROM (
+    SELECT pd.id, pd.title, pd.rti_category, pd.rti_department, pd.embedding <=> query_embedding AS distance
+    FROM pdf_documents pd
+    ORDER BY pd.embedding <=> query_embedding
+    LIMIT match_count
+  ) nearest
+  WHERE 1 - nearest.distance > match_threshold
+  ORDER BY nearest.distance;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+CREATE OR REPLACE FUNCTION hybrid_search_pdf_documents(
+  query_text TEXT,
+  query_embedding VECTOR(1536),
+  match_threshold FLOAT DEFAULT 0.5,
+  match_count INT DEFAULT 5,
+  candidate_count INT DEFAULT 20,
+  rrf_k INT DEFAULT 60
+)
+RETURNS TABLE (
+  id UUID,
+  title TEXT,
+  rti_category TEXT,
+  rti_department TEXT,
+  similarity FLOAT,
+  lexical_score FLOAT,
+  rrf_score FLOAT
+) AS $$
+DECLARE
+  -- Words joined with OR; plainto_tsquery alone would require all of them
+  text_query TSQUERY := replace(plainto_tsquery('simple', query_text)::TEXT, ' & ', ' | ')::TSQUERY;
+BEGIN
+  -- The index returns at most hnsw.ef_search rows
+  IF candidate_count > current_setting('hnsw.ef_search')::INT THEN
+    PERFORM set_config('hnsw.ef_search', candidate_count::TEXT, true);
+  END IF;
+  RETURN QUERY
+  WITH nearest AS (
+    SELECT pd.id AS doc_id, pd.embedding <=> query_embedding AS distance
+    FROM pdf_documents pd
+    ORDER BY pd.embedding <=> query_embedding
+    LIMIT candidate_count
+  ),
+  vector_ranked AS (
+    SELECT
+      nearest.doc_id,
+      ROW_NUMBER() OVER (ORDER BY nearest.distance) AS position
+    FROM nearest
+    WHERE 1 - nearest.distance > match_threshold
+  ),
+  lexical_ranked AS (
+    SELECT
+      pd.id AS doc_id,
+      ts_rank_cd(pd.search_vector, text_query) AS text_rank,
+      ROW_NUMBER() OVER (ORDER BY ts_rank_cd(pd.search_vector, text_query) DESC) AS position
+    FROM pdf_documents pd
+    WHERE pd.search_vector @@ text_query
+    ORDER BY ts_rank_cd(pd.search_vector, text_query) DESC
+    LIMIT candidate_count
+  )
+  SELECT
+    pd.id,
+    pd.title,
+    pd.rti_category,
+    pd.rti_department,
+    (1 - (pd.embedding <=> query_embedding))::FLOAT,
+    COALESCE(l.text_rank, 0)::FLOAT,
+    (COALESCE(1.0 / (rrf_k + v.position), 0) + COALESCE(1.0 / (rrf_k + l.position), 0))::FLOAT
+  FROM vector_ranked v
+  FULL OUTER JOIN lexical_ranked l ON l.doc_id = v.doc_id
+  JOIN pdf_documents pd ON pd.id = COALESCE(v.doc_id, l.doc_id)
+  ORDER BY 7 DESC
+  LIMIT match_count;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+CREATE OR REPLACE FUNCTION search_pdf_chunks(query_embedding VECTOR(1536), match_threshold FLOAT DEFAULT 0.5, match_count INT DEFAULT 8)
+RETURNS TABLE (
+  id UUID,
+  document_id UUID,
+  chunk_index INTEGER,
+  content TEXT,
+  token_count INTEGER,
+  title TEXT,
+  rti_category TEXT,
+  rti_department TEXT,
+  similarity FLOAT
+) AS $$
+BEGIN
+  -- The index returns at most hnsw.ef_search rows
+  IF match_count > current_setting('hnsw.ef_search')::INT THEN
+    PERFORM set_config('hnsw.ef_search', match_count::TEXT, true);
+  END IF;
+  RETURN QUERY
+  SELECT 
+    nearest.id,
+    nearest.document_id,
+    nearest.chunk_index,
+    nearest.content,
+    nearest.token_count,
+    pd.title,
+    pd.rti_category,
+    pd.rti_department,
+    1 - nearest.distance as similarity
+  FROM (
+    SELECT pc.id, pc.document_id, pc.chunk_index, pc.content, pc.token_count, pc.embedding <=> query_embedding AS distance
+    FROM pdf_chunks pc
+    ORDER BY pc.embedding <=> query_embedding
+    LIMIT match_count
+  ) nearest
+  JOIN pdf_documents pd ON pd.id = nearest.document_id
+  WHERE 1 - nearest.distance > match_threshold
+  ORDER BY nearest.distance;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Step 3: Search-time candidate list. Each function raises it to its LIMIT
+-- when that is larger, as the index never returns more than ef_search rows.
+DO $$
+DECLARE
+  hnsw_ef_search INT := 40;
+BEGIN
+  EXECUTE format('ALTER FUNCTION search_pdf_documents(VECTOR, FLOAT, INT) SET hnsw.ef_search = %s', hnsw_ef_search);
+  EXECUTE format('ALTER FUNCTION search_pdf_documents_slim(VECTOR, FLOAT, INT) SET hnsw.ef_search = %s', hnsw_ef_search);
+  EXECUTE format('ALTER FUNCTION hybrid_search_pdf_documents(TEXT, VECTOR, FLOAT, INT, INT, INT) SET hnsw.ef_search = %s', hnsw_ef_search);
+  EXECUTE format('ALTER FUNCTION search_pdf_chunks(VECTOR, FLOAT, INT) SET hnsw.ef_search = %s', hnsw_ef_search);
+END;
+$$;
@@ -0,0 +1,75 @@
+-- Migration for hybrid (full-text + vector) template search
+-- Run this script in your Supabase SQL editor after migration_slim_document_search.sql
+
+-- Full-text document for each template. The 'simple' configuration keeps
+-- proper nouns such as Dharani, Meebhoomi or IRCTC as they are; title and
+-- category are weighted above the body.
+ALTER TABLE pdf_documents ADD COLUMN IF NOT EXISTS search_vector TSVECTOR
+  GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('simple', replace(coalesce(rti_category, ''), '_', ' ')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(extracted_text, '')), 'C')
+  ) STORED;
+
+CREATE INDEX IF NOT EXISTS idx_pdf_documents_search_vector ON pdf_documents USING GIN (search_vector);
+
+-- Best candidate_count templates by cosine similarity (above match_threshold)
+-- and by full-text rank (any query word), fused with reciprocal-rank fusion:
+-- score = sum of 1 / (rrf_k + rank) over both rankings. Returns the same
+-- columns as search_pdf_documents_slim plus the lexical and fused scores.
+CREATE OR REPLACE FUNCTION hybrid_search_pdf_documents(
+  query_text TEXT,
+  query_embedding VECTOR(1536),
+  match_threshold FLOAT DEFAULT 0.5,
+  match_count INT DEFAULT 5,
+  candidate_count INT DEFAULT 20,
+  rrf_k INT DEFAULT 60
+)
+RETURNS TABLE (
+  id UUID,
+  title TEXT,
+  rti_category TEXT,
+  rti_department TEXT,
+  similarity FLOAT,
+  lexical_score FLOAT,
+  rrf_score FLOAT
+) AS $$
+DECLARE
+  -- Words joined with OR; plainto_tsquery alone would require all of them
+  text_query TSQUERY := replace(plainto_tsquery('simple', query_text)::TEXT, ' & ', ' | ')::TSQUERY;
+BEGIN
+  RETURN QUERY
+  WITH vector_ranked AS (
+    SELECT
+      pd.id AS doc_id,
+      ROW_NUMBER() OVER (ORDER BY pd.embedding <=> query_embedding) AS position
+    FROM pdf_documents pd
+    WHERE 1 - (pd.embedding <=> query_embedding) > match_threshold
+    ORDER BY pd.embedding <=> query_embedding
+    LIMIT candidate_count
+  ),
+  lexical_ranked AS (
+    SELECT
+      pd.id AS doc_id,
+      ts_rank_cd(pd.search_vector, text_query) AS text_rank,
+      ROW_NUMBER() OVER (ORDER BY ts_rank_cd(pd.search_vector, text_query) DESC) AS position
+    FROM pdf_documents pd
+    WHERE pd.search_vector @@ text_query
+    ORDER BY ts_rank_cd(pd.search_vector, text_query) DESC
+    LIMIT candidate_count
+  )
+  SELECT
+    pd.id,
+    pd.title,
+    pd.rti_category,
+    pd.rti_department,
+    (1 - (pd.embedding <=> query_embedding))::FLOAT,
+    COALESCE(l.text_rank, 0)::FLOAT,
+    (COALESCE(1.0 / (rrf_k + v.position), 0) + COALESCE(1.0 / (rrf_k + l.position), 0))::FLOAT
+  FROM vector_ranked v
+  FULL OUTER JOIN lexical_ranked l ON l.doc_id = v.doc_id
+  JOIN pdf_documents pd ON pd.id = COALESCE(v.doc_id, l.doc_id)
+  ORDER BY 7 DESC
+  LIMIT match_count;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
@@ -0,0 +1,83 @@
+-- Migration for keyset-paginated message loading
+-- Run this script in your Supabase SQL editor after migration_conversation_context.sql
+
+-- Step 1: Index matching the (created_at, id) cursor order
+DROP INDEX IF EXISTS idx_messages_conversation_created_at;
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_created_at_id ON messages(conversation_id, created_at, id);
+
+-- Step 2: Page through a conversation's messages
+-- With after_created_at set, returns up to page_size messages after the
+-- (after_created_at, after_id) cursor, oldest first; after_id may be NULL
+-- to get everything strictly newer than a timestamp. Otherwise returns up
+-- to page_size messages before the (before_created_at, before_id) cursor
+-- (or the newest ones), newest first. With light = TRUE, attached file
+-- text is replaced by a short note. Returns no rows if the conversation
+-- doesn't belong to the user.
+CREATE OR REPLACE FUNCTION get_messages_page(
+  conv_id UUID,
+  user_uuid UUID,
+  page_size INT DEFAULT 50,
+  before_created_at TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+  before_id UUID DEFAULT NULL,
+  after_created_at TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+  after_id UUID DEFAULT NULL,
+  light BOOLEAN DEFAULT FALSE
+)
+RETURNS TABLE (
+  id UUID,
+  conversation_id UUID,
+  sender TEXT,
+  content TEXT,
+  metadata JSONB,
+  created_at TIMESTAMP WITH TIME ZONE,
+  has_attachment BOOLEAN
+) AS $$
+DECLARE
+  marker CONSTANT TEXT := E'\n\n[File Content:]\n';
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM conversations c WHERE c.id = conv_id AND c.user_id = user_uuid) THEN
+    RETURN;
+  END IF;
+
+  IF after_created_at IS NOT NULL THEN
+    RETURN QUERY
+    SELECT
+      m.id,
+      m.conversation_id,
+      m.sender,
+      CASE WHEN light AND strpos(m.content, marker) > 0
+        THEN left(m.content, strpos(m.content, marker) - 1)
+          || E'\n\n[File content omitted: ' || (length(m.content) - strpos(m.content, marker) - length(marker) + 1) || ' characters]'
+        ELSE m.content
+      END,
+      m.metadata,
+      m.created_at,
+      strpos(m.content, marker) > 0
+    FROM messages m
+    WHERE m.conversation_id = conv_id
+      AND (m.created_at, m.id) > (after_created_at, COALESCE(after_id, 'ffffffff-ffff-ffff-ffff-ffffffffffff'::UUID))
+    ORDER BY m.created_at ASC, m.id ASC
+    LIMIT page_size;
+  ELSE
+    RETURN QUERY
+    SELECT
+      m.id,
+      m.conversation_id,
+      m.sender,
+      CASE WHEN light AND strpos(m.content, marker) > 0
+        THEN left(m.content, strpos(m.content, marker) - 1)
+          || E'\n\n[File content omitted: ' || (length(m.content) - strpos(m.content, marker) - length(marker) + 1) || ' characters]'
+        ELSE m.content
+      END,
+      m.metadata,
+      m.created_at,
+      strpos(m.content, marker) > 0
+    FROM messages m
+    WHERE m.conversation_id = conv_id
+      AND (before_created_at IS NULL
+        OR (m.created_at, m.id) < (before_created_at, COALESCE(before_id, '00000000-0000-0000-0000-000000000000'::UUID)))
+    ORDER BY m.created_at DESC, m.id DESC
+    LIMIT page_size;
+  END IF;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
@@ -0,0 +1,56 @@
+-- Migration to add chunk-level embeddings for RAG retrieval
+-- Run this script in your Supabase SQL editor after migration_to_pdf_rag.sql
+-- Existing documents can be chunked with chunk_existing_pdfs.py
+
+-- Step 1: Create the pdf_chunks table
+CREATE TABLE IF NOT EXISTS pdf_chunks (
+  id UUID DEFAULT uuid_generate_v4() PRIMARY KEY,
+  document_id UUID NOT NULL REFERENCES pdf_documents(id) ON DELETE CASCADE,
+  chunk_index INTEGER NOT NULL,
+  content TEXT NOT NULL,
+  token_count INTEGER NOT NULL,
+  embedding VECTOR(1536),
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  UNIQUE (document_id, chunk_index)
+);
+
+-- Step 2: Create indexes
+CREATE INDEX IF NOT EXISTS idx_pdf_chunks_document_id ON pdf_chunks(document_id);
+CREATE INDEX IF NOT EXISTS idx_pdf_chunks_embedding ON pdf_chunks USING ivfflat (embedding vector_cosine_ops);
+
+-- Step 3: Enable RLS
+ALTER TABLE pdf_chunks ENABLE ROW LEVEL SECURITY;
+CREATE POLICY "PDF chunks are publicly readable" ON pdf_chunks FOR SELECT USING (true);
+
+-- Step 4: Create chunk search function
+CREATE OR REPLACE FUNCTION search_pdf_chunks(query_embedding VECTOR(1536), match_threshold FLOAT DEFAULT 0.5, match_count INT DEFAULT 8)
+RETURNS TABLE (
+  id UUID,
+  document_id UUID,
+  chunk_index INTEGER,
+  content TEXT,
+  token_count INTEGER,
+  title TEXT,
+  rti_category TEXT,
+  rti_department TEXT,
+  similarity FLOAT
+) AS $$
+BEGIN
+  RETURN QUERY
+  SELECT 
+    pc.id,
+    pc.document_id,
+    pc.chunk_index,
+    pc.content,
+    pc.token_count,
+    pd.title,
+    pd.rti_category,
+    pd.rti_department,
+    1 - (pc.embedding <=> query_embedding) as similarity
+  FROM pdf_chunks pc
+  JOIN pdf_documents pd ON pd.id = pc.document_id
+  WHERE 1 - (pc.embedding <=> query_embedding) > match_threshold
+  ORDER BY pc.embedding <=> query_embedding
+  LIMIT match_count;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
@@ -0,0 +1,28 @@
+-- Migration for two-phase template retrieval
+-- Run this script in your Supabase SQL editor after migration_to_pdf_rag.sql
+
+-- Ranking only: ids, titles, categories and scores, without extracted_text.
+-- The backend fetches the text of the few documents it puts in the prompt
+-- with a plain select on pdf_documents and caches it.
+CREATE OR REPLACE FUNCTION search_pdf_documents_slim(query_embedding VECTOR(1536), match_threshold FLOAT DEFAULT 0.5, match_count INT DEFAULT 5)
+RETURNS TABLE (
+  id UUID,
+  title TEXT,
+  rti_category TEXT,
+  rti_department TEXT,
+  similarity FLOAT
+) AS $$
+BEGIN
+  RETURN QUERY
+  SELECT 
+    pd.id,
+    pd.title,
+    pd.rti_category,
+    pd.rti_department,
+    1 - (pd.embedding <=> query_embedding) as similarity
+  FROM pdf_documents pd
+  WHERE 1 - (pd.embedding <=> query_embedding) > match_threshold
+  ORDER BY pd.embedding <=> query_embedding
+  LIMIT match_count;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
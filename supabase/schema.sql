@@ -27,6 +27,14 @@ CREATE TABLE conversations (
   updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Create conversation summaries table (rolling summary of older messages)
+CREATE TABLE conversation_summaries (
+  conversation_id UUID PRIMARY KEY REFERENCES conversations(id) ON DELETE CASCADE,
+  summary TEXT NOT NULL DEFAULT '',
+  summarized_count INTEGER NOT NULL DEFAULT 0,
+  updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
 -- Create messages table
 CREATE TABLE messages (
   id UUID DEFAULT uuid_generate_v4() PRIMARY KEY,
@@ -53,6 +61,17 @@ CREATE TABLE rti_drafts (
   updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Create file uploads table (who uploaded which blob through POST /api/v1/files)
+CREATE TABLE file_uploads (
+  user_id UUID REFERENCES profiles(id) ON DELETE CASCADE,
+  file_key TEXT NOT NULL,
+  file_name TEXT,
+  content_type TEXT,
+  file_size BIGINT,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  PRIMARY KEY (user_id, file_key)
+);
+
 -- Create RTI filings table (for paid filing service)
 CREATE TABLE rti_filings (
   id UUID DEFAULT uuid_generate_v4() PRIMARY KEY,
@@ -77,7 +96,8 @@ CREATE TABLE pdf_documents (
   title TEXT NOT NULL,
   description TEXT,
   file_name TEXT NOT NULL,
-  file_data TEXT NOT NULL, -- Store as base64 encoded string
+  file_key TEXT, -- Blob storage key (sha256/<xx>/<sha256>) of the uploaded file
+  file_data TEXT, -- Legacy base64 copy, only for rows not yet moved to blob storage
   file_size INTEGER NOT NULL,
   file_type TEXT DEFAULT 'application/pdf',
   extracted_text TEXT NOT NULL,
@@ -85,15 +105,34 @@ CREATE TABLE pdf_documents (
   rti_category TEXT, -- Category like 'land_records', 'employment', 'education', etc.
   rti_department TEXT, -- Specific department this format applies to
   metadata JSONB DEFAULT '{}',
+  -- Full-text document for hybrid search; 'simple' keeps proper nouns as they are
+  search_vector TSVECTOR GENERATED ALWAYS AS (
+    setweight(to_tsvector('simple', coalesce(title, '')), 'A') ||
+    setweight(to_tsvector('simple', replace(coalesce(rti_category, ''), '_', ' ')), 'A') ||
+    setweight(to_tsvector('simple', coalesce(extracted_text, '')), 'C')
+  ) STORED,
   created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
   updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
 );
 
+-- Create PDF chunks table for chunk-level retrieval
+CREATE TABLE pdf_chunks (
+  id UUID DEFAULT uuid_generate_v4() PRIMARY KEY,
+  document_id UUID NOT NULL REFERENCES pdf_documents(id) ON DELETE CASCADE,
+  chunk_index INTEGER NOT NULL,
+  content TEXT NOT NULL,
+  token_count INTEGER NOT NULL,
+  embedding VECTOR(1536),
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+  UNIQUE (document_id, chunk_index)
+);
+
 -- Create indexes for better performance
 CREATE INDEX idx_conversations_user_id ON conversations(user_id);
 CREATE INDEX idx_conversations_created_at ON conversations(created_at DESC);
 CREATE INDEX idx_messages_conversation_id ON messages(conversation_id);
 CREATE INDEX idx_messages_created_at ON messages(created_at DESC);
+CREATE INDEX idx_messages_conversation_created_at_id ON messages(conversation_id, created_at, id);
 CREATE INDEX idx_rti_drafts_user_id ON rti_drafts(user_id);
 CREATE INDEX idx_rti_drafts_status ON rti_drafts(status);
 CREATE INDEX idx_rti_filings_user_id ON rti_filings(user_id);
@@ -101,7 +140,15 @@ CREATE INDEX idx_rti_filings_payment_status ON rti_filings(payment_status);
 CREATE INDEX idx_pdf_documents_rti_category ON pdf_documents(rti_category);
 CREATE INDEX idx_pdf_documents_rti_department ON pdf_documents(rti_department);
 -- Vector index for semantic search
-CREATE INDEX idx_pdf_documents_embedding ON pdf_documents USING ivfflat (embedding vector_cosine_ops);
+CREATE INDEX idx_pdf_documents_embedding ON pdf_documents USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+CREATE INDEX idx_pdf_documents_search_vector ON pdf_documents USING GIN (search_vector);
+CREATE INDEX idx_pdf_chunks_document_id ON pdf_chunks(document_id);
+CREATE INDEX idx_pdf_chunks_embedding ON pdf_chunks USING hnsw (embedding vector_cosine_ops) WITH (m = 16, ef_construction = 64);
+
+-- Private Storage bucket for uploaded files (pdf_documents.file_key points into it)
+INSERT INTO storage.buckets (id, name, public)
+VALUES ('documents', 'documents', false)
+ON CONFLICT (id) DO NOTHING;
 
 -- Create updated_at trigger function
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -115,6 +162,7 @@ $$ language 'plpgsql';
 -- Create triggers for updated_at
 CREATE TRIGGER update_profiles_updated_at BEFORE UPDATE ON profiles FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_conversations_updated_at BEFORE UPDATE ON conversations FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
+CREATE TRIGGER update_conversation_summaries_updated_at BEFORE UPDATE ON conversation_summaries FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_rti_drafts_updated_at BEFORE UPDATE ON rti_drafts FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_rti_filings_updated_at BEFORE UPDATE ON rti_filings FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
 CREATE TRIGGER update_pdf_documents_updated_at BEFORE UPDATE ON pdf_documents FOR EACH ROW EXECUTE FUNCTION update_updated_at_column();
@@ -123,9 +171,12 @@ CREATE TRIGGER update_pdf_documents_updated_at BEFORE UPDATE ON pdf_documents FO
 ALTER TABLE profiles ENABLE ROW LEVEL SECURITY;
 ALTER TABLE conversations ENABLE ROW LEVEL SECURITY;
 ALTER TABLE messages ENABLE ROW LEVEL SECURITY;
+ALTER TABLE conversation_summaries ENABLE ROW LEVEL SECURITY;
 ALTER TABLE rti_drafts ENABLE ROW LEVEL SECURITY;
 ALTER TABLE rti_filings ENABLE ROW LEVEL SECURITY;
+ALTER TABLE file_uploads ENABLE ROW LEVEL SECURITY;
 ALTER TABLE pdf_documents ENABLE ROW LEVEL SECURITY;
+ALTER TABLE pdf_chunks ENABLE ROW LEVEL SECURITY;
 
 -- Profiles policies
 CREATE POLICY "Users can view own profile" ON profiles FOR SELECT USING (auth.uid() = id);
@@ -148,12 +199,19 @@ CREATE POLICY "Users can update messages from own conversations" ON messages FOR
 CREATE POLICY "Users can delete messages from own conversations" ON messages FOR DELETE 
   USING (conversation_id IN (SELECT id FROM conversations WHERE user_id = auth.uid()));
 
+-- Conversation summaries policies
+CREATE POLICY "Users can view summaries of own conversations" ON conversation_summaries FOR SELECT
+  USING (conversation_id IN (SELECT id FROM conversations WHERE user_id = auth.uid()));
+
 -- RTI drafts policies
 CREATE POLICY "Users can view own RTI drafts" ON rti_drafts FOR SELECT USING (auth.uid() = user_id);
 CREATE POLICY "Users can insert own RTI drafts" ON rti_drafts FOR INSERT WITH CHECK (auth.uid() = user_id);
 CREATE POLICY "Users can update own RTI drafts" ON rti_drafts FOR UPDATE USING (auth.uid() = user_id);
 CREATE POLICY "Users can delete own RTI drafts" ON rti_drafts FOR DELETE USING (auth.uid() = user_id);
 
+-- File uploads policies
+CREATE POLICY "Users can view own file uploads" ON file_uploads FOR SELECT USING (auth.uid() = user_id);
+
 -- RTI filings policies
 CREATE POLICY "Users can view own RTI filings" ON rti_filings FOR SELECT USING (auth.uid() = user_id);
 CREATE POLICY "Users can insert own RTI filings" ON rti_filings FOR INSERT WITH CHECK (auth.uid() = user_id);
@@ -161,6 +219,7 @@ CREATE POLICY "Users can update own RTI filings" ON rti_filings FOR UPDATE USING
 
 -- PDF documents are public read-only for RAG
 CREATE POLICY "PDF documents are publicly readable" ON pdf_documents FOR SELECT USING (true);
+CREATE POLICY "PDF chunks are publicly readable" ON pdf_chunks FOR SELECT USING (true);
 
 -- Create functions for common operations
 CREATE OR REPLACE FUNCTION get_user_conversations(user_uuid UUID)
@@ -187,6 +246,90 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql SECURITY DEFINER;
 
+-- Function to list conversations with message counts and last-message previews
+-- Conversations of a user with message count and a preview of the last
+-- message, most recently active first. Activity is the later of the last
+-- message and the conversation's updated_at. Pass the last row's
+-- (last_activity_at, id) as the before_* cursor to get the next page;
+-- page_size NULL returns every conversation.
+CREATE OR REPLACE FUNCTION get_conversation_list(
+  user_uuid UUID,
+  page_size INT DEFAULT NULL,
+  before_activity_at TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+  before_id UUID DEFAULT NULL,
+  preview_length INT DEFAULT 120
+)
+RETURNS TABLE (
+  id UUID,
+  user_id UUID,
+  title TEXT,
+  created_at TIMESTAMP WITH TIME ZONE,
+  updated_at TIMESTAMP WITH TIME ZONE,
+  last_activity_at TIMESTAMP WITH TIME ZONE,
+  message_count BIGINT,
+  last_message_sender TEXT,
+  last_message_preview TEXT
+) AS $$
+BEGIN
+  RETURN QUERY
+  SELECT *
+  FROM (
+    SELECT
+      c.id,
+      c.user_id,
+      c.title,
+      c.created_at,
+      c.updated_at,
+      GREATEST(c.updated_at, last_message.created_at) AS last_activity_at,
+      counts.message_count,
+      last_message.sender,
+      -- Attached file text never shows up in the preview
+      left(split_part(last_message.content, E'\n\n[File Content:]\n', 1), preview_length)
+    FROM conversations c
+    LEFT JOIN LATERAL (
+      SELECT m.sender, m.content, m.created_at
+      FROM messages m
+      WHERE m.conversation_id = c.id
+      ORDER BY m.created_at DESC, m.id DESC
+      LIMIT 1
+    ) last_message ON TRUE
+    CROSS JOIN LATERAL (
+      SELECT COUNT(*) AS message_count FROM messages m WHERE m.conversation_id = c.id
+    ) counts
+    WHERE c.user_id = user_uuid
+  ) listed
+  WHERE before_activity_at IS NULL
+    OR (listed.last_activity_at, listed.id) < (before_activity_at, COALESCE(before_id, '00000000-0000-0000-0000-000000000000'::UUID))
+  ORDER BY listed.last_activity_at DESC, listed.id DESC
+  LIMIT page_size;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Function to fingerprint a user's conversation list (ETag for the sidebar)
+-- Fingerprint of a user's conversation list: it changes whenever a
+-- conversation is added, renamed or deleted, or a message is added. It only
+-- counts and takes maxima, so it is much cheaper than get_conversation_list
+-- and lets the sidebar answer If-None-Match before building the list.
+CREATE OR REPLACE FUNCTION get_conversation_list_version(user_uuid UUID)
+RETURNS TABLE (
+  conversation_count BIGINT,
+  conversations_updated_at TIMESTAMP WITH TIME ZONE,
+  message_count BIGINT,
+  last_message_at TIMESTAMP WITH TIME ZONE
+) AS $$
+BEGIN
+  RETURN QUERY
+  SELECT
+    (SELECT COUNT(*) FROM conversations c WHERE c.user_id = user_uuid),
+    (SELECT MAX(c.updated_at) FROM conversations c WHERE c.user_id = user_uuid),
+    COUNT(m.id),
+    MAX(m.created_at)
+  FROM conversations c
+  JOIN messages m ON m.conversation_id = c.id
+  WHERE c.user_id = user_uuid;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
 -- Function to get conversation messages
 CREATE OR REPLACE FUNCTION get_conversation_messages(conv_id UUID, user_uuid UUID)
 RETURNS TABLE (
@@ -211,6 +354,112 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql SECURITY DEFINER;
 
+-- Function to get a conversation's summary, message count and recent messages in one call
+CREATE OR REPLACE FUNCTION get_conversation_context(conv_id UUID, user_uuid UUID, message_limit INT DEFAULT 16)
+RETURNS TABLE (
+  summary TEXT,
+  summarized_count INTEGER,
+  message_count BIGINT,
+  messages JSONB
+) AS $$
+BEGIN
+  RETURN QUERY
+  SELECT
+    COALESCE(s.summary, ''),
+    COALESCE(s.summarized_count, 0),
+    (SELECT COUNT(*) FROM messages m WHERE m.conversation_id = c.id),
+    COALESCE((
+      SELECT jsonb_agg(to_jsonb(r) ORDER BY r.created_at)
+      FROM (
+        SELECT * FROM messages m
+        WHERE m.conversation_id = c.id
+        ORDER BY m.created_at DESC
+        LIMIT message_limit
+      ) r
+    ), '[]'::jsonb)
+  FROM conversations c
+  LEFT JOIN conversation_summaries s ON s.conversation_id = c.id
+  WHERE c.id = conv_id AND c.user_id = user_uuid;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
+-- Function to page through a conversation's messages by (created_at, id) cursor
+-- With after_created_at set, returns up to page_size messages after the
+-- (after_created_at, after_id) cursor, oldest first; after_id may be NULL
+-- to get everything strictly newer than a timestamp. Otherwise returns up
+-- to page_size messages before the (before_created_at, before_id) cursor
+-- (or the newest ones), newest first. With light = TRUE, attached file
+-- text is replaced by a short note. Returns no rows if the conversation
+-- doesn't belong to the user.
+CREATE OR REPLACE FUNCTION get_messages_page(
+  conv_id UUID,
+  user_uuid UUID,
+  page_size INT DEFAULT 50,
+  before_created_at TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+  before_id UUID DEFAULT NULL,
+  after_created_at TIMESTAMP WITH TIME ZONE DEFAULT NULL,
+  after_id UUID DEFAULT NULL,
+  light BOOLEAN DEFAULT FALSE
+)
+RETURNS TABLE (
+  id UUID,
+  conversation_id UUID,
+  sender TEXT,
+  content TEXT,
+  metadata JSONB,
+  created_at TIMESTAMP WITH TIME ZONE,
+  has_attachment BOOLEAN
+) AS $$
+DECLARE
+  marker CONSTANT TEXT := E'\n\n[File Content:]\n';
+BEGIN
+  IF NOT EXISTS (SELECT 1 FROM conversations c WHERE c.id = conv_id AND c.user_id = user_uuid) THEN
+    RETURN;
+  END IF;
+
+  IF after_created_at IS NOT NULL THEN
+    RETURN QUERY
+    SELECT
+      m.id,
+      m.conversation_id,
+      m.sender,
+      CASE WHEN light AND strpos(m.content, marker) > 0
+        THEN left(m.content, strpos(m.content, marker) - 1)
+          || E'\n\n[File content omitted: ' || (length(m.content) - strpos(m.content, marker) - length(marker) + 1) || ' characters]'
+        ELSE m.content
+      END,
+      m.metadata,
+      m.created_at,
+      strpos(m.content, marker) > 0
+    FROM messages m
+    WHERE m.conversation_id = conv_id
+      AND (m.created_at, m.id) > (after_created_at, COALESCE(after_id, 'ffffffff-ffff-ffff-ffff-ffffffffffff'::UUID))
+    ORDER BY m.created_at ASC, m.id ASC
+    LIMIT page_size;
+  ELSE
+    RETURN QUERY
+    SELECT
+      m.id,
+      m.conversation_id,
+      m.sender,
+      CASE WHEN light AND strpos(m.content, marker) > 0
+        THEN left(m.content, strpos(m.content, marker) - 1)
+          || E'\n\n[File content omitted: ' || (length(m.content) - strpos(m.content, marker) - length(marker) + 1) || ' characters]'
+        ELSE m.content
+      END,
+      m.metadata,
+      m.created_at,
+      strpos(m.content, marker) > 0
+    FROM messages m
+    WHERE m.conversation_id = conv_id
+      AND (before_created_at IS NULL
+        OR (m.created_at, m.id) < (before_created_at, COALESCE(before_id, '00000000-0000-0000-0000-000000000000'::UUID)))
+    ORDER BY m.created_at DESC, m.id DESC
+    LIMIT page_size;
+  END IF;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER;
+
 -- Function to search PDF documents using vector similarity
 CREATE OR REPLACE FUNCTION search_pdf_documents(query_embedding VECTOR(1536), match_threshold FLOAT DEFAULT 0.5, match_count INT DEFAULT 5)
 RETURNS TABLE (
@@ -224,22 +473,134 @@ RETURNS TABLE (
   similarity FLOAT
 ) AS $$
 BEGIN
+  -- The index returns at most hnsw.ef_search rows
+  IF match_count > current_setting('hnsw.ef_search')::INT THEN
+    PERFORM set_config('hnsw.ef_search', match_count::TEXT, true);
+  END IF;
   RETURN QUERY
   SELECT 
+    nearest.id,
+    nearest.title,
+    nearest.description,
+    nearest.file_name,
+    nearest.extracted_text,
+    nearest.rti_category,
+    nearest.rti_department,
+    1 - nearest.distance as similarity
+  FROM (
+    SELECT pd.id, pd.title, pd.description, pd.file_name, pd.extracted_text, pd.rti_category, pd.rti_department,
+      pd.embedding <=> query_embedding AS distance
+    FROM pdf_documents pd
+    ORDER BY pd.embedding <=> query_embedding
+    LIMIT match_count
+  ) nearest
+  WHERE 1 - nearest.distance > match_threshold
+  ORDER BY nearest.distance;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET hnsw.ef_search = 40;
+
+-- Ranking only: ids, titles, categories and scores, without extracted_text.
+-- The backend fetches the text of the few documents it puts in the prompt
+-- with a plain select on pdf_documents and caches it.
+CREATE OR REPLACE FUNCTION search_pdf_documents_slim(query_embedding VECTOR(1536), match_threshold FLOAT DEFAULT 0.5, match_count INT DEFAULT 5)
+RETURNS TABLE (
+  id UUID,
+  title TEXT,
+  rti_category TEXT,
+  rti_department TEXT,
+  similarity FLOAT
+) AS $$
+BEGIN
+  -- The index returns at most hnsw.ef_search rows
+  IF match_count > current_setting('hnsw.ef_search')::INT THEN
+    PERFORM set_config('hnsw.ef_search', match_count::TEXT, true);
+  END IF;
+  RETURN QUERY
+  SELECT 
+    nearest.id,
+    nearest.title,
+    nearest.rti_category,
+    nearest.rti_department,
+    1 - nearest.distance as similarity
+  FROM (
+    SELECT pd.id, pd.title, pd.rti_category, pd.rti_department, pd.embedding <=> query_embedding AS distance
+    FROM pdf_documents pd
+    ORDER BY pd.embedding <=> query_embedding
+    LIMIT match_count
+  ) nearest
+  WHERE 1 - nearest.distance > match_threshold
+  ORDER BY nearest.distance;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET hnsw.ef_search = 40;
+
+-- Best candidate_count templates by cosine similarity (above match_threshold)
+-- and by full-text rank (any query word), fused with reciprocal-rank fusion:
+-- score = sum of 1 / (rrf_k + rank) over both rankings. Returns the same
+-- columns as search_pdf_documents_slim plus the lexical and fused scores.
+CREATE OR REPLACE FUNCTION hybrid_search_pdf_documents(
+  query_text TEXT,
+  query_embedding VECTOR(1536),
+  match_threshold FLOAT DEFAULT 0.5,
+  match_count INT DEFAULT 5,
+  candidate_count INT DEFAULT 20,
+  rrf_k INT DEFAULT 60
+)
+RETURNS TABLE (
+  id UUID,
+  title TEXT,
+  rti_category TEXT,
+  rti_department TEXT,
+  similarity FLOAT,
+  lexical_score FLOAT,
+  rrf_score FLOAT
+) AS $$
+DECLARE
+  -- Words joined with OR; plainto_tsquery alone would require all of them
+  text_query TSQUERY := replace(plainto_tsquery('simple', query_text)::TEXT, ' & ', ' | ')::TSQUERY;
+BEGIN
+  -- The index returns at most hnsw.ef_search rows
+  IF candidate_count > current_setting('hnsw.ef_search')::INT THEN
+    PERFORM set_config('hnsw.ef_search', candidate_count::TEXT, true);
+  END IF;
+  RETURN QUERY
+  WITH nearest AS (
+    SELECT pd.id AS doc_id, pd.embedding <=> query_embedding AS distance
+    FROM pdf_documents pd
+    ORDER BY pd.embedding <=> query_embedding
+    LIMIT candidate_count
+  ),
+  vector_ranked AS (
+    SELECT
+      nearest.doc_id,
+      ROW_NUMBER() OVER (ORDER BY nearest.distance) AS position
+    FROM nearest
+    WHERE 1 - nearest.distance > match_threshold
+  ),
+  lexical_ranked AS (
+    SELECT
+      pd.id AS doc_id,
+      ts_rank_cd(pd.search_vector, text_query) AS text_rank,
+      ROW_NUMBER() OVER (ORDER BY ts_rank_cd(pd.search_vector, text_query) DESC) AS position
+    FROM pdf_documents pd
+    WHERE pd.search_vector @@ text_query
+    ORDER BY ts_rank_cd(pd.search_vector, text_query) DESC
+    LIMIT candidate_count
+  )
+  SELECT
     pd.id,
     pd.title,
-    pd.description,
-    pd.file_name,
-    pd.extracted_text,
     pd.rti_category,
     pd.rti_department,
-    1 - (pd.embedding <=> query_embedding) as similarity
-  FROM pdf_documents pd
-  WHERE 1 - (pd.embedding <=> query_embedding) > match_threshold
-  ORDER BY pd.embedding <=> query_embedding
+    (1 - (pd.embedding <=> query_embedding))::FLOAT,
+    COALESCE(l.text_rank, 0)::FLOAT,
+    (COALESCE(1.0 / (rrf_k + v.position), 0) + COALESCE(1.0 / (rrf_k + l.position), 0))::FLOAT
+  FROM vector_ranked v
+  FULL OUTER JOIN lexical_ranked l ON l.doc_id = v.doc_id
+  JOIN pdf_documents pd ON pd.id = COALESCE(v.doc_id, l.doc_id)
+  ORDER BY 7 DESC
   LIMIT match_count;
 END;
-$$ LANGUAGE plpgsql SECURITY DEFINER;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET hnsw.ef_search = 40;
 
 -- Function to search PDF documents by RTI category
 CREATE OR REPLACE FUNCTION search_pdf_documents_by_category(category TEXT, department TEXT DEFAULT NULL)
@@ -269,5 +630,46 @@ BEGIN
 END;
 $$ LANGUAGE plpgsql SECURITY DEFINER;
 
+-- Function to search PDF chunks using vector similarity
+CREATE OR REPLACE FUNCTION search_pdf_chunks(query_embedding VECTOR(1536), match_threshold FLOAT DEFAULT 0.5, match_count INT DEFAULT 8)
+RETURNS TABLE (
+  id UUID,
+  document_id UUID,
+  chunk_index INTEGER,
+  content TEXT,
+  token_count INTEGER,
+  title TEXT,
+  rti_category TEXT,
+  rti_department TEXT,
+  similarity FLOAT
+) AS $$
+BEGIN
+  -- The index returns at most hnsw.ef_search rows
+  IF match_count > current_setting('hnsw.ef_search')::INT THEN
+    PERFORM set_config('hnsw.ef_search', match_count::TEXT, true);
+  END IF;
+  RETURN QUERY
+  SELECT 
+    nearest.id,
+    nearest.document_id,
+    nearest.chunk_index,
+    nearest.content,
+    nearest.token_count,
+    pd.title,
+    pd.rti_category,
+    pd.rti_department,
+    1 - nearest.distance as similarity
+  FROM (
+    SELECT pc.id, pc.document_id, pc.chunk_index, pc.content, pc.token_count, pc.embedding <=> query_embedding AS distance
+    FROM pdf_chunks pc
+    ORDER BY pc.embedding <=> query_embedding
+    LIMIT match_count
+  ) nearest
+  JOIN pdf_documents pd ON pd.id = nearest.document_id
+  WHERE 1 - nearest.distance > match_threshold
+  ORDER BY nearest.distance;
+END;
+$$ LANGUAGE plpgsql SECURITY DEFINER SET hnsw.ef_search = 40;
+
 -- Note: Sample PDF documents will be uploaded through the API
 -- The pdf_documents table is ready for storing PDF files with vector embeddings